@@ -1,15 +1,21 @@
-from sqlalchemy import select, distinct, func
+from sqlalchemy import select, distinct, func, cast, literal_column, true, Date, DateTime, Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.orm import Session
 
 from Pathogens.Arbo.app.sqlalchemy.sql_alchemy_base import Estimate, db_engine, Antibody, AntibodyToEstimate
+from app.utils.json_streaming import get_http_date_sql
+
+
+def _get_all_arbo_records_query(session):
+    return session.query(Estimate, func.array_agg(Antibody.antibody).label("antibodies")).\
+        join(AntibodyToEstimate, Estimate.id == AntibodyToEstimate.estimate_id).\
+        join(Antibody, Antibody.id == AntibodyToEstimate.antibody_id).\
+        group_by(Estimate.id)
 
 
 def get_all_arbo_records():
     with Session(db_engine) as session:
-        records = session.query(Estimate, func.array_agg(Antibody.antibody).label("antibodies")).\
-            join(AntibodyToEstimate, Estimate.id == AntibodyToEstimate.estimate_id).\
-            join(Antibody, Antibody.id == AntibodyToEstimate.antibody_id).\
-            group_by(Estimate.id).all()
+        records = _get_all_arbo_records_query(session).all()
 
         print(f'[DEBUG] estimate record: {records[0]}')
 
@@ -33,6 +39,48 @@ def get_all_arbo_records():
         return result_list
 
 
+def iter_all_arbo_records(batch_size=1000):
+    # Same records as get_all_arbo_records, read with a server side cursor one batch at a time
+    with Session(db_engine) as session:
+        query = _get_all_arbo_records_query(session).execution_options(stream_results=True).yield_per(batch_size)
+        for estimate, antibodies in query:
+            record_dict = {key: value for key, value in estimate.__dict__.items() if key != "_sa_instance_state"}
+            record_dict['antibodies'] = antibodies
+            yield record_dict
+            # Estimates are not needed once they have been serialized
+            session.expunge(estimate)
+
+
+def get_all_arbo_records_json():
+    '''Same records as get_all_arbo_records, but postgres writes the JSON body {"records": [...]} itself
+    :returns the JSON text, with the records ordered by id
+    '''
+    # Dates are written the way the app's JSON provider writes them
+    estimate_columns = [get_http_date_sql(column).label(column.name) if isinstance(column.type, (Date, DateTime))
+                        else column for column in Estimate.__table__.columns]
+    records = select(*estimate_columns, func.array_agg(Antibody.antibody).label("antibodies")).\
+        join(AntibodyToEstimate, Estimate.id == AntibodyToEstimate.estimate_id).\
+        join(Antibody, Antibody.id == AntibodyToEstimate.antibody_id).\
+        group_by(Estimate.id).subquery('estimates')
+    # Keys are written in sorted order like the app's JSON provider does
+    record = select(*[records.c[name] for name in sorted(records.c.keys())]).correlate(records).lateral('record_row')
+    records_json = select(func.coalesce(func.json_agg(aggregate_order_by(literal_column('record_row'),
+                                                                         records.c.id)),
+                                        literal_column("'[]'::json"))).\
+        select_from(records.join(record, true())).scalar_subquery()
+
+    with Session(db_engine) as session:
+        # Read the body as text, otherwise the driver would parse it
+        return session.execute(select(cast(func.json_build_object('records', records_json), Text))).scalar()
+
+
+def get_arbo_records_version():
+    # The Arbo ETL stamps every estimate with the same created_at and drops the previous run's estimates
+    # after loading its own, so the min created_at identifies the complete data currently in the database
+    with Session(db_engine) as session:
+        return session.query(func.min(Estimate.created_at)).scalar()
+
+
 def get_all_arbo_filter_options():
     with Session(db_engine) as session:
         age_group = session.query(distinct(Estimate.age_group)).all()
@@ -15,6 +15,7 @@ from Pathogens.Arbo.ETL.constants import estimate_columns, single_select_lists
 from Pathogens.Arbo.app.sqlalchemy import db_engine
 from Pathogens.Arbo.app.sqlalchemy.sql_alchemy_base import Estimate, Antibody, AntibodyToEstimate
 from Pathogens.Utility.location_utils.location_functions import get_city_lat_lng
+from Pathogens.Utility.database_utils import profile_statements
 
 load_dotenv()
 
@@ -176,12 +177,15 @@ def main():
 
     dbs_loaded_successfully = True
     print("[STEP] loading estimate data into database")
-    dbs_loaded_successfully = load_into_db(data=records_df[estimate_columns], table_name='estimate') and dbs_loaded_successfully
+    with profile_statements('arbo_etl.load_estimates'):
+        dbs_loaded_successfully = load_into_db(data=records_df[estimate_columns], table_name='estimate') and dbs_loaded_successfully
 
     # Replace antibody values with the keys to their the values in their tables
     # If value does not exist in the table then add it into the table and use the new id
+    # Its statements are profiled since it runs a query per antibody of each estimate
     print("[STEP] loading antibody data into database")
-    dbs_loaded_successfully = load_antibody_data_into_db(records_df[['id', 'antibody']]) and dbs_loaded_successfully
+    with profile_statements('arbo_etl.load_antibody_data'):
+        dbs_loaded_successfully = load_antibody_data_into_db(records_df[['id', 'antibody']]) and dbs_loaded_successfully
 
     if dbs_loaded_successfully:
         print("[STEP] deleting old data from database")
@@ -11,13 +11,15 @@ from sqlalchemy import (
     MetaData,
     DateTime,
     Text,
-    func, create_engine
+    func
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import uuid
 
+from Pathogens.Utility.database_utils import get_engine
+
 # If you want to create a new migration,
 # simply change the model definitions in Pathogens/Arbo/app/sqlalchemy/sql_alchemy_base.py (here)
 # and run the following command: alembic revision --autogenerate -m "<name of the migration>".
@@ -28,7 +30,8 @@ Base = declarative_base(metadata=MetaData(schema="arbo"))
 load_dotenv()
 
 print(f'[DEBUG] DATABASE_URL: {os.getenv("DATABASE_URL")}')
-db_engine = create_engine(os.getenv('DATABASE_URL'))
+# Shared pooled engine, reused by the Arbo ETL and the Arbo API services
+db_engine = get_engine(os.getenv('DATABASE_URL'))
 
 class Antibody(Base):
     __tablename__ = 'antibody'
@@ -1,16 +1,18 @@
+import os
+
 from sqlalchemy import distinct, func
 from sqlalchemy.orm import Session
 
-from Pathogens.Arbo.app.sqlalchemy.sql_alchemy_base import db_engine
+from Pathogens.Utility.database_utils import get_engine
 from app.database_etl.postgres_tables_handler.postgres_utils import get_filter_static_options
-from app.namespaces.data_provider.data_provider_service import _get_parsed_record
 from app.serotracker_sqlalchemy.models import AntibodyTarget, PopulationGroupOptions, ResearchSource
 from app.utils.get_filtered_records import _get_isotype_col_expression
 from app.serotracker_sqlalchemy import DashboardSource, Country, db_model_config, dashboard_source_cols, State, City
 
 
 def get_all_sarscov2_records():
-    with Session(db_engine) as session:
+    # Read from DATABASE_URL, through the same pooled engine as the Arbo services
+    with Session(get_engine(os.getenv('DATABASE_URL'))) as session:
             # session.query(Estimate, func.array_agg(Antibody.antibody).label("antibodies")).\
             # join(AntibodyToEstimate, Estimate.id == AntibodyToEstimate.estimate_id).\
             # join(Antibody, Antibody.id == AntibodyToEstimate.antibody_id).\
@@ -52,7 +54,7 @@ def get_all_sarscov2_records():
 
 def get_all_sarscov2_filter_options():
     
-    with Session(db_engine) as session:
+    with Session(get_engine(os.getenv('DATABASE_URL'))) as session:
 
         options = get_filter_static_options()
 
@@ -4,7 +4,6 @@ from time import time
 from dotenv import load_dotenv
 
 import pandas as pd
-from sqlalchemy import create_engine
 
 from app.serotracker_sqlalchemy import DashboardSourceSchema, ResearchSourceSchema
 from app.database_etl.postgres_tables_handler import create_dashboard_source_df, create_bridge_tables, \
@@ -15,8 +14,12 @@ from app.database_etl.airtable_records_handler import get_all_records, apply_stu
     apply_min_risk_of_bias, standardize_airtable_data, ingest_sample_frame_goi_filter_options
 from app.database_etl.test_adjustment_handler import add_test_adjustments
 from app.database_etl.tableau_data_connector import upload_analyze_csv
+from app.database_etl.prioritized_estimates_handler import load_prioritized_estimates
+from app.database_etl.records_flat_handler import load_records_flat
+from app.database_etl.record_snapshot_handler import publish_record_snapshots
 from app.database_etl.summary_report_generator import SummaryReport
 from Pathogens.Utility.location_utils import compute_pin_info
+from Pathogens.Utility.database_utils import get_engine, profile_statements
 from app.utils import airtable_fields_config
 
 load_dotenv()
@@ -32,8 +35,8 @@ def main():
     # etl_report.__exit__() will run whether or not this block is successfully completed
     # see https://www.geeksforgeeks.org/with-statement-in-python/
     with SummaryReport() as etl_report:
-        # Create engine to connect to whiteclaw database
-        engine = create_engine('postgresql://{username}:{password}@{host_address}/whiteclaw'.format(
+        # Get the shared engine to connect to whiteclaw database
+        engine = get_engine('postgresql://{username}:{password}@{host_address}/whiteclaw'.format(
             username=os.getenv('DATABASE_USERNAME'),
             password=os.getenv('DATABASE_PASSWORD'),
             host_address=os.getenv('DATABASE_HOST_ADDRESS')))
@@ -149,12 +152,30 @@ def main():
                        'country': country_df}
 
         # Load dataframes into postgres tables
+        # The statements of each loading stage are profiled, to catch stages that run one statement per row
         print("Load dataframes into postgres tables")
-        load_status = load_postgres_tables(tables_dict, engine)
+        with profile_statements('etl.load_postgres_tables'):
+            load_status = load_postgres_tables(tables_dict, engine)
 
         # If all tables were successfully loaded, drop old entries
         if load_status:
-            drop_table_entries(current_time=CURR_TIME, drop_old=True)
+            with profile_statements('etl.drop_table_entries'):
+                drop_table_entries(current_time=CURR_TIME, drop_old=True)
+
+            # Write the joined records into records_flat so the API doesn't have to join the tables on every request
+            print("Load the joined records into records_flat")
+            with profile_statements('etl.load_records_flat'):
+                load_records_flat(current_time=CURR_TIME)
+
+            # Precompute prioritized estimates for every prioritize_estimates_mode so the API can serve them directly
+            print("Precompute prioritized estimates for every prioritize_estimates_mode")
+            with profile_statements('etl.load_prioritized_estimates'):
+                load_prioritized_estimates(current_time=CURR_TIME)
+
+            # Publish the joined records as files that every API worker maps instead of querying them
+            print("Publish record snapshot files")
+            with profile_statements('etl.publish_record_snapshots'):
+                publish_record_snapshots(current_time=CURR_TIME)
             etl_report.set_table_counts_after()
         # Otherwise drop entries from current ETL run
         else:
@@ -0,0 +1,2 @@
+from .engine_registry import get_engine, get_pool_stats, dispose_engines
+from .statement_profiler import profile_statements, get_statement_fingerprint, StatementProfile
@@ -0,0 +1,107 @@
+import os
+import threading
+from time import perf_counter
+from typing import Dict, Any, Optional, Tuple
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from .statement_profiler import attach_statement_profiler
+
+# Pool settings can be tuned per deployment with these environment variables
+# They only apply the first time an engine is created for a given (url, schema) key
+DEFAULT_POOL_OPTIONS = {
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'True').lower() in ['true', '1'],
+}
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that records how many connections were checked out and how long callers waited for them
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.num_checkouts = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        start_time = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait_time = perf_counter() - start_time
+            with self._stats_lock:
+                self.num_checkouts += 1
+                self.total_wait_seconds += wait_time
+                self.max_wait_seconds = max(self.max_wait_seconds, wait_time)
+
+    def recreate(self):
+        # Keep our stats class when SQLAlchemy recreates the pool (e.g. after engine.dispose())
+        new_pool = super().recreate()
+        new_pool.num_checkouts = self.num_checkouts
+        new_pool.total_wait_seconds = self.total_wait_seconds
+        new_pool.max_wait_seconds = self.max_wait_seconds
+        return new_pool
+
+
+_engines: Dict[Tuple[str, Optional[str]], Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(url: str, schema: Optional[str] = None, **pool_options: Any) -> Engine:
+    '''Gets the process-wide engine for a database url, creating it on first use
+    :param url: sqlalchemy database url
+    :param schema: optional postgres schema to put at the front of the search_path
+    :param pool_options: overrides for DEFAULT_POOL_OPTIONS (only used when the engine is first created)
+    :returns a pooled sqlalchemy engine shared by every caller using the same url and schema
+    '''
+    key = (url, schema)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        # Another thread may have created the engine while we were waiting for the lock
+        engine = _engines.get(key)
+        if engine is None:
+            options = {**DEFAULT_POOL_OPTIONS, **{k: v for k, v in pool_options.items() if v is not None}}
+            connect_args = {'options': f'-csearch_path={schema},public'} if schema else {}
+            engine = create_engine(url, poolclass=InstrumentedQueuePool, connect_args=connect_args, **options)
+            attach_statement_profiler(engine)
+            _engines[key] = engine
+    return engine
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    # Summarize pool usage for every engine in the registry
+    # Note: repr(engine.url) hides the password
+    stats = {}
+    for (url, schema), engine in list(_engines.items()):
+        pool = engine.pool
+        key = repr(engine.url) if schema is None else f'{repr(engine.url)} ({schema})'
+        num_checkouts = getattr(pool, 'num_checkouts', 0)
+        total_wait_seconds = getattr(pool, 'total_wait_seconds', 0.0)
+        stats[key] = {
+            'pool_size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'num_checkouts': num_checkouts,
+            'total_wait_ms': round(total_wait_seconds * 1000, 3),
+            'avg_wait_ms': round(total_wait_seconds * 1000 / num_checkouts, 3) if num_checkouts else 0.0,
+            'max_wait_ms': round(getattr(pool, 'max_wait_seconds', 0.0) * 1000, 3),
+        }
+    return stats
+
+
+def dispose_engines() -> None:
+    # Close all pooled connections, e.g. in a forked worker that must not reuse the parent's sockets
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
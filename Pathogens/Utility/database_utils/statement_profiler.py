@@ -0,0 +1,142 @@
+import logging
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Statements that take longer than this are logged wherever they run
+SLOW_STATEMENT_MS = float(os.getenv('DB_SLOW_STATEMENT_MS', 500))
+# A statement shape that runs at least this many times in one profile is reported as a likely N+1 query
+REPEATED_STATEMENT_THRESHOLD = int(os.getenv('DB_REPEATED_STATEMENT_THRESHOLD', 10))
+
+# Replace the values in a statement so that statements of the same shape get the same fingerprint
+_FINGERPRINT_SUBSTITUTIONS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\s+'), ' '),
+    # IN lists and multi-row VALUES of any length
+    (re.compile(r'\?(?: ?, ?\?)+'), '?, ...'),
+    (re.compile(r'\((?:\?, \.\.\.|\?)\)(?:, \((?:\?, \.\.\.|\?)\))+'), '(?, ...), ...'),
+]
+
+
+def get_statement_fingerprint(statement: str) -> str:
+    # e.g. SELECT antibody.id FROM antibody WHERE antibody.antibody = ? LIMIT ?
+    for pattern, replacement in _FINGERPRINT_SUBSTITUTIONS:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class StatementStats:
+    '''Number of runs, total duration and total rows of the statements with one fingerprint'''
+    __slots__ = ('count', 'total_ms', 'rows')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.rows = 0
+
+
+class StatementProfile:
+    '''Statements run while a profile is active, grouped by fingerprint'''
+
+    def __init__(self, name: str):
+        self.name = name
+        self.statements: Dict[str, StatementStats] = {}
+        self.num_statements = 0
+        self.total_ms = 0.0
+
+    def record(self, fingerprint: str, duration_ms: float, rows: Optional[int]) -> None:
+        stats = self.statements.get(fingerprint)
+        if stats is None:
+            stats = self.statements[fingerprint] = StatementStats()
+        stats.count += 1
+        stats.total_ms += duration_ms
+        stats.rows += rows or 0
+        self.num_statements += 1
+        self.total_ms += duration_ms
+
+    def get_repeated_statements(self, threshold: int = REPEATED_STATEMENT_THRESHOLD) \
+            -> List[Tuple[str, StatementStats]]:
+        # Statement shapes that ran at least threshold times, most frequent first
+        repeated = [(fingerprint, stats) for fingerprint, stats in self.statements.items() if stats.count >= threshold]
+        return sorted(repeated, key=lambda item: item[1].count, reverse=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'num_statements': self.num_statements,
+            'total_ms': round(self.total_ms, 3),
+            'statements': [{'fingerprint': fingerprint, 'count': stats.count, 'total_ms': round(stats.total_ms, 3),
+                            'rows': stats.rows}
+                           for fingerprint, stats in sorted(self.statements.items(),
+                                                            key=lambda item: item[1].total_ms, reverse=True)]
+        }
+
+    def log_summary(self) -> None:
+        logger.info(f'Statement profile {self.name}: {self.num_statements} statements '
+                    f'({len(self.statements)} distinct) in {self.total_ms:.1f} ms',
+                    extra={'statement_profile': self.to_dict()})
+        for fingerprint, stats in self.get_repeated_statements():
+            logger.warning(f'Statement profile {self.name}: possible N+1 query, ran {stats.count} times '
+                           f'in {stats.total_ms:.1f} ms: {fingerprint[:500]}')
+
+
+# Profiles of the current request, ETL stage or test, innermost last
+_active_profiles: ContextVar[Tuple[StatementProfile, ...]] = ContextVar('active_statement_profiles', default=())
+
+
+@contextmanager
+def profile_statements(name: str, log: bool = True) -> Iterator[StatementProfile]:
+    '''Records the statements run by the shared engines in the with block, in the current thread.
+    Profiles can be nested, e.g. a test budget around a request, and each one records every statement
+    :param name: name of the profile in the logs, e.g. the endpoint or the ETL stage
+    :param log: whether to log a summary of the statements and the likely N+1 queries at the end of the block
+    '''
+    profile = StatementProfile(name)
+    token = _active_profiles.set(_active_profiles.get() + (profile,))
+    try:
+        yield profile
+    finally:
+        _active_profiles.reset(token)
+        if log:
+            profile.log_summary()
+
+
+def attach_statement_profiler(engine: Engine) -> None:
+    # Time every statement of the engine, which costs a couple of clock reads unless a profile is active
+    # or the statement is slow
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('statement_start_times', []).append(perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        duration_ms = (perf_counter() - conn.info['statement_start_times'].pop()) * 1000
+        profiles = _active_profiles.get()
+        if not profiles and duration_ms < SLOW_STATEMENT_MS:
+            return
+        # Server side cursors don't know how many rows they will return
+        rows = cursor.rowcount if cursor.rowcount >= 0 else None
+        if profiles:
+            fingerprint = get_statement_fingerprint(statement)
+            for profile in profiles:
+                profile.record(fingerprint, duration_ms, rows)
+        if duration_ms >= SLOW_STATEMENT_MS:
+            logger.warning(f'Slow statement ({duration_ms:.1f} ms, {rows} rows): {statement[:1000]}')
+
+    @event.listens_for(engine, 'handle_error')
+    def discard_statement_timer(exception_context):
+        # Failed statements never reach after_cursor_execute
+        start_times = exception_context.connection.info.get('statement_start_times') \
+            if exception_context.connection is not None else None
+        if start_times:
+            start_times.pop()
@@ -27,6 +27,18 @@ def create_app(db):
 
     db.init_app(app)
 
+    # Time the stages of each request if REQUEST_TIMING_ENABLED is set,
+    # and profile their statements if QUERY_PROFILING_ENABLED is set
+    from .utils import init_request_timing, init_query_profiling
+    init_request_timing(app)
+    init_query_profiling(app)
+
+    # Size the cache of prioritized studies by PRIORITIZED_STUDY_CACHE_MAX_STUDIES,
+    # and the response cache by RESPONSE_CACHE_MAX_ENTRIES
+    from .utils import init_prioritized_study_cache, init_response_cache
+    init_prioritized_study_cache(app)
+    init_response_cache(app)
+
     # Attach namespaces to api
     namespaces = config_obj.APP_NAMESPACES
     from .utils import init_namespace
@@ -34,6 +46,10 @@ def create_app(db):
         meta_analysis_ns, test_adjustment_ns
     init_namespace(namespaces, api)
 
+    # Size the cache of record details by RECORD_DETAILS_CACHE_MAX_ENTRIES
+    from .namespaces.data_provider import init_record_details_cache
+    init_record_details_cache(app)
+
     app.app_context().push()
     return app
 
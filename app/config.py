@@ -1,5 +1,7 @@
 import os
 
+from Pathogens.Utility.database_utils.engine_registry import DEFAULT_POOL_OPTIONS
+
 
 class ApiConfig:
     DEBUG = True
@@ -23,6 +25,48 @@ class ApiConfig:
     # Meta analysis config vars
     MIN_DENOMINATOR = 200
 
+    # Database connection pool config vars (pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping)
+    DB_POOL_OPTIONS = DEFAULT_POOL_OPTIONS
+
+    # Record snapshot config vars
+    # Joined records are cached per process and rebuilt when a new ETL run is detected
+    RECORD_SNAPSHOT_ENABLED = os.getenv('RECORD_SNAPSHOT_ENABLED', 'True').lower() in ['true', '1']
+    RECORD_SNAPSHOT_VERSION_CHECK_INTERVAL = int(os.getenv('RECORD_SNAPSHOT_VERSION_CHECK_INTERVAL', 5))
+    # Directory of the record snapshot files published by the ETL, which every worker maps instead of querying records
+    RECORD_SNAPSHOT_DIR = os.getenv('RECORD_SNAPSHOT_DIR')
+
+    # Number of rows fetched per round trip when records are streamed with a server side cursor
+    RECORDS_STREAM_BATCH_SIZE = int(os.getenv('RECORDS_STREAM_BATCH_SIZE', 1000))
+
+    # Response cache config vars
+    # Responses that only change with each ETL run are encoded once per run and served with ETags
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() in ['true', '1']
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 64))
+
+    # Read records from the records_flat table written by the ETL, once it holds the current records
+    RECORDS_FLAT_ENABLED = os.getenv('RECORDS_FLAT_ENABLED', 'True').lower() in ['true', '1']
+
+    # Number of record details kept in memory, they are queried again after each ETL run
+    RECORD_DETAILS_CACHE_MAX_ENTRIES = int(os.getenv('RECORD_DETAILS_CACHE_MAX_ENTRIES', 1024))
+
+    # Keep the prioritized estimates of each study, so only the studies whose estimates changed are prioritized again
+    PRIORITIZED_STUDY_CACHE_ENABLED = os.getenv('PRIORITIZED_STUDY_CACHE_ENABLED', 'True').lower() in ['true', '1']
+    PRIORITIZED_STUDY_CACHE_MAX_STUDIES = int(os.getenv('PRIORITIZED_STUDY_CACHE_MAX_STUDIES', 20000))
+
+    # Prioritize chunks of studies in worker processes, for prioritizations of at least
+    # PARALLEL_PRIORITIZATION_MIN_ESTIMATES estimates, e.g. the tableau exports
+    PARALLEL_PRIORITIZATION_ENABLED = os.getenv('PARALLEL_PRIORITIZATION_ENABLED', 'False').lower() in ['true', '1']
+    PARALLEL_PRIORITIZATION_WORKERS = int(os.getenv('PARALLEL_PRIORITIZATION_WORKERS', os.cpu_count() or 1))
+    PARALLEL_PRIORITIZATION_CHUNK_SIZE = int(os.getenv('PARALLEL_PRIORITIZATION_CHUNK_SIZE', 10000))
+    PARALLEL_PRIORITIZATION_MIN_ESTIMATES = int(os.getenv('PARALLEL_PRIORITIZATION_MIN_ESTIMATES', 40000))
+
+    # Time the stages of each request, which are returned in a Server-Timing header, logged and added to histograms
+    REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'False').lower() in ['true', '1']
+
+    # Log the statements run by each request and flag statement shapes repeated enough to be N+1 queries
+    # See DB_SLOW_STATEMENT_MS and DB_REPEATED_STATEMENT_THRESHOLD for the thresholds
+    QUERY_PROFILING_ENABLED = os.getenv('QUERY_PROFILING_ENABLED', 'False').lower() in ['true', '1']
+
 
 class ApiDevelopmentConfig(ApiConfig):
     DATABASE_USERNAME = os.getenv('DATABASE_USERNAME')
@@ -37,11 +81,17 @@ class ApiDevelopmentConfig(ApiConfig):
                                             host_address=DATABASE_HOST_ADDRESS,
                                             database_name=DATABASE_NAME))
     SQLALCHEMY_TRACK_MODIFICATIONS = os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS', True)
+    # Time and profile requests locally unless turned off
+    REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'True').lower() in ['true', '1']
+    QUERY_PROFILING_ENABLED = os.getenv('QUERY_PROFILING_ENABLED', 'True').lower() in ['true', '1']
     def __init__(self):
         super(ApiConfig)
 
 
 class ApiTestingConfig(ApiConfig):
+    # Tests insert and delete records between requests, so always read records straight from the database
+    RECORD_SNAPSHOT_ENABLED = False
+    RESPONSE_CACHE_ENABLED = False
     DATABASE_USERNAME = os.getenv('DATABASE_USERNAME', 'postgres')
     DATABASE_PASSWORD = os.getenv('DATABASE_PASSWORD', 'postgres')
     DATABASE_HOST_ADDRESS = 'localhost'
@@ -9,7 +9,8 @@ import datetime
 
 from app.utils.notifications_sender import send_schema_validation_slack_notif, send_slack_message
 from app.serotracker_sqlalchemy import db_session, DashboardSource, ResearchSource, Country, City, State, \
-    TestManufacturer, AntibodyTarget, CityBridge, StateBridge, TestManufacturerBridge, AntibodyTargetBridge
+    TestManufacturer, AntibodyTarget, CityBridge, StateBridge, TestManufacturerBridge, AntibodyTargetBridge, \
+    PrioritizedEstimate
 
 table_names_dict = {
     "dashboard_source": DashboardSource,
@@ -24,6 +25,7 @@ table_names_dict = {
     "antibody_target_bridge": AntibodyTargetBridge,
     "country": Country,
     "population_group_options": PopulationGroupOptions,
+    "prioritized_estimate": PrioritizedEstimate,
 }
 
 
@@ -0,0 +1,2 @@
+from .prioritized_estimates_loader import PRIORITIZE_ESTIMATES_MODES, create_prioritized_estimates_rows, \
+    load_prioritized_estimates
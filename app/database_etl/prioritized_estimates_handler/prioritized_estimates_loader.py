@@ -0,0 +1,73 @@
+import logging
+import math
+import uuid
+from datetime import date, datetime
+from typing import Any, Dict, List
+
+import pandas as pd
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.serotracker_sqlalchemy import db_session, PrioritizedEstimate
+from app.utils.get_filtered_records import get_all_records, prioritize_records, MATERIALIZED_VARIANT
+from app.utils.notifications_sender import send_slack_message
+
+PRIORITIZE_ESTIMATES_MODES = ['dashboard', 'analysis_static', 'analysis_dynamic']
+
+
+def _to_json_value(value):
+    # JSONB columns can only store plain json values
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, list):
+        return [_to_json_value(element) for element in value]
+    return value
+
+
+def create_prioritized_estimates_rows(records: List[Dict[str, Any]], current_time: datetime) -> List[Dict[str, Any]]:
+    '''Prioritizes the records for every prioritize_estimates_mode, with and without subgeography estimates
+    :param records: records of get_all_records for MATERIALIZED_VARIANT
+    :param current_time: created_at of the current ETL run
+    :returns rows of the prioritized_estimate table
+    '''
+    rows = []
+    for prioritize_estimates_mode in PRIORITIZE_ESTIMATES_MODES:
+        for include_subgeography_estimates in [False, True]:
+            prioritized_records = prioritize_records(records, include_subgeography_estimates,
+                                                     prioritize_estimates_mode)
+            for position, record in enumerate(prioritized_records):
+                rows.append({
+                    'id': uuid.uuid4(),
+                    'prioritize_estimates_mode': prioritize_estimates_mode,
+                    'include_subgeography_estimates': include_subgeography_estimates,
+                    'position': position,
+                    'record': {key: _to_json_value(value) for key, value in record.items()},
+                    'created_at': current_time
+                })
+    return rows
+
+
+def load_prioritized_estimates(current_time: datetime) -> bool:
+    # Must run after the records of the current ETL run have been loaded and the old records have been dropped,
+    # since the API only uses the stored estimates if they have the same created_at as the current records
+    try:
+        records = get_all_records(*MATERIALIZED_VARIANT)
+        rows = create_prioritized_estimates_rows(records, current_time)
+        with db_session() as session:
+            session.bulk_insert_mappings(PrioritizedEstimate, rows)
+            session.commit()
+        return True
+    except (SQLAlchemyError, ValueError, KeyError) as e:
+        # The API computes prioritized estimates itself when none are stored, so just clean up and report the error
+        logging.error(e)
+        with db_session() as session:
+            session.query(PrioritizedEstimate).filter(PrioritizedEstimate.created_at == current_time).delete()
+            session.commit()
+        send_slack_message(f'Error occurred while loading prioritized estimates into Postgres: {e}',
+                           channel='#dev-logging-etl')
+        return False
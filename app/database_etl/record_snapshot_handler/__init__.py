@@ -0,0 +1 @@
+from .record_snapshot_publisher import PUBLISHED_VARIANTS, publish_record_snapshots
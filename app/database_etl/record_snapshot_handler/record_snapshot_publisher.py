@@ -0,0 +1,34 @@
+import logging
+import os
+from datetime import datetime
+
+from flask import current_app as app
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.utils.get_filtered_records import get_all_records, MATERIALIZED_VARIANT
+from app.utils.notifications_sender import send_slack_message
+from app.utils.snapshot_file import get_snapshot_file_path, write_snapshot_file, remove_old_snapshot_files
+
+# Variants of get_all_records that are published, the others are still queried by each worker
+PUBLISHED_VARIANTS = [MATERIALIZED_VARIANT, (True, False, False, False)]
+
+
+def publish_record_snapshots(current_time: datetime) -> bool:
+    # Must run after the records of the current ETL run have been loaded and the old records have been dropped,
+    # since workers only map the file whose version matches the created_at of the current records
+    snapshot_dir = app.config.get('RECORD_SNAPSHOT_DIR')
+    if not snapshot_dir:
+        return False
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        for variant in PUBLISHED_VARIANTS:
+            path = get_snapshot_file_path(snapshot_dir, variant, current_time)
+            if not write_snapshot_file(get_all_records(*variant), path):
+                return False
+            remove_old_snapshot_files(snapshot_dir, variant, keep_path=path)
+        return True
+    except (SQLAlchemyError, OSError) as e:
+        # Workers query the records themselves when no file is published, so just report it
+        logging.error(e)
+        send_slack_message(f'Error occurred while publishing record snapshots: {e}', channel='#dev-logging-etl')
+        return False
@@ -0,0 +1 @@
+from .records_flat_loader import load_records_flat
@@ -0,0 +1,46 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.serotracker_sqlalchemy import db_session, DashboardSource, ResearchSource, RecordsFlat, research_source_cols
+from app.utils.get_filtered_records import _get_joined_records_query
+from app.utils.notifications_sender import send_slack_message
+
+
+def get_records_flat_select(session, current_time: datetime):
+    '''Builds the statement selecting the rows of records_flat from the tables loaded by the ETL
+    :param current_time: created_at of the current ETL run, only its records are selected
+    :returns a select statement with one row per dashboard source, whose columns are named like records_flat
+    '''
+    # Every dashboard source column, the country columns and the aggregated multi select columns and isotypes
+    records = _get_joined_records_query(session, research_fields=False) \
+        .add_columns(DashboardSource.created_at).group_by(DashboardSource.created_at) \
+        .filter(DashboardSource.created_at == current_time).subquery()
+
+    # Research sources are outer joined, so that every estimate is kept whether or not it has research fields
+    research_columns = [getattr(ResearchSource, col) for col in research_source_cols]
+    return select(*records.c, *research_columns,
+                  ResearchSource.source_id.isnot(None).label('has_research_source')) \
+        .select_from(records.outerjoin(ResearchSource, ResearchSource.source_id == records.c.source_id))
+
+
+def load_records_flat(current_time: datetime) -> bool:
+    # Must run after the records of the current ETL run have been loaded and the old records have been dropped.
+    # The table is replaced in a single transaction, so readers either see the previous run's rows or the new ones
+    try:
+        with db_session() as session:
+            records_flat_select = get_records_flat_select(session, current_time)
+            session.query(RecordsFlat).delete()
+            session.execute(insert(RecordsFlat.__table__)
+                            .from_select([column.name for column in records_flat_select.selected_columns],
+                                         records_flat_select))
+            session.commit()
+        return True
+    except SQLAlchemyError as e:
+        # The API joins the source tables itself until records_flat holds the current records, so just report it
+        logging.error(e)
+        send_slack_message(f'Error occurred while loading records_flat into Postgres: {e}',
+                           channel='#dev-logging-etl')
+        return False
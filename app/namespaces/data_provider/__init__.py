@@ -1,3 +1,4 @@
 from .data_provider_controller import data_provider_ns
+from .data_provider_service import init_record_details_cache
 
 
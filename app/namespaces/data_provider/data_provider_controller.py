@@ -1,21 +1,70 @@
+import json
 import logging.config
 
 from flask_restx import Resource, Namespace
-from flask import jsonify, make_response, request
+from flask import jsonify, make_response, request, Response, stream_with_context, current_app as app
 
-from Pathogens.Arbo.API.Services.records_service import get_all_arbo_records, get_all_arbo_filter_options
+from Pathogens.Arbo.API.Services.records_service import get_all_arbo_records, get_all_arbo_filter_options, \
+    iter_all_arbo_records, get_arbo_records_version, get_all_arbo_records_json
 from Pathogens.Arbo.API.Services.visualizations_service import get_arbo_visualizations
 from Pathogens.Sero.API.Services.records_service import get_all_sarscov2_filter_options, get_all_sarscov2_records
-from .data_provider_service import get_record_details, get_country_seroprev_summaries, jitter_pins, \
-    get_all_filter_options
-from .data_provider_schema import RecordDetailsSchema, RecordsSchema, PaginatedRecordsSchema, StudyCountSchema
+from .data_provider_service import get_record_details, jitter_pins, \
+    get_all_filter_options, iter_jittered_pins, stream_records, get_filter_options_version, get_records_details, \
+    get_country_seroprev_summaries_sql, get_columns_to_query, get_records_payload, \
+    get_filtered_country_seroprev_summaries
+from .data_provider_schema import RecordDetailsSchema, RecordsSchema, PaginatedRecordsSchema, StudyCountSchema, \
+    CursorRecordsSchema, RecordDetailsBatchSchema, BatchSchema
+from app.namespaces.meta_analysis.meta_analysis_schema import MetaSchema
+from app.namespaces.meta_analysis.meta_analysis_service import get_meta_analysis_options, \
+    get_filtered_meta_analysis_records
 from app.utils import validate_request_input_against_schema, get_filtered_records, get_paginated_records, \
-    convert_start_end_dates, filter_columns
+    convert_start_end_dates, filter_columns, iter_filtered_records, stream_records_json, make_cached_response, \
+    get_records_version, get_filtered_records_page, get_filtered_records_json, DATE_FIELDS, records_to_arrow_table, \
+    write_arrow_stream, write_parquet, is_columnar_export_available, ARROW_STREAM_MIMETYPE, PARQUET_MIMETYPE, \
+    BatchRecordSnapshots, timed_stage
 
 data_provider_ns = Namespace('data_provider', description='Endpoints for getting database records.')
 logging.getLogger(__name__)
 
 
+def _is_stream_requested(data=None):
+    # Streaming can be requested with a "stream" payload field or a ?stream=true query arg
+    if data and data.get('stream'):
+        return True
+    return request.args.get('stream', 'false').lower() in ['true', '1']
+
+
+def _is_db_json_requested(data=None):
+    # Postgres can build the response body with a "db_json" payload field or a ?db_json=true query arg
+    if data and data.get('db_json'):
+        return True
+    return request.args.get('db_json', 'false').lower() in ['true', '1']
+
+
+def _get_country_seroprev_summary_json(records):
+    # Extra fields of a records body written by postgres
+    return {"country_seroprev_summary": get_country_seroprev_summaries_sql(records)}
+
+
+def _get_record_kwargs(data):
+    # Arguments of get_filtered_records (other than research_fields, filters and columns) from a /records payload
+    sampling_start_date, sampling_end_date = convert_start_end_dates(data, use_sampling_date=True)
+    publication_start_date, publication_end_date = convert_start_end_dates(data, use_sampling_date=False)
+    return {
+        'sampling_start_date': sampling_start_date,
+        'sampling_end_date': sampling_end_date,
+        'publication_start_date': publication_start_date,
+        'publication_end_date': publication_end_date,
+        'estimates_subgroup': data.get('estimates_subgroup', 'all_estimates'),
+        'prioritize_estimates_mode': data.get('prioritize_estimates_mode', 'dashboard'),
+        'include_in_srma': data.get('include_in_srma', False),
+        'include_disputed_regions': data.get('include_disputed_regions', False),
+        'include_subgeography_estimates': data.get('include_subgeography_estimates', False),
+        'unity_aligned_only': data.get('unity_aligned_only', False),
+        'include_records_without_latlngs': data.get('include_records_without_latlngs', False)
+    }
+
+
 @data_provider_ns.route('/records', methods=['POST'])
 class Records(Resource):
     @data_provider_ns.doc('An endpoint for getting all records from database with or without filters.')
@@ -43,56 +92,90 @@ class Records(Resource):
 
         columns_requested = data.get('columns')
         research_fields = data.get('research_fields')
-        estimates_subgroup = data.get('estimates_subgroup', 'all_estimates')
-        prioritize_estimates_mode = data.get('prioritize_estimates_mode', 'dashboard')
-        include_disputed_regions = data.get('include_disputed_regions', False)
-        include_subgeography_estimates = data.get('include_subgeography_estimates', False)
-        unity_aligned_only = data.get('unity_aligned_only', False)
-        include_records_without_latlngs = data.get('include_records_without_latlngs', False)
         calculate_country_seroprev_summaries = data.get('calculate_country_seroprev_summaries', True)
+        record_kwargs = _get_record_kwargs(data)
+        estimates_subgroup = record_kwargs['estimates_subgroup']
+
+        # Keeping columns_requested separate because we will need its original value later on
+        columns = get_columns_to_query(columns_requested, calculate_country_seroprev_summaries)
+
+        # Let postgres write the body, which is passed through as is
+        # Prioritized estimates are computed in python, so they are always serialized by the app
+        if _is_db_json_requested(data) and estimates_subgroup != 'prioritize_estimates':
+            record_kwargs.pop('prioritize_estimates_mode')
+            record_kwargs.pop('include_subgeography_estimates')
+            # The queried columns may include the columns needed by the summaries, only the requested ones are written
+            body = get_filtered_records_json(
+                research_fields, filters, columns, **record_kwargs, output_columns=columns_requested,
+                jitter_pins=not columns or ("pin_latitude" in columns and "pin_longitude" in columns),
+                get_extra_json=_get_country_seroprev_summary_json if calculate_country_seroprev_summaries else None)
+            return Response(body, mimetype='application/json')
+
+        # Stream the records as they are read, with the country summaries written after them
+        if _is_stream_requested(data):
+            records = iter_filtered_records(research_fields, filters, columns, **record_kwargs)
+            if not columns or ("pin_latitude" in columns and "pin_longitude" in columns):
+                records = iter_jittered_pins(records)
+            body = stream_records(records, columns_requested if calculate_country_seroprev_summaries else None,
+                                  calculate_country_seroprev_summaries)
+            return Response(stream_with_context(body), mimetype='application/json')
+
+        def get_result():
+            return get_records_payload(research_fields, filters, columns_requested,
+                                       calculate_country_seroprev_summaries, **record_kwargs)
+
+        # Unfiltered records only change with each ETL run, so they can be served from the response cache
+        is_unfiltered = not any((filters or {}).values()) and \
+            all(record_kwargs[date] is None for date in ['sampling_start_date', 'sampling_end_date',
+                                                         'publication_start_date', 'publication_end_date'])
+        if is_unfiltered:
+            cache_key = ('records', json.dumps(data, sort_keys=True))
+            return make_cached_response(cache_key, get_records_version(), get_result)
+        result = get_result()
+        with timed_stage('jsonify'):
+            return jsonify(result)
+
+
+@data_provider_ns.route('/records.<any(arrow, parquet):file_format>', methods=['POST'])
+@data_provider_ns.param('file_format', 'arrow for an Arrow IPC stream, or parquet for a Parquet file.')
+class ColumnarRecords(Resource):
+    @data_provider_ns.doc('An endpoint for getting records as a dictionary encoded Arrow stream or Parquet file.')
+    def post(self, file_format):
+        if not is_columnar_export_available():
+            return {"message": "Columnar exports require pyarrow to be installed"}, 501
 
-        sampling_start_date, sampling_end_date = convert_start_end_dates(data, use_sampling_date=True)
-        publication_start_date, publication_end_date = convert_start_end_dates(data, use_sampling_date=False)
-        include_in_srma = data.get('include_in_srma', False)
+        # Convert input payload to json and throw error if it doesn't exist
+        data = request.get_json()
+        if not data:
+            return {"message": "No input payload provided"}, 400
 
-        # Making a copy of columns_requested here because we will need its original value later on
-        columns = columns_requested
-        # If we intend to calculate country summaries we will need certain columns
-        if calculate_country_seroprev_summaries and columns:
-            COUNTRY_SEROPREV_SUMMARY_COLS = ['country', 'country_iso3', 'denominator_value', 'serum_pos_prevalence',
-                                             'estimate_grade']
-            columns = list(set(COUNTRY_SEROPREV_SUMMARY_COLS).union(set(columns)))
-
-        records = get_filtered_records(research_fields,
-                                       filters,
-                                       columns,
-                                       sampling_start_date=sampling_start_date,
-                                       sampling_end_date=sampling_end_date,
-                                       publication_start_date=publication_start_date,
-                                       publication_end_date=publication_end_date,
-                                       estimates_subgroup=estimates_subgroup,
-                                       prioritize_estimates_mode=prioritize_estimates_mode,
-                                       include_in_srma=include_in_srma,
-                                       include_disputed_regions=include_disputed_regions,
-                                       include_subgeography_estimates=include_subgeography_estimates,
-                                       unity_aligned_only=unity_aligned_only,
-                                       include_records_without_latlngs=include_records_without_latlngs)
-
-        # print(records)
+        # Log request info
+        logging.info("Endpoint Type: {type}, Endpoint Path: {path}, Arguments: {args}, Payload: {payload}".format(
+            type=request.environ['REQUEST_METHOD'],
+            path=request.environ['PATH_INFO'],
+            args=dict(request.args),
+            payload=data))
 
-        if not columns or ("pin_latitude" in columns and "pin_longitude" in columns):
-            records = jitter_pins(records)
+        # Validate input payload against the same schema as /records
+        payload, status_code = validate_request_input_against_schema(data, RecordsSchema())
+        if status_code != 200:
+            # If there was an error with the input payload, return the error and 422 response
+            return make_response(payload, status_code)
 
-        result = {"records": records}
+        columns = data.get('columns')
+        records = get_filtered_records(data.get('research_fields'), data.get('filters'), columns,
+                                       **_get_record_kwargs(data))
 
-        if calculate_country_seroprev_summaries:
-            # Compute seroprevalence summaries per country per estimate grade level
-            country_seroprev_summaries = get_country_seroprev_summaries(records)
-            result["country_seroprev_summary"] = country_seroprev_summaries
-            # Ensure that we only return the requested columns to streamline data sent over HTTP
-            if columns_requested:
-                result["records"] = filter_columns(result["records"], columns_requested)
-        return jsonify(result)
+        if not columns or ("pin_latitude" in columns and "pin_longitude" in columns):
+            with timed_stage('jitter_pins'):
+                records = jitter_pins(records)
+
+        # Dates of the records are formatted as ISO strings, they are stored as timestamps
+        with timed_stage(f'{file_format}_encode'):
+            table = records_to_arrow_table(records, columns, timestamp_columns=DATE_FIELDS)
+            if file_format == 'parquet':
+                return Response(write_parquet(table), mimetype=PARQUET_MIMETYPE)
+            return Response(write_arrow_stream(table), mimetype=ARROW_STREAM_MIMETYPE)
 
 
 # TODO: Deprecate
@@ -126,13 +209,18 @@ class PaginatedRecords(Resource):
         max_page_index = data.get('max_page_index')
         per_page = data.get('per_page', None)
         reverse = data.get('reverse', None)
-        columns = data.get('columns')
+        columns_requested = data.get('columns')
         research_fields = data.get('research_fields')
         estimates_subgroup = data.get('estimates_subgroup', 'all_estimates')
         prioritize_estimates_mode = data.get('prioritize_estimates_mode', 'dashboard')
         sampling_start_date, sampling_end_date = convert_start_end_dates(data, use_sampling_date=True)
         include_in_srma = data.get('include_in_srma', False)
 
+        # Records are sorted before being paginated, so we will need the sorting column
+        columns = columns_requested
+        if columns:
+            columns = list(set(columns).union({sorting_key or 'sampling_end_date'}))
+
         result = get_filtered_records(research_fields, filters, columns,
                                       sampling_start_date=sampling_start_date,
                                       sampling_end_date=sampling_end_date,
@@ -155,7 +243,145 @@ class PaginatedRecords(Resource):
 
         # Only paginate if pagination params min_page_index, max_page_index and per_page are specified (sorting_key="sampling_end_date", reverse=true, per_page=5 by default)
         result = get_paginated_records(**kwargs_not_none)
-        return jsonify(result)
+        # Ensure that we only return the requested columns to streamline data sent over HTTP
+        if columns_requested:
+            result = {page: filter_columns(records, columns_requested) for page, records in result.items()}
+        with timed_stage('jsonify'):
+            return jsonify(result)
+
+
+@data_provider_ns.route('/records/cursor', methods=['POST'])
+class CursorRecords(Resource):
+    @data_provider_ns.doc('An endpoint for getting the page of records after a cursor, with or without filters.')
+    def post(self):
+        # Convert input payload to json and throw error if it doesn't exist
+        data = request.get_json()
+        if not data:
+            return {"message": "No input payload provided"}, 400
+
+        # Log request info
+        logging.info("Endpoint Type: {type}, Endpoint Path: {path}, Arguments: {args}, Payload: {payload}".format(
+            type=request.environ['REQUEST_METHOD'],
+            path=request.environ['PATH_INFO'],
+            args=dict(request.args),
+            payload=data))
+
+        # Validate input payload
+        payload, status_code = validate_request_input_against_schema(data, CursorRecordsSchema())
+        if status_code != 200:
+            # If there was an error with the input payload, return the error and 422 response
+            return make_response(payload, status_code)
+
+        columns = data.get('columns')
+        sampling_start_date, sampling_end_date = convert_start_end_dates(data, use_sampling_date=True)
+        publication_start_date, publication_end_date = convert_start_end_dates(data, use_sampling_date=False)
+
+        try:
+            records, next_cursor = get_filtered_records_page(
+                research_fields=data.get('research_fields'),
+                filters=data.get('filters'),
+                columns=columns,
+                sampling_start_date=sampling_start_date,
+                sampling_end_date=sampling_end_date,
+                publication_start_date=publication_start_date,
+                publication_end_date=publication_end_date,
+                estimates_subgroup=data.get('estimates_subgroup', 'all_estimates'),
+                prioritize_estimates_mode=data.get('prioritize_estimates_mode', 'dashboard'),
+                include_in_srma=data.get('include_in_srma', False),
+                include_disputed_regions=data.get('include_disputed_regions', False),
+                include_subgeography_estimates=data.get('include_subgeography_estimates', False),
+                unity_aligned_only=data.get('unity_aligned_only', False),
+                include_records_without_latlngs=data.get('include_records_without_latlngs', False),
+                sorting_key=data.get('sorting_key') or 'sampling_end_date',
+                reverse=bool(data.get('reverse', False)),
+                per_page=data.get('per_page') or 5,
+                cursor=data.get('cursor'))
+        except ValueError as e:
+            return make_response({"message": str(e)}, 422)
+
+        if not columns or ("pin_latitude" in columns and "pin_longitude" in columns):
+            with timed_stage('jitter_pins'):
+                records = jitter_pins(records)
+        with timed_stage('jsonify'):
+            return jsonify({"records": records, "next_cursor": next_cursor})
+
+
+# Schema of the payload of each type of sub-request of a batch
+BATCH_SUB_REQUEST_SCHEMAS = {
+    'records': RecordsSchema,
+    'country_seroprev_summary': StudyCountSchema,
+    'meta_analysis': MetaSchema
+}
+
+
+def _get_batch_sub_request_result(sub_request_type, data, snapshots):
+    # Same result as the endpoint of the sub-request type, with the records read from the batch's snapshots
+    if sub_request_type == 'records':
+        return get_records_payload(data.get('research_fields'), data.get('filters'), data.get('columns'),
+                                   data.get('calculate_country_seroprev_summaries', True), snapshots=snapshots,
+                                   **_get_record_kwargs(data))
+
+    sampling_start_date, sampling_end_date = convert_start_end_dates(data, use_sampling_date=True)
+    if sub_request_type == 'country_seroprev_summary':
+        return get_filtered_country_seroprev_summaries(filters=data.get('filters'),
+                                                       sampling_start_date=sampling_start_date,
+                                                       sampling_end_date=sampling_end_date,
+                                                       unity_aligned_only=data.get('unity_aligned_only', False),
+                                                       snapshots=snapshots)
+
+    agg_var, meta_transformation, meta_technique = get_meta_analysis_options(data)
+    return get_filtered_meta_analysis_records(filters=data.get('filters'),
+                                              sampling_start_date=sampling_start_date,
+                                              sampling_end_date=sampling_end_date,
+                                              agg_var=agg_var,
+                                              transformation=meta_transformation,
+                                              technique=meta_technique,
+                                              snapshots=snapshots)
+
+
+@data_provider_ns.route('/batch', methods=['POST'])
+class Batch(Resource):
+    @data_provider_ns.doc('An endpoint for evaluating several records, country_seroprev_summary and meta_analysis '
+                          'requests against the same records.')
+    def post(self):
+        # Convert input payload to json and throw error if it doesn't exist
+        data = request.get_json()
+        if not data:
+            return {"message": "No input payload provided"}, 400
+
+        # Log request info
+        logging.info("Endpoint Type: {type}, Endpoint Path: {path}, Arguments: {args}, Payload: {payload}".format(
+            type=request.environ['REQUEST_METHOD'],
+            path=request.environ['PATH_INFO'],
+            args=dict(request.args),
+            payload=data))
+
+        # Validate input payload
+        payload, status_code = validate_request_input_against_schema(data, BatchSchema())
+        if status_code != 200:
+            # If there was an error with the input payload, return the error and 422 response
+            return make_response(payload, status_code)
+        sub_request_ids = [sub_request['id'] for sub_request in data['requests']]
+        if len(set(sub_request_ids)) != len(sub_request_ids):
+            return make_response({"message": "Sub-request ids must be unique"}, 422)
+
+        # Each variant of the records is only read once for the whole batch
+        snapshots = BatchRecordSnapshots()
+        results = {}
+        for sub_request in data['requests']:
+            sub_request_data = sub_request.get('payload') or {}
+            payload, status_code = validate_request_input_against_schema(
+                sub_request_data, BATCH_SUB_REQUEST_SCHEMAS[sub_request['type']]())
+            if status_code != 200:
+                # Invalid sub-requests get their own 422, the other sub-requests are still evaluated
+                results[sub_request['id']] = {"status": status_code, "body": payload}
+                continue
+            results[sub_request['id']] = {
+                "status": 200,
+                "body": _get_batch_sub_request_result(sub_request['type'], sub_request_data, snapshots)
+            }
+        with timed_stage('jsonify'):
+            return jsonify({"results": results})
 
 
 @data_provider_ns.route('/record_details/<string:source_id>', methods=['GET'])
@@ -177,9 +403,38 @@ class RecordDetails(Resource):
 
         # Get record details based on the source_id of the record
         record_details = get_record_details(source_id)
+        if record_details is None:
+            return make_response({"message": f"No record with source_id {source_id}"}, 404)
         return jsonify(record_details)
 
 
+@data_provider_ns.route('/record_details', methods=['POST'])
+class BatchRecordDetails(Resource):
+    @data_provider_ns.doc('An endpoint for getting the details of several records based on their source ids.')
+    def post(self):
+        # Convert input payload to json and throw error if it doesn't exist
+        data = request.get_json()
+        if not data:
+            return {"message": "No input payload provided"}, 400
+
+        # Log request info
+        logging.info("Endpoint Type: {type}, Endpoint Path: {path}, Arguments: {args}, Payload: {payload}".format(
+            type=request.environ['REQUEST_METHOD'],
+            path=request.environ['PATH_INFO'],
+            args=dict(request.args),
+            payload=data))
+
+        # Validate input payload
+        payload, status_code = validate_request_input_against_schema(data, RecordDetailsBatchSchema())
+        if status_code != 200:
+            # If there was an error with the input payload, return the error and 422 response
+            return make_response(payload, status_code)
+
+        # Records are returned in the order of the source ids, source ids without a record are left out
+        records_details = get_records_details(data['source_ids'])
+        return jsonify({"records": list(records_details.values())})
+
+
 # TODO: Deprecate
 @data_provider_ns.route('/country_seroprev_summary', methods=['GET', 'POST'])
 class GeogStudyCount(Resource):
@@ -191,13 +446,8 @@ class GeogStudyCount(Resource):
             path=request.environ['PATH_INFO'],
             args=dict(request.args)))
 
-        # Query all the records with no filters but only grab certain columns
-        columns = ['country', 'country_iso3', 'denominator_value', 'serum_pos_prevalence', 'estimate_grade']
-        records = get_filtered_records(filters=None, columns=columns, sampling_start_date=None, sampling_end_date=None)
-
-        # Compute seroprevalence summaries per country per estimate grade level
-        country_seroprev_summaries = get_country_seroprev_summaries(records)
-        return jsonify(country_seroprev_summaries)
+        # Summarize all the records with no filters
+        return jsonify(get_filtered_country_seroprev_summaries())
 
     def post(self):
         # Ensure payload is present
@@ -218,24 +468,15 @@ class GeogStudyCount(Resource):
             # If there was an error with the input payload, return the error and 422 response
             return make_response(payload, status_code)
 
-        # Query all the records with the desired filters. Pull only country, denom, and seroprev cols
-        filters = json_input.get('filters')
+        # Compute seroprevalence summaries per country per estimate grade level of the filtered records
         sampling_start_date, sampling_end_date = convert_start_end_dates(json_input, use_sampling_date=True)
-        unity_aligned_only = json_input.get('unity_aligned_only', False)
-        columns = ['country', 'country_iso3', 'denominator_value', 'serum_pos_prevalence', 'estimate_grade']
-        records = get_filtered_records(filters=filters,
-                                       columns=columns,
-                                       sampling_start_date=sampling_start_date,
-                                       sampling_end_date=sampling_end_date,
-                                       unity_aligned_only=unity_aligned_only)
-
-        # Check if no records are returned
-        if not records:
-            return jsonify(records)
-
-        # Compute seroprevalence summaries per country per estimate grade level
-        country_seroprev_summaries = get_country_seroprev_summaries(records)
-        return jsonify(country_seroprev_summaries)
+        result = get_filtered_country_seroprev_summaries(
+            filters=json_input.get('filters'),
+            sampling_start_date=sampling_start_date,
+            sampling_end_date=sampling_end_date,
+            unity_aligned_only=json_input.get('unity_aligned_only', False))
+        with timed_stage('jsonify'):
+            return jsonify(result)
 
 
 @data_provider_ns.route('/filter_options', methods=['GET'])
@@ -248,8 +489,8 @@ class Records(Resource):
             path=request.environ['PATH_INFO'],
             args=dict(request.args)))
 
-        result = get_all_filter_options()
-        return jsonify(result)
+        version = get_filter_options_version()
+        return make_cached_response('filter_options', version, lambda: get_all_filter_options(version))
 
 # NEW SERO ENDPOINTS ------------------------------------------------------------------------------------------------------------
 
@@ -268,8 +509,8 @@ class SarsCov2Records(Resource):
 class ArboFilterOptions(Resource):
     @data_provider_ns.doc('An endpoint for getting all serotracker filter options.')
     def get(self):
-        result = get_all_sarscov2_filter_options()
-        return jsonify(result)
+        return make_cached_response('sarscov2_filter_options', get_filter_options_version(),
+                                    get_all_sarscov2_filter_options)
 
 # ARBO ENDPOINTS ---------------------------------------------------------------------------------------------------------------
 
@@ -277,22 +518,23 @@ class ArboFilterOptions(Resource):
 class ArboRecords(Resource):
     @data_provider_ns.doc('An endpoint for getting all arbotracker records from database with or without filters.')
     def get(self):
-        records = get_all_arbo_records()
-
-        result = {"records": records}
+        if _is_db_json_requested():
+            return Response(get_all_arbo_records_json(), mimetype='application/json')
 
-        # print(result)
+        if _is_stream_requested():
+            batch_size = app.config.get('RECORDS_STREAM_BATCH_SIZE', 1000)
+            body = stream_records_json(iter_all_arbo_records(batch_size))
+            return Response(stream_with_context(body), mimetype='application/json')
 
-        return jsonify(result)
+        return make_cached_response('arbo_records', get_arbo_records_version(),
+                                    lambda: {"records": get_all_arbo_records()})
 
 
 @data_provider_ns.route('/arbo/filter_options', methods=['GET'])
 class ArboFilterOptions(Resource):
     @data_provider_ns.doc('An endpoint for getting all arbotracker filter options.')
     def get(self):
-        result = get_all_arbo_filter_options()
-        # print(result)
-        return jsonify(result)
+        return make_cached_response('arbo_filter_options', get_arbo_records_version(), get_all_arbo_filter_options)
 
 
 @data_provider_ns.route('/data_provider/arbo/visualizations', methods=['GET'])
@@ -50,6 +50,10 @@ class RecordsSchema(Schema):
     unity_aligned_only = fields.Boolean(allow_none=True)
     include_records_without_latlngs = fields.Boolean(allow_none=True)
     calculate_country_seroprev_summaries = fields.Boolean(allow_none=True)
+    # Write the response as it is produced instead of building it in memory first
+    stream = fields.Boolean(allow_none=True)
+    # Let postgres build the response body, records are then ordered by source_id
+    db_json = fields.Boolean(allow_none=True)
 
 
 class PaginatedRecordsSchema(RecordsSchema):
@@ -62,12 +66,26 @@ class PaginatedRecordsSchema(RecordsSchema):
     reverse = fields.Boolean(allow_none=True)
 
 
+class CursorRecordsSchema(RecordsSchema):
+    sorting_key = fields.String(validate=validate.OneOf(["sampling_end_date", "publication_date", "denominator_value",
+                                                         "serum_pos_prevalence", "overall_risk_of_bias",
+                                                         "source_name", "source_id"]), allow_none=True)
+    per_page = fields.Integer(validate=validate.Range(min=1, max=1000), allow_none=True)
+    reverse = fields.Boolean(allow_none=True)
+    # next_cursor returned with the previous page, omitted for the first page
+    cursor = fields.String(allow_none=True)
+
+
 class RecordDetailsSchema(Schema):
     source_id = fields.UUID(required=True)
     sampling_start_date = fields.String()
     sampling_end_date = fields.String()
 
 
+class RecordDetailsBatchSchema(Schema):
+    source_ids = fields.List(fields.UUID(), required=True, validate=validate.Length(min=1, max=500))
+
+
 class StudyCountSchema(Schema):
     filters = fields.Dict(
         keys=fields.String(validate=validate.OneOf(["country", "source_type", "overall_risk_of_bias",
@@ -81,3 +99,15 @@ class StudyCountSchema(Schema):
     sampling_start_date = fields.String()
     sampling_end_date = fields.String()
     unity_aligned_only = fields.Boolean(allow_none=True)
+
+
+class BatchSubRequestSchema(Schema):
+    id = fields.String(required=True)
+    type = fields.String(required=True, validate=validate.OneOf(['records', 'country_seroprev_summary',
+                                                                 'meta_analysis']))
+    # Payload of the endpoint of the sub-request type, validated against that endpoint's schema
+    payload = fields.Dict(allow_none=True)
+
+
+class BatchSchema(Schema):
+    requests = fields.List(fields.Nested(BatchSubRequestSchema), required=True, validate=validate.Length(min=1, max=20))
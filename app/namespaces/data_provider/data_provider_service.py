@@ -1,226 +1,457 @@
 from app.serotracker_sqlalchemy.models import PopulationGroupOptions
 import pandas as pd
-import numpy
 import math
-from random import uniform
+import copy
+import threading
+from collections import OrderedDict
+from uuid import UUID
 from typing import Dict, Any
 
 from app.serotracker_sqlalchemy import db_session, DashboardSource, Country, ResearchSource, State, City, \
-    AntibodyTarget, db_model_config, dashboard_source_cols
-from app.utils import _get_isotype_col_expression
-from sqlalchemy import distinct, func
+    AntibodyTarget, db_model_config, dashboard_source_cols, RecordsFlat
+from app.utils import _get_isotype_col_expression, _apply_agg_query, _use_records_flat, stream_records_json, \
+    get_records_version, jitter_records, get_pin_offset, get_filtered_records, filter_columns, timed_stage
+from sqlalchemy import distinct, func, select, null, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from app.database_etl.postgres_tables_handler import get_filter_static_options
 
+# Estimate grades summarized for every country, from largest to smallest geographic scope
+ESTIMATE_GRADES = ['National', 'Regional', 'Local', 'Sublocal', 'Hyperlocal']
+# Columns needed to compute country seroprevalence summaries
+COUNTRY_SEROPREV_SUMMARY_COLS = ['country', 'country_iso3', 'denominator_value', 'serum_pos_prevalence',
+                                 'estimate_grade']
+
+
+def _get_record_details_query(session):
+    # Returns the query and the source_id column to filter its records on
+    table_infos = db_model_config['supplementary_table_info']
+
+    # The denormalized records written by the ETL already have one row per record
+    if _use_records_flat():
+        fields_list = [RecordsFlat.source_id] + [getattr(RecordsFlat, col) for col in dashboard_source_cols]
+        fields_list.append(RecordsFlat.country)
+        fields_list += [getattr(RecordsFlat, sup_table['entity']) for sup_table in table_infos]
+        fields_list.append(RecordsFlat.isotypes_reported.label('isotypes'))
+        return session.query(*fields_list), RecordsFlat.source_id
+
+    # Build list of columns to use in query starting with airtable source columns
+    # source_id is selected as well so that the details of several records can be told apart
+    fields_list = [DashboardSource.source_id] + [getattr(DashboardSource, col) for col in dashboard_source_cols]
+    fields_list.append(Country.country_name.label('country'))
+    # Will need to group by every field that isn't array aggregated
+    groupby_fields = fields_list.copy()
+
+    # Aggregate the values of the supplementary tables into arrays so that each record is a single row
+    for sup_table in table_infos:
+        fields_list.append(_apply_agg_query(getattr(sup_table['main_table'], f"{sup_table['entity']}_name"),
+                                            sup_table['entity']))
+
+    # Construct case when expression to generate isotype column based on isotype bool cols
+    query = session.query(*fields_list, _get_isotype_col_expression())
+
+    # Build query to join supplementary tables to airtable source
+    for sup_table in table_infos:
+        main_table = sup_table['main_table']
+        bridge_table = sup_table['bridge_table']
+        entity_id = f"{sup_table['entity']}_id"
+        query = query.outerjoin(bridge_table, bridge_table.source_id == DashboardSource.source_id)\
+            .outerjoin(main_table, getattr(bridge_table, entity_id) == getattr(main_table, entity_id))
+
+    # Join on country table
+    query = query.outerjoin(Country, Country.country_id == DashboardSource.country_id)
+    return query.group_by(*groupby_fields), DashboardSource.source_id
+
+
+def _format_record_details(record):
+    # Convert dates to use isoformat
+    for col in ['sampling_end_date', 'sampling_start_date']:
+        if record[col] is not None:
+            record[col] = record[col].isoformat()
+    return record
+
+
+class RecordDetailsCache:
+    '''Least recently used cache of record details, keyed by (records version, source_id)
+    so that details are queried again after each ETL run'''
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._details = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, version, source_ids):
+        # Returns the cached details of the source ids, leaving out the ones that aren't cached
+        found = {}
+        with self._lock:
+            for source_id in source_ids:
+                record = self._details.get((version, source_id))
+                if record is not None:
+                    self._details.move_to_end((version, source_id))
+                    found[source_id] = record
+        return found
+
+    def put_many(self, version, records):
+        with self._lock:
+            for source_id, record in records.items():
+                self._details[(version, source_id)] = record
+                self._details.move_to_end((version, source_id))
+            while len(self._details) > self.max_entries:
+                self._details.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._details.clear()
+
+
+_record_details_cache = RecordDetailsCache()
+
+
+def init_record_details_cache(flask_app):
+    '''Sizes the cache of record details from RECORD_DETAILS_CACHE_MAX_ENTRIES'''
+    _record_details_cache.max_entries = flask_app.config.get('RECORD_DETAILS_CACHE_MAX_ENTRIES',
+                                                             _record_details_cache.max_entries)
+
+
+def get_records_details(source_ids):
+    '''Gets the details of several records with a single query, reusing the details cached for the current records
+    :param source_ids: source ids of the records
+    :returns a dict mapping each source id (as a string) that exists to its record details
+    '''
+    # Normalize the source ids so that they match the keys of the queried records
+    source_ids = [str(UUID(str(source_id))) for source_id in source_ids]
+    version = get_records_version()
+    records = _record_details_cache.get_many(version, source_ids)
+
+    missing_source_ids = [source_id for source_id in dict.fromkeys(source_ids) if source_id not in records]
+    if missing_source_ids:
+        with db_session() as session:
+            query, source_id_col = _get_record_details_query(session)
+            query = query.filter(source_id_col.in_(missing_source_ids))
+            queried_records = {str(row.source_id): _format_record_details(row._asdict()) for row in query.all()}
+        _record_details_cache.put_many(version, queried_records)
+        records.update(queried_records)
+
+    # Cached details are shared between requests, so return copies
+    return {source_id: copy.deepcopy(records[source_id]) for source_id in source_ids if source_id in records}
 
-def _get_parsed_record(results):
-    # Store columns that are multi select and that need to be converted to list
-    multi_select_cols = db_model_config['multi_select_columns']
-    results_df = pd.DataFrame(results)
 
-    # Create one dictionary of record details to return
-    record_details = {}
-    for col in results_df.columns:
-        # Convert multi select values into an array
-        if col in multi_select_cols:
-            multi_select_vals = [e for e in list(set(getattr(results_df, col).tolist())) if e is not None]
-            record_details[col] = multi_select_vals
+def get_record_details(source_id):
+    '''Gets the details of a record, with its multi select columns aggregated into lists
+    :returns the record details, or None if there is no record with that source id
+    '''
+    return next(iter(get_records_details([source_id]).values()), None)
 
-        # Otherwise just return the single value of the column
-        else:
-            record_details[col] = results_df.iloc[0][col]
 
-        # Convert to float or int if numpy - otherwise cannot jsonify endpoint return result
-        if isinstance(record_details[col], numpy.float64):
-            record_details[col] = float(record_details[col])
+def get_country_seroprev_summaries(records):
+    # Turn the columns that are summarized into a df and remove records without a country
+    if not records:
+        return []
+    records_df = pd.DataFrame({col: [record.get(col) for record in records] for col in COUNTRY_SEROPREV_SUMMARY_COLS})
+    records_df = records_df[records_df['country'].notna()]
+    denominator_values = pd.to_numeric(records_df['denominator_value'], errors='coerce')
+    prevalences = pd.to_numeric(records_df['serum_pos_prevalence'], errors='coerce')
+
+    # Summarize every country and every (country, estimate grade) pair in one grouped pass each
+    # Countries are kept in the order they first appear in, and take the ISO3 code of their first record
+    country_iso3s = records_df.drop_duplicates(subset='country').set_index('country')['country_iso3']
+    country_summaries = denominator_values.groupby(records_df['country'], sort=False).agg(['size', 'sum'])
+    grade_summaries = prevalences.groupby([records_df['country'], records_df['estimate_grade']]) \
+        .agg(['size', 'min', 'max']).to_dict('index')
 
-        if isinstance(record_details[col], numpy.int64):
-            record_details[col] = int(record_details[col])
+    study_counts_list = []
+    for country, (n_estimates, n_tests_administered) in country_summaries.iterrows():
+        # Summarize seroprev estimate info at each estimate grade level
+        grades_seroprev_summaries_dict = {}
+        for grade in ESTIMATE_GRADES:
+            grade_summary = grade_summaries.get((country, grade))
+            if grade_summary is not None:
+                minimum, maximum = grade_summary['min'], grade_summary['max']
+                grades_seroprev_summaries_dict[grade] = {
+                    'n_estimates': int(grade_summary['size']),
+                    'min_estimate': float(minimum) if not math.isnan(minimum) else None,
+                    'max_estimate': float(maximum) if not math.isnan(maximum) else None
+                }
+            else:
+                grades_seroprev_summaries_dict[grade] = {'n_estimates': 0, 'min_estimate': None, 'max_estimate': None}
+
+        study_counts_list.append({
+            'country': country,
+            'country_iso3': country_iso3s[country],
+            'n_estimates': int(n_estimates),
+            'n_tests_administered': int(n_tests_administered),
+            'seroprevalence_estimate_summary': grades_seroprev_summaries_dict
+        })
+    return study_counts_list
 
-        # Convert from numpy bool to standard bool - otherwise cannot jsonify endpoint return result
-        if isinstance(record_details[col], numpy.bool_):
-            record_details[col] = bool(record_details[col])
-    return record_details
 
+class CountrySeroprevSummaryAccumulator:
+    '''Builds the same payload as get_country_seroprev_summaries one record at a time,
+    so that summaries can be computed while records are being streamed'''
+
+    def __init__(self):
+        # Countries are kept in the order they are first seen
+        self._summaries = {}
+
+    def add(self, record):
+        country = record.get('country')
+        if country is None:
+            return
+        summary = self._summaries.get(country)
+        if summary is None:
+            summary = {'country': country,
+                       'country_iso3': record.get('country_iso3'),
+                       'n_estimates': 0,
+                       'n_tests_administered': 0,
+                       'seroprevalence_estimate_summary': {grade: {'n_estimates': 0,
+                                                                   'min_estimate': None,
+                                                                   'max_estimate': None}
+                                                           for grade in ESTIMATE_GRADES}}
+            self._summaries[country] = summary
+
+        summary['n_estimates'] += 1
+        denominator_value = record.get('denominator_value')
+        if denominator_value is not None:
+            summary['n_tests_administered'] += denominator_value
+
+        grade_summary = summary['seroprevalence_estimate_summary'].get(record.get('estimate_grade'))
+        if grade_summary is not None:
+            grade_summary['n_estimates'] += 1
+            prevalence = record.get('serum_pos_prevalence')
+            if prevalence is not None:
+                if grade_summary['min_estimate'] is None or prevalence < grade_summary['min_estimate']:
+                    grade_summary['min_estimate'] = prevalence
+                if grade_summary['max_estimate'] is None or prevalence > grade_summary['max_estimate']:
+                    grade_summary['max_estimate'] = prevalence
+
+    def get_summaries(self):
+        summaries = list(self._summaries.values())
+        for summary in summaries:
+            summary['n_tests_administered'] = int(summary['n_tests_administered'])
+        return summaries
+
+
+def _jitter_pin(record, locations_seen):
+    if record["pin_latitude"] and record["pin_longitude"]:
+        loc = (record['pin_latitude'], record['pin_longitude'])
+        if loc in locations_seen:
+            lat_diff, lng_diff = get_pin_offset(str(record.get('source_id')))
+            record['pin_latitude'] += lat_diff
+            record['pin_longitude'] += lng_diff
+        else:
+            locations_seen.add(loc)
+    return record
 
-def get_record_details(source_id):
-    with db_session() as session:
-        try:
-            # Construct case when expression to generate isotype column based on isotype bool cols
-            isotype_case_expression = _get_isotype_col_expression()
-
-            # Build list of columns to use in query starting with airtable source columns
-            fields_list = []
-            for col in dashboard_source_cols:
-                fields_list.append(getattr(DashboardSource, col))
-
-            # Store info about supplementary tables to join to airtable source
-            table_infos = db_model_config['supplementary_table_info']
-
-            # Add columns from supplementary tables and add isotype col expression
-            for sup_table in table_infos:
-                fields_list.append(getattr(sup_table['main_table'], f"{sup_table['entity']}_name").label(sup_table['entity']))
-            fields_list.append(getattr(Country, 'country_name').label('country'))
-
-            query = session.query(*fields_list, isotype_case_expression)
-
-            # Build query to join supplementary tables to airtable source
-            for sup_table in table_infos:
-                main_table = sup_table['main_table']
-                bridge_table = sup_table['bridge_table']
-                entity_id = f"{sup_table['entity']}_id"
-                query = query.outerjoin(bridge_table, bridge_table.source_id == DashboardSource.source_id)\
-                    .outerjoin(main_table, getattr(bridge_table, entity_id) == getattr(main_table, entity_id))
-
-            # Join on country table
-            query = query.outerjoin(Country, Country.country_id == DashboardSource.country_id)
-
-            # Filter by input source id and convert results to dicts
-            query = query.filter(DashboardSource.source_id == source_id)
-            result = query.all()
-            result = [x._asdict() for x in result]
-
-            # If multiple records are returned, parse results to return one record
-            if len(result) > 1:
-                result = _get_parsed_record(result)
-            else:
-                result = result[0]
 
-            # Convert dates to use isoformat
-            if result['sampling_end_date'] is not None:
-                result['sampling_end_date'] = result['sampling_end_date'].isoformat()
-            if result['sampling_start_date'] is not None:
-                result['sampling_start_date'] = result['sampling_start_date'].isoformat()
+# Modify record coordinates
+# to ensure that pins are not directly at the same location
+def jitter_pins(records):
+    # Pins are moved by an offset derived from their source_id, so the same records are always jittered the same way
+    return jitter_records(records)
 
-        except Exception as e:
-            print(e)
-    return result
 
+def iter_jittered_pins(records):
+    # Same as jitter_pins, but jitters each record as it is consumed
+    locations_seen = set()
+    for record in records:
+        yield _jitter_pin(record, locations_seen)
+
+
+def stream_records(records, columns=None, calculate_country_seroprev_summaries=True):
+    '''Serializes records as they are produced, without holding the full payload in memory
+    :param records: iterable of record dicts
+    :param columns: if supplied, only these columns are written for each record
+    :param calculate_country_seroprev_summaries: whether to add the country_seroprev_summary after the records,
+    which is accumulated from every record (including columns that are not written) in the same pass
+    :returns a generator of JSON text chunks
+    '''
+    summary_accumulator = CountrySeroprevSummaryAccumulator() if calculate_country_seroprev_summaries else None
+
+    def gather_records():
+        for record in records:
+            if summary_accumulator is not None:
+                summary_accumulator.add(record)
+            yield {col: record.get(col) for col in columns} if columns else record
+
+    get_trailer = (lambda: {"country_seroprev_summary": summary_accumulator.get_summaries()}) \
+        if summary_accumulator is not None else None
+    return stream_records_json(gather_records(), get_trailer)
+
+
+def _json_object_sql(**items):
+    # json_build_object with the keys sorted, like the app's JSON provider writes them
+    return func.json_build_object(*[element for key in sorted(items) for element in (key, items[key])])
+
+
+def get_country_seroprev_summaries_sql(records):
+    '''Same summaries as get_country_seroprev_summaries, built by postgres for get_filtered_records_json
+    :param records: records CTE ordered by source_id, with the columns summarized per country
+    :returns a scalar subquery of the JSON list of summaries
+    '''
+    has_country = records.c.country.isnot(None)
+    # Countries are kept in the order they first appear in, and take the ISO3 code of their first record
+    countries = select(records.c.country,
+                       func.array_agg(aggregate_order_by(records.c.country_iso3, records.c.source_id))[1]
+                       .label('country_iso3'),
+                       func.count().label('n_estimates'),
+                       func.coalesce(func.sum(records.c.denominator_value), 0).label('n_tests_administered'),
+                       func.array_agg(aggregate_order_by(records.c.source_id, records.c.source_id))[1]
+                       .label('first_source_id')) \
+        .where(has_country).group_by(records.c.country).subquery('countries')
+    grades = select(records.c.country, records.c.estimate_grade, func.count().label('n_estimates'),
+                    func.min(records.c.serum_pos_prevalence).label('min_estimate'),
+                    func.max(records.c.serum_pos_prevalence).label('max_estimate')) \
+        .where(has_country).group_by(records.c.country, records.c.estimate_grade).cte('grades')
+
+    # Summarize seroprev estimate info at each estimate grade level
+    grades_seroprev_summaries = {}
+    for grade in ESTIMATE_GRADES:
+        grade_summary = select(_json_object_sql(n_estimates=grades.c.n_estimates, min_estimate=grades.c.min_estimate,
+                                                max_estimate=grades.c.max_estimate)) \
+            .where(grades.c.country == countries.c.country, grades.c.estimate_grade == grade).scalar_subquery()
+        grades_seroprev_summaries[grade] = func.coalesce(grade_summary, _json_object_sql(
+            n_estimates=0, min_estimate=null(), max_estimate=null()))
+
+    summary = _json_object_sql(country=countries.c.country, country_iso3=countries.c.country_iso3,
+                               n_estimates=countries.c.n_estimates,
+                               n_tests_administered=countries.c.n_tests_administered,
+                               seroprevalence_estimate_summary=_json_object_sql(**grades_seroprev_summaries))
+    return select(func.coalesce(func.json_agg(aggregate_order_by(summary, countries.c.first_source_id)),
+                                literal_column("'[]'::json"))).scalar_subquery()
+
+
+def get_columns_to_query(columns_requested=None, calculate_country_seroprev_summaries=True):
+    # If we intend to calculate country summaries we will need certain columns
+    if calculate_country_seroprev_summaries and columns_requested:
+        return list(set(COUNTRY_SEROPREV_SUMMARY_COLS).union(set(columns_requested)))
+    return columns_requested
+
+
+def get_records_payload(research_fields=False, filters=None, columns_requested=None,
+                        calculate_country_seroprev_summaries=True, snapshots=None, **record_kwargs):
+    '''Builds the body of a /records response
+    :param columns_requested: columns returned for each record, or None for every column
+    :param snapshots: BatchRecordSnapshots to read the records from
+    :param record_kwargs: the other arguments of get_filtered_records
+    :returns a dict with the records and, if calculate_country_seroprev_summaries is set, the country summaries
+    '''
+    columns = get_columns_to_query(columns_requested, calculate_country_seroprev_summaries)
+    records = get_filtered_records(research_fields, filters, columns, snapshots=snapshots, **record_kwargs)
+
+    if not columns or ("pin_latitude" in columns and "pin_longitude" in columns):
+        with timed_stage('jitter_pins'):
+            records = jitter_pins(records)
+
+    result = {"records": records}
+
+    if calculate_country_seroprev_summaries:
+        # Compute seroprevalence summaries per country per estimate grade level
+        with timed_stage('country_seroprev_summaries'):
+            result["country_seroprev_summary"] = get_country_seroprev_summaries(records)
+        # Ensure that we only return the requested columns to streamline data sent over HTTP
+        if columns_requested:
+            result["records"] = filter_columns(result["records"], columns_requested)
+    return result
 
-def get_country_seroprev_summaries(records):
-    # Turn records into df and remove list from country
-    records_df = pd.DataFrame(records)
 
-    # Get unique list of countries
-    countries = records_df.country.dropna().unique()
-    study_counts_list = []
+def get_filtered_country_seroprev_summaries(filters=None, sampling_start_date=None, sampling_end_date=None,
+                                            unity_aligned_only=False, snapshots=None):
+    '''Builds the body of a /country_seroprev_summary response
+    :param snapshots: BatchRecordSnapshots to read the records from
+    :returns the country summaries of the records matching the filters
+    '''
+    # Query all the records with the desired filters. Pull only the summarized cols
+    records = get_filtered_records(filters=filters,
+                                   columns=COUNTRY_SEROPREV_SUMMARY_COLS,
+                                   sampling_start_date=sampling_start_date,
+                                   sampling_end_date=sampling_end_date,
+                                   unity_aligned_only=unity_aligned_only,
+                                   snapshots=snapshots)
+    with timed_stage('country_seroprev_summaries'):
+        return get_country_seroprev_summaries(records)
+
+
+def get_filter_options_version():
+    # Filter options come from the records and the population group options, which are both replaced by the ETL
+    with db_session() as session:
+        population_group_options_version = session.query(func.max(PopulationGroupOptions.created_at)).scalar()
+    return get_records_version(), population_group_options_version
 
-    # For each country, create a payload with all the seroprev summary info
-    for country in countries:
-        country_seroprev_summary_dict = {}
-        country_seroprev_summary_dict['country'] = country
-        records_for_country = records_df[records_df['country'] == country]
 
-        # Get country ISO3 code
-        country_seroprev_summary_dict['country_iso3'] = records_for_country['country_iso3'].iloc[0]
+def _get_distinct_values_subquery(session, column, label, accepted_values=None):
+    # Array of the distinct non null values of a column, computed in a subquery of the filter options statement
+    query = session.query(func.array_agg(distinct(column))).filter(column.isnot(None))
+    if accepted_values is not None:
+        query = query.filter(column.in_(accepted_values))
+    return query.scalar_subquery().label(label)
 
-        # Get total number of seroprev estimates in country
-        country_seroprev_summary_dict['n_estimates'] = records_for_country.shape[0]
 
-        # Get total number of tests administered in country
-        country_seroprev_summary_dict['n_tests_administered'] = int(records_for_country.denominator_value.sum())
+def _isoformat(date):
+    return date.isoformat() if date is not None else None
 
-        # Summarize seroprev estimate info at each estimate grade level
-        estimate_grades = ['National', 'Regional', 'Local', 'Sublocal', 'Hyperlocal']
-        grades_seroprev_summaries_dict = {}
-        for grade in estimate_grades:
-            estimate_grade_dict = {}
-            records_for_grade = records_for_country[records_for_country['estimate_grade'] == grade]
-            n_estimates = records_for_grade.shape[0]
-
-            if n_estimates == 0:
-                estimate_grade_dict['n_estimates'] = 0
-                estimate_grade_dict['min_estimate'] = None
-                estimate_grade_dict['max_estimate'] = None
-            else:
-                # Add number of estimates for that grade
-                estimate_grade_dict['n_estimates'] = n_estimates
-                minimum = records_for_grade.serum_pos_prevalence.min()
-                maximum = records_for_grade.serum_pos_prevalence.max()
-                # Add min and max seroprev estimates
-                estimate_grade_dict['min_estimate'] = minimum if not math.isnan(minimum) else None
-                estimate_grade_dict['max_estimate'] = maximum if not math.isnan(maximum) else None
-            grades_seroprev_summaries_dict[grade] = estimate_grade_dict
-        country_seroprev_summary_dict['seroprevalence_estimate_summary'] = grades_seroprev_summaries_dict
-        study_counts_list.append(country_seroprev_summary_dict)
-    return study_counts_list
 
+# Filter options only change with each ETL run, so they are only queried once per version
+_filter_options_cache = {'version': None, 'options': None}
+_filter_options_lock = threading.Lock()
 
-# Modify record coordinates
-# to ensure that pins are not directly at the same location
-def jitter_pins(records):
-    locations_seen = set()
-    for record in records:
-        if record["pin_latitude"] and record["pin_longitude"]:
-            loc = f"{record['pin_latitude']}_{record['pin_longitude']}"
-            if loc in locations_seen:
-                # For reference: 0.1 degrees is approx 11km at the equator
-                lat_diff = uniform(-0.5, 0.5)
-                lng_diff = uniform(-0.5, 0.5)
-                record['pin_latitude'] += lat_diff
-                record['pin_longitude'] += lng_diff
-                locations_seen.add(f"{record['pin_latitude']}_{record['pin_longitude']}")
-            else:
-                locations_seen.add(loc)
-    return records
 
+def get_all_filter_options(version=None) -> Dict[str, Any]:
+    '''Gets the options of every filter, with a single statement
+    :param version: result of get_filter_options_version, if supplied the options are reused until it changes
+    :returns a dict mapping each filter to its options
+    '''
+    if version is not None and _filter_options_cache['version'] == version:
+        return copy.deepcopy(_filter_options_cache['options'])
 
-def get_all_filter_options() -> Dict[str, Any]:
     with db_session() as session:
-        options = get_filter_static_options()
-
-        # Get countries
-        query = session.query(distinct(getattr(Country, "country_name")))
-        results = [q[0] for q in query if q[0] is not None]
-        # sort countries in alpha order
-        options["country"] = sorted(results)
-
-        # Get genpop
-        query = session.query(distinct(ResearchSource.genpop))
-        results = [q[0] for q in query if q[0] is not None]
-        options["genpop"] = sorted(results)
-
-        # Get subgroup_var
-        query = session.query(distinct(DashboardSource.subgroup_var))
-        results = [q[0] for q in query if q[0] is not None]
-        options["subgroup_var"] = sorted(results)
-
-        # Get subgroup_cat
-        query = session.query(distinct(ResearchSource.subgroup_cat))
-        results = [q[0] for q in query if q[0] is not None]
-        options["subgroup_cat"] = sorted(results)
-
-        # Get state
-        query = session.query(distinct(State.state_name))
-        results = [q[0] for q in query if q[0] is not None]
-        options["state"] = sorted(results)
-
-        # Get city
-        query = session.query(distinct(City.city_name))
-        results = [q[0] for q in query if q[0] is not None]
-        options["city"] = sorted(results)
-
-        # Only surface Spike and Nucleocapsid anitbody target options because only options that are relevant for
-        # interpreting seroprev data in the context of vaccines
-        query = session.query(distinct(AntibodyTarget.antibody_target_name))
-        results = [q[0] for q in query if q[0] is not None and q[0] in ['Spike', 'Nucleocapsid (N-protein)']]
-        options["antibody_target"] = sorted(results)
-
-        options["max_sampling_end_date"] = session.query(func.max(DashboardSource.sampling_end_date))[0][0].isoformat()
-        options["min_sampling_end_date"] = session.query(func.min(DashboardSource.sampling_end_date))[0][0].isoformat()
-        options["max_publication_end_date"] = session.query(func.max(DashboardSource.publication_date))[0][
-            0].isoformat()
-        options["min_publication_end_date"] = session.query(func.min(DashboardSource.publication_date))[0][
-            0].isoformat()
-        options["last_updated"] = session.query(func.max(DashboardSource.created_at))[0][0].isoformat()
-        options["most_recent_publication_date"] = \
-            session.query(func.max(DashboardSource.publication_date))[0][0].isoformat()
-
-
-        # Get population group options
-        results = session.query(PopulationGroupOptions.order, PopulationGroupOptions.name, PopulationGroupOptions.french_name, PopulationGroupOptions.german_name)
-        # result[0]: Order associated with filter option, records are sorted by this Order
-        # result[1]: English translation of filter option
-        # result[2]: French translation of filter option
-        options["population_group"] = [{"english": result[1], "french": result[2], "german": result[3]} for result in sorted(results, key=lambda result: result[0])]
-        
-        return options
+        distinct_values = [
+            _get_distinct_values_subquery(session, Country.country_name, "country"),
+            _get_distinct_values_subquery(session, ResearchSource.genpop, "genpop"),
+            _get_distinct_values_subquery(session, ResearchSource.subgroup_cat, "subgroup_cat"),
+            _get_distinct_values_subquery(session, State.state_name, "state"),
+            _get_distinct_values_subquery(session, City.city_name, "city"),
+            # Only surface Spike and Nucleocapsid anitbody target options because only options that are relevant for
+            # interpreting seroprev data in the context of vaccines
+            _get_distinct_values_subquery(session, AntibodyTarget.antibody_target_name, "antibody_target",
+                                          accepted_values=['Spike', 'Nucleocapsid (N-protein)'])
+        ]
+        # Population group options are sorted by their order, along with their translations
+        population_group_translations = [
+            session.query(func.array_agg(aggregate_order_by(column, PopulationGroupOptions.order)))
+                .scalar_subquery().label(label)
+            for column, label in [(PopulationGroupOptions.name, "english"),
+                                  (PopulationGroupOptions.french_name, "french"),
+                                  (PopulationGroupOptions.german_name, "german")]
+        ]
+        # The dashboard source aggregates are computed in one scan of the table
+        result = session.query(
+            *distinct_values,
+            *population_group_translations,
+            func.array_agg(distinct(DashboardSource.subgroup_var))
+                .filter(DashboardSource.subgroup_var.isnot(None)).label("subgroup_var"),
+            func.max(DashboardSource.sampling_end_date).label("max_sampling_end_date"),
+            func.min(DashboardSource.sampling_end_date).label("min_sampling_end_date"),
+            func.max(DashboardSource.publication_date).label("max_publication_end_date"),
+            func.min(DashboardSource.publication_date).label("min_publication_end_date"),
+            func.max(DashboardSource.created_at).label("last_updated")
+        ).select_from(DashboardSource).one()._asdict()
+
+    options = get_filter_static_options()
+    # sort options in alpha order
+    for key in ["country", "genpop", "subgroup_var", "subgroup_cat", "state", "city", "antibody_target"]:
+        options[key] = sorted(result[key] or [])
+
+    for key in ["max_sampling_end_date", "min_sampling_end_date", "max_publication_end_date",
+                "min_publication_end_date", "last_updated"]:
+        options[key] = _isoformat(result[key])
+    options["most_recent_publication_date"] = options["max_publication_end_date"]
+
+    options["population_group"] = [{"english": english, "french": french, "german": german}
+                                   for english, french, german in zip(result["english"] or [],
+                                                                      result["french"] or [],
+                                                                      result["german"] or [])]
+
+    if version is not None:
+        with _filter_options_lock:
+            _filter_options_cache['version'] = version
+            _filter_options_cache['options'] = copy.deepcopy(options)
+    return options
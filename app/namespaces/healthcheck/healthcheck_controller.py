@@ -1,6 +1,9 @@
 from flask import jsonify
 from flask_restx import Resource, Namespace
 
+from Pathogens.Utility.database_utils import get_pool_stats
+from app.utils import get_timing_histograms, get_prioritized_study_cache_stats
+
 healthcheck_ns = Namespace('healthcheck', description='A health check endpoint.')
 
 
@@ -10,3 +13,26 @@ class Healthcheck(Resource):
     def get(self):
         response = 'The healthcheck endpoint was hit.'
         return jsonify(response)
+
+
+@healthcheck_ns.route('/db_pool', methods=['GET'])
+class DatabasePoolStats(Resource):
+    @healthcheck_ns.doc('An endpoint for getting connection pool checkout and wait statistics for this process.')
+    def get(self):
+        return jsonify(get_pool_stats())
+
+
+@healthcheck_ns.route('/timings', methods=['GET'])
+class RequestTimings(Resource):
+    @healthcheck_ns.doc('An endpoint for getting histograms of the duration of each stage of each endpoint for this '
+                        'process.')
+    def get(self):
+        return jsonify(get_timing_histograms())
+
+
+@healthcheck_ns.route('/prioritization_cache', methods=['GET'])
+class PrioritizedStudyCacheStats(Resource):
+    @healthcheck_ns.doc('An endpoint for getting the size, hits, misses and evictions of the prioritized study cache '
+                        'of this process.')
+    def get(self):
+        return jsonify(get_prioritized_study_cache_stats())
@@ -3,9 +3,9 @@ import logging
 from flask_restx import Resource, Namespace
 from flask import make_response, request
 
-from app.utils import validate_request_input_against_schema, get_filtered_records, convert_start_end_dates
+from app.utils import validate_request_input_against_schema, convert_start_end_dates
 from .meta_analysis_schema import MetaSchema
-from .meta_analysis_service import get_meta_analysis_records
+from .meta_analysis_service import get_meta_analysis_options, get_filtered_meta_analysis_records
 
 logger = logging.getLogger(__name__)
 
@@ -37,39 +37,13 @@ class MetaAnalysis(Resource):
             return make_response(payload, status_code)
 
         # If payload was successfully validated, extract fields
-        agg_var = json_input.get('aggregation_variable', None)
+        agg_var, meta_transformation, meta_technique = get_meta_analysis_options(json_input)
 
-        # Extract meta transformation variable if present and validate it, else set to default
-        try:
-            meta_transformation = json_input['meta_analysis_transformation']
-            if meta_transformation not in ['unstransformed', 'logit', 'arcsin',
-                                           'double_arcsin_approx', 'double_arcsin_precise']:
-                logging.warning("'{}' is not a valid meta analysis transformation.".format(meta_transformation))
-                meta_transformation = 'double_arcsin_precise'
-        except KeyError:
-            meta_transformation = 'double_arcsin_precise'
-
-        # Extract meta technique variable if present and validate it, else set to default
-        try:
-            meta_technique = json_input['meta_analysis_technique']
-            if meta_technique not in ['fixed', 'random', 'median']:
-                logging.warning("'{}' is not a valid meta analysis technique.".format(meta_technique))
-                meta_technique = 'fixed'
-        except KeyError:
-            meta_technique = 'fixed'
-
-        # Query all the records with the desired filters. Pull only country, denom, and seroprev cols
-        filters = json_input.get('filters', None)
+        # Pool the prevalence of the records with the desired filters
         sampling_start_date, sampling_end_date = convert_start_end_dates(json_input, use_sampling_date=True)
-        columns = ['country', 'denominator_value', 'serum_pos_prevalence']
-        columns.append(agg_var)
-        records = get_filtered_records(filters=filters,
-                                       columns=columns,
-                                       sampling_start_date=sampling_start_date,
-                                       sampling_end_date=sampling_end_date)
-        if not records:
-            logging.warning('No records with specified filters found.')
-            return {}
-
-        meta_analysis_results = get_meta_analysis_records(records, agg_var, meta_transformation, meta_technique)
-        return meta_analysis_results
+        return get_filtered_meta_analysis_records(filters=json_input.get('filters', None),
+                                                  sampling_start_date=sampling_start_date,
+                                                  sampling_end_date=sampling_end_date,
+                                                  agg_var=agg_var,
+                                                  transformation=meta_transformation,
+                                                  technique=meta_technique)
@@ -1,3 +1,4 @@
+import logging
 from statistics import median
 from math import log, sqrt, asin, exp, sin, cos, pi
 
@@ -6,6 +7,8 @@ from numpy import sign, quantile, isnan
 from scipy.stats import hmean
 from flask import current_app as app
 
+from app.utils import get_filtered_records, timed_stage
+
 Z_975 = 1.96
 SP_ZERO_BLACKLIST = ['untransformed', 'logit']
 pd.options.mode.chained_assignment = None
@@ -228,3 +231,52 @@ def get_meta_analysis_records(data, agg_var, transformation, technique):
     else:
         return_body = calc_pooled_prevalence_for_subgroup(data_df, transformation, technique)
         return return_body
+
+
+def get_meta_analysis_options(data):
+    '''Reads the meta analysis options of a request payload, falling back to the defaults for invalid values
+    :returns a tuple of (aggregation variable, transformation, technique)
+    '''
+    agg_var = data.get('aggregation_variable', None)
+
+    # Extract meta transformation variable if present and validate it, else set to default
+    try:
+        meta_transformation = data['meta_analysis_transformation']
+        if meta_transformation not in ['unstransformed', 'logit', 'arcsin',
+                                       'double_arcsin_approx', 'double_arcsin_precise']:
+            logging.warning("'{}' is not a valid meta analysis transformation.".format(meta_transformation))
+            meta_transformation = 'double_arcsin_precise'
+    except KeyError:
+        meta_transformation = 'double_arcsin_precise'
+
+    # Extract meta technique variable if present and validate it, else set to default
+    try:
+        meta_technique = data['meta_analysis_technique']
+        if meta_technique not in ['fixed', 'random', 'median']:
+            logging.warning("'{}' is not a valid meta analysis technique.".format(meta_technique))
+            meta_technique = 'fixed'
+    except KeyError:
+        meta_technique = 'fixed'
+    return agg_var, meta_transformation, meta_technique
+
+
+def get_filtered_meta_analysis_records(filters=None, sampling_start_date=None, sampling_end_date=None, agg_var=None,
+                                       transformation='double_arcsin_precise', technique='fixed', snapshots=None):
+    '''Builds the body of a /meta_analysis/records response
+    :param snapshots: BatchRecordSnapshots to read the records from
+    :returns the pooled prevalence of the records matching the filters (per value of agg_var, if supplied)
+    '''
+    # Query all the records with the desired filters. Pull only country, denom, and seroprev cols
+    columns = ['country', 'denominator_value', 'serum_pos_prevalence']
+    if agg_var is not None:
+        columns.append(agg_var)
+    records = get_filtered_records(filters=filters,
+                                   columns=columns,
+                                   sampling_start_date=sampling_start_date,
+                                   sampling_end_date=sampling_end_date,
+                                   snapshots=snapshots)
+    if not records:
+        logging.warning('No records with specified filters found.')
+        return {}
+    with timed_stage('meta_analysis'):
+        return get_meta_analysis_records(records, agg_var, transformation, technique)
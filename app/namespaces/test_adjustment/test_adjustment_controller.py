@@ -3,7 +3,7 @@ import logging.config
 from flask_restx import Resource, Namespace
 from flask import jsonify, make_response, request
 
-from app.utils import validate_request_input_against_schema
+from app.utils import validate_request_input_against_schema, timed_stage
 from .test_adjustment_schema import TestAdjustmentSchema
 from .test_adjustment_service import TestAdjHandler
 
@@ -50,11 +50,12 @@ class Records(Resource):
         serum_pos_prevalence = data.get('serum_pos_prevalence')
 
         # Apply test adjustment
-        test_adj_handler = TestAdjHandler()
-        adj_prevalence, adj_sensitivity, adj_specificity, ind_eval_type, adj_prev_ci_lower, adj_prev_ci_upper = \
-            test_adj_handler.get_adjusted_estimate(test_adj, ind_se, ind_sp, ind_se_n, ind_sp_n, se_n, sp_n,
-                                                   sensitivity, specificity, test_validation, test_type,
-                                                   denominator_value, serum_pos_prevalence)
+        with timed_stage('test_adjustment'):
+            test_adj_handler = TestAdjHandler()
+            adj_prevalence, adj_sensitivity, adj_specificity, ind_eval_type, adj_prev_ci_lower, adj_prev_ci_upper = \
+                test_adj_handler.get_adjusted_estimate(test_adj, ind_se, ind_sp, ind_se_n, ind_sp_n, se_n, sp_n,
+                                                       sensitivity, specificity, test_validation, test_type,
+                                                       denominator_value, serum_pos_prevalence)
 
         # Return result as json payload
         result = {"adj_prevalence": adj_prevalence,
@@ -1,5 +1,12 @@
+import gzip
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func
+
 from app import db as _db
-from app.serotracker_sqlalchemy.models import DashboardSource
+from app.serotracker_sqlalchemy.models import DashboardSource, RecordsFlat
+from test_utils import assert_max_queries
 
 
 def test_healthcheck(client):
@@ -29,6 +36,47 @@ def test_get_record_details(client):
     assert type(data) is dict
 
 
+# Test get the details of several records in one request
+def test_get_records_details_batch(client):
+    source_ids = [str(q[0]) for q in _db.session.query(DashboardSource.source_id).limit(2).all()]
+    response = client.post('/data_provider/record_details', json={"source_ids": source_ids})
+    status_code = response.status_code
+    data = response.get_json()
+    assert status_code == 200
+    assert [record["source_id"] for record in data["records"]] == source_ids
+    assert all(type(record["city"]) is list for record in data["records"])
+
+
+# Test that record details read from records_flat only query the requested records
+def test_get_records_details_records_flat(client):
+    from app.database_etl.records_flat_handler import load_records_flat
+    from app.namespaces.data_provider.data_provider_service import _record_details_cache
+    from app.utils.get_filtered_records import _records_flat_versions, _use_records_flat
+
+    source_ids = [str(q[0]) for q in _db.session.query(DashboardSource.source_id).limit(2).all()]
+    _record_details_cache.clear()
+    joined_data = client.post('/data_provider/record_details', json={"source_ids": source_ids}).get_json()
+
+    # records_flat only holds the records of one ETL run, so give every record the created_at of the current run
+    version = _db.session.query(func.min(DashboardSource.created_at)).scalar()
+    _db.session.query(DashboardSource).update({DashboardSource.created_at: version})
+    _db.session.commit()
+    assert load_records_flat(version)
+    _record_details_cache.clear()
+    try:
+        assert _use_records_flat()
+        response = client.post('/data_provider/record_details', json={"source_ids": source_ids})
+        assert response.status_code == 200
+        assert response.get_json() == joined_data
+        # Only the requested records are queried and cached
+        assert len(_record_details_cache._details) == len(source_ids)
+    finally:
+        _db.session.query(RecordsFlat).delete()
+        _db.session.commit()
+        _records_flat_versions.clear()
+        _record_details_cache.clear()
+
+
 # Test get records with an empty request body
 def test_get_records_basic(client):
     response = client.post('/data_provider/dashboard_records', json={
@@ -82,4 +130,211 @@ def test_get_records_research_fields(client):
     assert len(data["records"]) == 4
     # check if some field in the research table is in the returned record
     for record in data["records"]:
-        assert "adj_sensitivity" in record
\ No newline at end of file
+        assert "adj_sensitivity" in record
+
+# Test get records with columns
+def test_get_records_columns(client):
+    response = client.post('/data_provider/records', json={
+        "filters": {},
+        "columns": ["source_id", "city"]
+    })
+    status_code = response.status_code
+    data = response.get_json()
+    assert status_code == 200
+    # Only the requested columns should be returned, even though country summaries need other columns
+    for record in data["records"]:
+        assert set(record.keys()) == {"source_id", "city"}
+    assert "country_seroprev_summary" in data
+
+
+# Test that streamed records match the records that are returned all at once
+def test_get_records_stream(client):
+    payload = {"filters": {}, "columns": ["source_id", "country"], "estimates_subgroup": "all_estimates"}
+    response = client.post('/data_provider/records', json=payload)
+    streamed_response = client.post('/data_provider/records', json={**payload, "stream": True})
+    assert streamed_response.status_code == 200
+    assert streamed_response.get_json() == response.get_json()
+
+
+# Test that records built by postgres match the records serialized by the app
+def test_get_records_db_json(client):
+    payload = {"filters": {}, "columns": ["source_id", "country", "city"], "estimates_subgroup": "all_estimates"}
+    data = client.post('/data_provider/records', json=payload).get_json()
+    db_json_response = client.post('/data_provider/records', json={**payload, "db_json": True})
+    db_json_data = db_json_response.get_json()
+    assert db_json_response.status_code == 200
+    # Records built by postgres are ordered by source_id
+    assert db_json_data["records"] == sorted(data["records"], key=lambda record: record["source_id"])
+    assert sorted(db_json_data["country_seroprev_summary"], key=lambda summary: summary["country"]) == \
+        sorted(data["country_seroprev_summary"], key=lambda summary: summary["country"])
+
+    # Without summaries, only the requested columns are written too, and not source_id or the summary columns
+    payload = {"filters": {}, "columns": ["city", "age"], "estimates_subgroup": "all_estimates",
+               "calculate_country_seroprev_summaries": False}
+    data = client.post('/data_provider/records', json=payload).get_json()
+    db_json_data = client.post('/data_provider/records', json={**payload, "db_json": True}).get_json()
+    assert all(list(record) == ["age", "city"] for record in db_json_data["records"])
+    assert sorted(map(str, db_json_data["records"])) == sorted(map(str, data["records"]))
+
+
+# Test that the columnar exports contain the same records as /records
+def test_get_records_arrow_and_parquet(client):
+    import io
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    payload = {"filters": {}, "columns": ["source_id", "country", "city"], "estimates_subgroup": "all_estimates"}
+    records = client.post('/data_provider/records', json=payload).get_json()["records"]
+
+    arrow_response = client.post('/data_provider/records.arrow', json=payload)
+    assert arrow_response.status_code == 200
+    table = pa.ipc.open_stream(arrow_response.data).read_all()
+    assert table.to_pylist() == records
+    # Repeated strings are dictionary encoded
+    assert pa.types.is_dictionary(table.schema.field("country").type)
+
+    parquet_response = client.post('/data_provider/records.parquet', json=payload)
+    assert parquet_response.status_code == 200
+    assert pq.read_table(io.BytesIO(parquet_response.data)).to_pylist() == records
+
+
+# Test that the sub-requests of a batch get the same results as their own endpoints
+def test_batch(client):
+    records_payload = {"filters": {"country": ["country_name_1"]}, "columns": ["source_id", "country"]}
+    summary_payload = {"filters": {}}
+    response = client.post('/data_provider/batch', json={"requests": [
+        {"id": "records", "type": "records", "payload": records_payload},
+        {"id": "summary", "type": "country_seroprev_summary", "payload": summary_payload},
+        {"id": "invalid", "type": "records", "payload": {"estimates_subgroup": "not_a_subgroup"}}
+    ]})
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+
+    # Records may be read in a different order, so compare them by source_id and summaries by country
+    def by_key(items, key):
+        return sorted(items, key=lambda item: item[key])
+
+    records_data = client.post('/data_provider/records', json=records_payload).get_json()
+    assert results["records"]["status"] == 200
+    assert by_key(results["records"]["body"]["records"], "source_id") == by_key(records_data["records"], "source_id")
+    summary_data = client.post('/data_provider/country_seroprev_summary', json=summary_payload).get_json()
+    assert by_key(results["summary"]["body"], "country") == by_key(summary_data, "country")
+    assert results["invalid"]["status"] == 422
+
+
+# Test that key endpoints stay within their query budgets
+def test_query_budgets(client):
+    source_ids = [str(q[0]) for q in _db.session.query(DashboardSource.source_id).limit(2).all()]
+    with assert_max_queries(4):
+        response = client.post('/data_provider/records', json={"filters": {"country": ["country_name_1"]}})
+        assert response.status_code == 200
+    with assert_max_queries(3):
+        assert client.post('/data_provider/record_details', json={"source_ids": source_ids}).status_code == 200
+    with assert_max_queries(3):
+        assert client.get('/data_provider/filter_options').status_code == 200
+
+
+# Serve records from a snapshot of the records inserted by the client fixture, as in production
+@pytest.fixture
+def snapshot_client(client, app):
+    from app.utils.get_filtered_records import _records_snapshots
+    app.config['RECORD_SNAPSHOT_ENABLED'] = True
+    _records_snapshots.clear()
+    try:
+        yield client
+    finally:
+        app.config['RECORD_SNAPSHOT_ENABLED'] = False
+        _records_snapshots.clear()
+
+
+# Test that records filtered with the facet index of a snapshot match the records filtered by postgres
+def test_get_records_snapshot(snapshot_client, app):
+    # The sampling date range is matched against sampling_end_date
+    sampling_end_dates = sorted(q[0] for q in _db.session.query(DashboardSource.sampling_end_date).all())
+    # Pins are left out, since pins that share a location are jittered in the order of the records
+    columns = ["source_id", "estimate_grade", "country", "city", "sampling_start_date"]
+    payloads = [
+        {"filters": {"country": ["country_name_1", "country_name_2"]}},
+        {"filters": {}, "sampling_start_date": sampling_end_dates[len(sampling_end_dates) // 2].isoformat()},
+        {"filters": {}, "estimates_subgroup": "primary_estimates"},
+        {"filters": {"country": ["country_name_1", "country_name_2"]}, "estimates_subgroup": "prioritize_estimates"},
+    ]
+
+    def get_records(payload):
+        data = snapshot_client.post('/data_provider/records', json={**payload, "columns": columns}).get_json()
+        return sorted(data["records"], key=lambda record: record["source_id"]), \
+            sorted(data["country_seroprev_summary"], key=lambda summary: summary["country"])
+
+    for payload in payloads:
+        snapshot_records, snapshot_summaries = get_records(payload)
+        assert snapshot_records
+        app.config['RECORD_SNAPSHOT_ENABLED'] = False
+        try:
+            db_records, db_summaries = get_records(payload)
+        finally:
+            app.config['RECORD_SNAPSHOT_ENABLED'] = True
+        assert snapshot_records == db_records
+        assert snapshot_summaries == db_summaries
+
+
+@pytest.fixture
+def response_cache_client(client, app):
+    from app.utils import clear_response_cache
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    clear_response_cache()
+    try:
+        yield client
+    finally:
+        app.config['RESPONSE_CACHE_ENABLED'] = False
+        clear_response_cache()
+
+
+def _assert_cached_response(client, method, url, **kwargs):
+    # The payload is compressed with the encoding the client accepts, and revalidated with its ETag
+    body = client.open(url, method=method, **kwargs).data
+    response = client.open(url, method=method, headers={'Accept-Encoding': 'gzip'}, **kwargs)
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == body
+
+    revalidated = client.open(url, method=method, headers={'Accept-Encoding': 'gzip',
+                                                           'If-None-Match': response.headers['ETag']}, **kwargs)
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+    # Clients that accept brotli get it when it is installed
+    from app.utils.response_cache import brotli
+    if brotli is None:
+        return
+    response = client.open(url, method=method, headers={'Accept-Encoding': 'gzip, br'}, **kwargs)
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == body
+
+
+# Test that filter options are served from the response cache
+def test_get_filter_options_cached(response_cache_client):
+    _assert_cached_response(response_cache_client, 'GET', '/data_provider/filter_options')
+
+
+# Test that unfiltered records are served from the response cache, and filtered ones aren't
+def test_get_records_cached(response_cache_client):
+    _assert_cached_response(response_cache_client, 'POST', '/data_provider/records', json={"filters": {}})
+    response = response_cache_client.post('/data_provider/records', json={"filters": {"country": ["country_name_1"]}},
+                                          headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+
+
+# Test that arbo records are served from the response cache, and only built once per version
+def test_get_arbo_records_cached(response_cache_client, monkeypatch):
+    from app.namespaces.data_provider import data_provider_controller
+    builds = []
+
+    def get_all_arbo_records():
+        builds.append(1)
+        return [{"id": str(i), "country": "Brazil", "seroprevalence": 0.1} for i in range(10)]
+
+    monkeypatch.setattr(data_provider_controller, 'get_arbo_records_version', lambda: datetime(2023, 1, 1))
+    monkeypatch.setattr(data_provider_controller, 'get_all_arbo_records', get_all_arbo_records)
+    _assert_cached_response(response_cache_client, 'GET', '/data_provider/arbo/records')
+    assert builds == [1]
@@ -1,10 +1,11 @@
 import logging
 from contextlib import contextmanager
 
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from flask import current_app as app
 
+from Pathogens.Utility.database_utils import get_engine
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,8 +18,8 @@ def delete_records(session, records):
 
 @contextmanager
 def db_session():
-    engine_url = app.config['SQLALCHEMY_DATABASE_URI']
-    engine = create_engine(engine_url)
+    # Engines are shared process-wide so that each session reuses pooled connections
+    engine = get_engine(app.config['SQLALCHEMY_DATABASE_URI'], **app.config.get('DB_POOL_OPTIONS', {}))
     Session = sessionmaker(bind=engine)
     session = Session()
     try:
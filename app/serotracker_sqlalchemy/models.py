@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, BigInteger, Date
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Integer, Float, Boolean, DateTime, BigInteger, Date, Index, Table
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY
 
 from app import db
 
@@ -238,6 +238,48 @@ class PopulationGroupOptions(db.Model):
     created_at = Column(DateTime)
 
 
+# Prioritized estimates computed by the ETL for every prioritize_estimates_mode
+class PrioritizedEstimate(db.Model):
+    __tablename__ = 'prioritized_estimate'
+    __table_args__ = (Index('ix_prioritized_estimate_lookup',
+                            'prioritize_estimates_mode', 'include_subgeography_estimates', 'created_at'),)
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    prioritize_estimates_mode = Column(String())
+    include_subgeography_estimates = Column(Boolean)
+    # Order of the record in the prioritized result
+    position = Column(Integer)
+    record = Column(JSONB)
+    created_at = Column(DateTime)
+
+
+def _copy_columns(model, exclude):
+    return [Column(column.key, column.type) for column in model.__table__.columns if column.key not in exclude]
+
+
+# Denormalized records written by the ETL, with one row per estimate: the dashboard source and research source
+# columns, the country columns, and the multi select columns and isotypes aggregated into arrays
+class RecordsFlat(db.Model):
+    __table__ = Table(
+        'records_flat', db.metadata,
+        Column('source_id', UUID(as_uuid=True), primary_key=True),
+        *_copy_columns(DashboardSource, exclude=['source_id', 'country_id']),
+        *_copy_columns(ResearchSource, exclude=['source_id', 'airtable_record_id', 'created_at']),
+        # Whether the estimate has a research source row, research fields are only returned for those that do
+        Column('has_research_source', Boolean),
+        Column('country', String()),
+        Column('country_iso3', String()),
+        Column('income_class', String()),
+        Column('hrp_class', String()),
+        Column('city', ARRAY(String())),
+        Column('state', ARRAY(String())),
+        Column('test_manufacturer', ARRAY(String())),
+        Column('antibody_target', ARRAY(String())),
+        Column('isotypes_reported', ARRAY(String())),
+        Index('ix_records_flat_created_at', 'created_at')
+    )
+
+
 # ARBO
 
 class ArboRecords(db.Model):
@@ -3,5 +3,17 @@ from .notifications_sender import send_api_error_slack_notif, send_slack_message
 from .cached_json_handler import write_to_json, read_from_json
 from .helper_funcs import validate_request_input_against_schema, convert_start_end_dates
 from .airtable_fields_config import airtable_fields_config, full_airtable_fields
-from .get_filtered_records import get_filtered_records, get_paginated_records, _get_isotype_col_expression, filter_columns
+from .get_filtered_records import get_filtered_records, get_paginated_records, _get_isotype_col_expression, \
+    _apply_agg_query, _use_records_flat, filter_columns, get_records_snapshot, iter_filtered_records, \
+    get_filtered_records_page, get_filtered_records_json, BatchRecordSnapshots, DATE_FIELDS, \
+    get_prioritized_study_cache_stats, init_prioritized_study_cache
+from .json_streaming import stream_records_json, get_http_date_sql
+from .columnar_export import records_to_arrow_table, write_arrow_stream, write_parquet, is_columnar_export_available, \
+    ARROW_STREAM_MIMETYPE, PARQUET_MIMETYPE
+from .pin_jitter import get_jittered_pins, get_pin_offset, jitter_records, get_jittered_pins_sql
+from .response_cache import make_cached_response, clear_response_cache, init_response_cache
+from .request_timing import timed_stage, init_request_timing, get_timing_histograms, clear_timing_histograms
+from .query_profiling import init_query_profiling
+from .record_snapshot import RecordSnapshot, get_records_version
+from .snapshot_file import write_snapshot_file, read_snapshot_file, get_snapshot_file_path, remove_old_snapshot_files
 from .estimate_prioritization import get_prioritized_estimates
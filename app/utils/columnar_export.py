@@ -0,0 +1,78 @@
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID
+
+# pyarrow is optional, the columnar export endpoints are unavailable if it isn't installed
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+PARQUET_MIMETYPE = 'application/vnd.apache.parquet'
+
+
+def is_columnar_export_available() -> bool:
+    return pa is not None
+
+
+def _to_arrow_array(values: List[Any], is_timestamp: bool = False) -> 'pa.Array':
+    # Dates that were already formatted as ISO strings are parsed back into timestamps
+    if is_timestamp:
+        return pa.array(values, pa.string()).cast(pa.timestamp('us'))
+
+    # Ids are unique, so they are written as plain strings
+    if any(isinstance(value, UUID) for value in values):
+        return pa.array([None if value is None else str(value) for value in values], pa.string())
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columns mixing ints and floats are written as floats, anything else that can't be inferred as strings
+        try:
+            array = pa.array(values, pa.float64())
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            array = pa.array([None if value is None else str(value) for value in values], pa.string())
+
+    # Store each distinct string once, e.g. the study_name, source_name and country shared by many estimates
+    if pa.types.is_string(array.type):
+        return array.dictionary_encode()
+    if pa.types.is_list(array.type) and pa.types.is_string(array.type.value_type) and array.null_count == 0:
+        return pa.ListArray.from_arrays(array.offsets, array.values.dictionary_encode())
+    return array
+
+
+def records_to_arrow_table(records: Iterable[Dict[str, Any]], columns: Optional[List[str]] = None,
+                           timestamp_columns: Iterable[str] = ()) -> 'pa.Table':
+    '''Converts record dicts into a dictionary encoded Arrow table with one column per record key
+    :param records: record dicts
+    :param columns: columns of the table, defaults to every key of the records in the order they are first seen
+    :param timestamp_columns: columns whose values are ISO formatted date strings
+    :returns a pyarrow Table
+    '''
+    records = list(records)
+    if columns is None:
+        columns = list(dict.fromkeys(key for record in records for key in record))
+    timestamp_columns = set(timestamp_columns)
+    arrays = [_to_arrow_array([record.get(col) for record in records], is_timestamp=col in timestamp_columns)
+              for col in columns]
+    return pa.Table.from_arrays(arrays, names=list(columns))
+
+
+def write_arrow_stream(table: 'pa.Table') -> bytes:
+    '''Serializes a table in the Arrow IPC streaming format, which pyarrow and polars read without copying
+    :returns the bytes of the stream
+    '''
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def write_parquet(table: 'pa.Table') -> bytes:
+    '''Serializes a table as a Parquet file, keeping the dictionary encoding of the columns
+    :returns the bytes of the file
+    '''
+    sink = pa.BufferOutputStream()
+    pq.write_table(table, sink, compression='zstd')
+    return sink.getvalue().to_pybytes()
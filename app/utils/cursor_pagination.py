@@ -0,0 +1,94 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.facet_index import FacetIndex, get_sort_key
+
+# Keys that records can be sorted by when paginating with a cursor
+SORTING_KEYS = ["sampling_end_date", "publication_date", "denominator_value", "serum_pos_prevalence",
+                "overall_risk_of_bias", "source_name", "source_id"]
+
+
+def encode_cursor(sorting_key: str, reverse: bool, sort_key: tuple) -> str:
+    '''Creates an opaque cursor pointing after a record
+    :param sort_key: sort key of the last record of a page, see facet_index.get_sort_key
+    :returns a url safe string
+    '''
+    cursor = {'sorting_key': sorting_key, 'reverse': reverse, 'after': list(sort_key)}
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str, sorting_key: str, reverse: bool) -> tuple:
+    '''Reads the sort key out of a cursor created by encode_cursor
+    :returns the sort key of the record the cursor points after
+    :raises ValueError if the cursor is malformed or was created for a different sort order
+    '''
+    try:
+        decoded = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        after = tuple(decoded['after'])
+        cursor_sorting_key = decoded['sorting_key']
+        cursor_reverse = decoded['reverse']
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        raise ValueError('Invalid cursor')
+
+    if cursor_sorting_key != sorting_key or cursor_reverse != reverse:
+        raise ValueError('Cursor was created for a different sorting_key or reverse')
+    # Sort keys are either (0, value, source_id) or (1, source_id), see facet_index.get_sort_key
+    is_valid = (len(after) == 3 and after[0] == 0 and isinstance(after[1], (str, int, float))) or \
+               (len(after) == 2 and after[0] == 1)
+    if not is_valid or not isinstance(after[-1], str):
+        raise ValueError('Invalid cursor')
+    return after
+
+
+def get_cursor_page(facet_index: FacetIndex, mask: int, sorting_key: str, reverse: bool = False,
+                    per_page: int = 5, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    '''Gets the records in the mask that come after the cursor in the sort order of sorting_key.
+    The sort order is computed once per facet index, so each page only costs a binary search
+    and a scan over the following records, no matter how deep the page is
+    :param facet_index: index over the records to paginate
+    :param mask: bitset of the records to paginate, e.g. from facet_index.get_mask
+    :param sorting_key: key by which records are sorted, with records missing a value last and source_id breaking ties
+    :param reverse: whether to sort in reverse order or not
+    :param per_page: number of records per page
+    :param cursor: next_cursor returned with the previous page, or None for the first page
+    :returns a tuple of (records of the page, cursor for the next page or None if this is the last page)
+    :raises ValueError if the cursor is invalid
+    '''
+    positions, sort_keys = facet_index.get_sort_order(sorting_key)
+
+    # Find where the cursor's record is (or would be) in the sort order, and walk away from it
+    if cursor is not None:
+        after = decode_cursor(cursor, sorting_key, reverse)
+        try:
+            start = bisect_left(sort_keys, after) if reverse else bisect_right(sort_keys, after)
+        except TypeError:
+            raise ValueError(f'Cursor value does not match the type of {sorting_key}')
+    else:
+        start = len(sort_keys) if reverse else 0
+    candidates = positions[:start][::-1] if reverse else positions[start:]
+
+    # Look for one more record than needed, to know whether there is a next page
+    if mask != facet_index.all_records_mask:
+        in_mask = facet_index.mask_to_bools(mask)
+        page_positions = []
+        num_found = 0
+        chunk_size = max(4 * (per_page + 1), 1024)
+        for chunk_start in range(0, len(candidates), chunk_size):
+            chunk = candidates[chunk_start:chunk_start + chunk_size]
+            chunk = chunk[in_mask[chunk]]
+            page_positions.append(chunk)
+            num_found += len(chunk)
+            if num_found > per_page:
+                break
+        candidates = np.concatenate(page_positions) if page_positions else candidates[:0]
+    page_positions = candidates[:per_page + 1]
+
+    records = facet_index.get_records(page_positions[:per_page])
+    next_cursor = None
+    if len(page_positions) > per_page:
+        next_cursor = encode_cursor(sorting_key, reverse, get_sort_key(records[-1], sorting_key))
+    return records, next_cursor
@@ -1,3 +1,4 @@
 from .pooling_functions import pooling_function_maps, get_columns_with_pooling_functions
 from .prioritization_criteria import prioritization_criteria_testadj, prioritization_criteria_testunadj
 from .estimate_prioritization import get_prioritized_estimates, get_prioritized_estimates_without_pooling
+from .parallel_prioritization import get_prioritized_estimates_in_parallel
@@ -1,86 +1,186 @@
 import pandas as pd
 import numpy as np
-from statsmodels.stats.proportion import proportion_confint
+from scipy.stats import beta
 from app.utils.estimate_prioritization import prioritization_criteria_testunadj, \
     prioritization_criteria_testadj, pooling_function_maps
-from typing import Union
-
-
-def get_pooled_estimate(estimates: pd.DataFrame) -> pd.DataFrame:
-    # if only one estimate provided, no pooling necessary - return that estimate
-    if estimates.shape[0] == 1:
-        pooled = estimates.iloc[0]
-    else:
-        # use the estimate with the max denominator to provide series names and default values for the pooled estimate
-        # this serves as a "base estimate" that can be subsequently modified 
-        pooled = estimates.loc[estimates['denominator_value'].idxmax(axis=1)]
-
-        # for each variable that we have a defined pooling function for
-        # attempt to generate a pooled value for this variable by applying the pooling function to the input data
-        for (_, cols_to_summarize, summary_function) in pooling_function_maps:
-            if summary_function is not None:
-                # check to ensure that the value to be pooled is in the data input provided 
-                valid_cols_to_summarize = set(cols_to_summarize) & set(estimates.columns)
-
-                for col in valid_cols_to_summarize:
-                    pooled.at[col] = summary_function(estimates, col)
-
-        # once all pooled variables have been calculated, generate necessary pooled variables based on those calculated variables
-        # including numerator, estimate name, and confidence intervals for proportions
-        pooled.at['numerator_value'] = int(pooled.at['serum_pos_prevalence'] * pooled.at['denominator_value'])
-        if 'estimate_name' in pooled.index:
-            pooled.at['estimate_name'] += '_pooled'
-        pooled.at['seroprev_95_ci_lower'], pooled.at['seroprev_95_ci_upper'] = proportion_confint(
-            count=pooled.at['numerator_value'],
-            nobs=pooled.at['denominator_value'],
-            alpha=0.05,
-            method='jeffreys')
-
-        # try/except ensures that this doesn't break if we are prioritizing estimates from dashboard source only
-        # i.e., where pooled.at['adj_prevalence'] will throw a KeyError
-        try:
-            if pd.notna(pooled.at['adj_prevalence']) and pd.notna(pooled.at['denominator_value']):
-                pooled.at['adj_prev_ci_lower'], pooled.at['adj_prev_ci_upper'] = \
-                    proportion_confint(count=int(pooled.at['adj_prevalence'] * pooled.at['denominator_value']),
-                                       nobs=pooled.at['denominator_value'], alpha=0.05, method='jeffreys')
-            else:
-                pooled.at['adj_prev_ci_lower'], pooled.at['adj_prev_ci_upper'] = np.nan, np.nan
-        except KeyError:
-            pass
-
-    return pooled
+from typing import Optional, Tuple, Union
+
+
+def get_jeffreys_intervals(counts: np.ndarray, nobs: np.ndarray, alpha: float = 0.05) -> Tuple[np.ndarray, np.ndarray]:
+    # same as proportion_confint(count, nobs, alpha, method='jeffreys') from statsmodels, for many proportions at once
+    return beta.interval(1 - alpha, counts + 0.5, nobs - counts + 0.5)
+
+
+def get_pooled_estimates(estimates: pd.DataFrame, groups: np.ndarray) -> pd.DataFrame:
+    '''Pools the estimates of several studies at once, collapsing the estimates of each study into one
+    :param groups: number of the study of each estimate, from 0 to the number of studies - 1
+    :returns one pooled estimate per study, in order of study number
+    '''
+    # use the estimate with the max denominator of each study to provide index labels and default values
+    # for the pooled estimate, this serves as a "base estimate" that can be subsequently modified
+    # estimates are sorted by study, then by decreasing denominator, so the base estimate comes first in its study
+    denominators = pd.to_numeric(estimates['denominator_value'], errors='coerce').to_numpy(dtype=float)
+    order = np.lexsort((np.where(np.isnan(denominators), np.inf, -denominators), groups))
+    base_positions = order[np.flatnonzero(np.diff(groups[order], prepend=-1))]
+    pooled = estimates.iloc[base_positions].copy()
+
+    # for each variable that we have a defined pooling function for
+    # generate the pooled value of every study by applying the pooling function to the input data
+    for (_, cols_to_summarize, summary_function) in pooling_function_maps:
+        if summary_function is not None:
+            # check to ensure that the value to be pooled is in the data input provided
+            for col in cols_to_summarize:
+                if col in estimates.columns:
+                    pooled[col] = summary_function(estimates, col, groups).to_numpy(dtype=object)
+
+    # once all pooled variables have been calculated, generate necessary pooled variables based on those calculated
+    # variables, including numerator, estimate name, and confidence intervals for proportions
+    # columns that the estimates don't have are added as objects, so numerators stay integers
+    denominators = pd.to_numeric(pooled['denominator_value'], errors='coerce').to_numpy(dtype=float)
+    prevalences = pd.to_numeric(pooled['serum_pos_prevalence'], errors='coerce').to_numpy(dtype=float)
+    numerators = np.trunc(prevalences * denominators)
+    pooled['numerator_value'] = pd.Series([int(numerator) if not np.isnan(numerator) else np.nan
+                                           for numerator in numerators], index=pooled.index, dtype=object)
+    if 'estimate_name' in pooled.columns:
+        pooled['estimate_name'] += '_pooled'
+    lower, upper = get_jeffreys_intervals(numerators, denominators)
+    pooled['seroprev_95_ci_lower'] = pd.Series(lower, index=pooled.index, dtype=object)
+    pooled['seroprev_95_ci_upper'] = pd.Series(upper, index=pooled.index, dtype=object)
+
+    # adjusted prevalence isn't available if we are prioritizing estimates from dashboard source only
+    if 'adj_prevalence' in pooled.columns:
+        adj_prevalences = pd.to_numeric(pooled['adj_prevalence'], errors='coerce').to_numpy(dtype=float)
+        adjustable = ~np.isnan(adj_prevalences) & ~np.isnan(denominators)
+        lower, upper = get_jeffreys_intervals(np.trunc(adj_prevalences * denominators), denominators)
+        pooled['adj_prev_ci_lower'] = pd.Series(np.where(adjustable, lower, np.nan), index=pooled.index, dtype=object)
+        pooled['adj_prev_ci_upper'] = pd.Series(np.where(adjustable, upper, np.nan), index=pooled.index, dtype=object)
+
+    return pooled.astype(estimates.dtypes.to_dict())
+
+
+def get_study_ids(estimates: pd.DataFrame) -> np.ndarray:
+    # number each estimate's study in the order groupby('study_name') visits the studies
+    # estimates without a study name get -1, since groupby drops them
+    return estimates.groupby('study_name').ngroup().fillna(-1).to_numpy(dtype=np.int64)
 
 
 def apply_prioritization_criteria(estimates: pd.DataFrame,
-                                  prioritization_criteria: dict) -> list:
-    # applies prioritization criteria to select estimates
-    # if a prioritization criterion would remove all estimates, do not apply it
-    # if a prioritization criterion would leave you with one estimate, return that estimate
-    # if a prioritization criterion yields multiple estimates, continue applying criteria
-
-    # select a criterion
-    for _, criterion in prioritization_criteria.items():
-        # go through the levels of that criterion, from highest to lowest
-        for level in criterion:
-            estimates_at_level = estimates[estimates.apply(level, axis=1)]
-
-            # if any estimates meet that level, pass those on; if not, continue
-            if not estimates_at_level.empty:
-                estimates = estimates_at_level
-                break
-
-        # if this criterion narrowed it down to just one estimate, break; if not, continue
-        if estimates.shape[0] == 1:
+                                  prioritization_criteria: dict,
+                                  study_ids: np.ndarray,
+                                  level_masks: Optional[dict] = None) -> np.ndarray:
+    '''Applies prioritization criteria to the estimates of every study at once.
+    Within a study, the criteria rank estimates lexicographically: an estimate is kept if it meets the highest level
+    of the first criterion met by any estimate of the study, then the highest level of the second criterion among
+    those, and so on. If no estimate of a study meets any level of a criterion, the criterion is not applied,
+    and a study's remaining criteria are skipped once a single estimate is left
+    :param study_ids: study of each estimate, from get_study_ids, or -1 for estimates that aren't prioritized
+    :param level_masks: masks of the levels that have been evaluated for all the estimates, by criterion name and
+    level, which are shared between calls on the same estimates so each level is only evaluated once
+    :returns boolean mask of the selected estimates
+    '''
+    num_studies = study_ids.max() + 1 if study_ids.size else 0
+    in_study = study_ids >= 0
+    selected = in_study.copy()
+
+    for name, criterion in prioritization_criteria.items():
+        # only studies that still have several selected estimates need the criterion
+        num_selected = np.bincount(study_ids[selected], minlength=num_studies)
+        contested = selected.copy()
+        contested[selected] = num_selected[study_ids[selected]] > 1
+        if not contested.any():
             break
-
-    return estimates
-
-
-def percent_adjustable(estimates: pd.DataFrame) -> float:
-    # calculate what percentage of estimates in a df of esitmates are adjustable
-    n_estimates = estimates.shape[0]
-    n_estimates_with_adj = estimates['adj_prevalence'].notna().sum()
-    return n_estimates_with_adj / n_estimates
+        contested_positions = np.flatnonzero(contested)
+        contested_estimates = estimates.iloc[contested_positions] if level_masks is None else None
+        contested_study_ids = study_ids[contested_positions]
+
+        # rank each estimate by the highest level it meets, or len(criterion) if it meets none
+        ranks = np.full(contested_positions.size, len(criterion), dtype=np.int64)
+        for rank, level in reversed(list(enumerate(criterion))):
+            if level_masks is None:
+                ranks[level(contested_estimates)] = rank
+            else:
+                if (name, rank) not in level_masks:
+                    level_masks[(name, rank)] = level(estimates)
+                ranks[level_masks[(name, rank)][contested_positions]] = rank
+
+        # keep the best ranked estimates of each study, which keeps all of them if none meets a level
+        best_ranks = np.full(num_studies, len(criterion), dtype=np.int64)
+        np.minimum.at(best_ranks, contested_study_ids, ranks)
+        selected[contested_positions] = ranks == best_ranks[contested_study_ids]
+
+    return selected
+
+
+def percent_adjustable(estimates: pd.DataFrame, selected: np.ndarray, study_ids: np.ndarray) -> np.ndarray:
+    # calculate what percentage of the selected estimates of each study are adjustable
+    num_studies = study_ids.max() + 1 if study_ids.size else 0
+    selected = selected & (study_ids >= 0)
+    n_estimates = np.bincount(study_ids[selected], minlength=num_studies)
+    n_estimates_with_adj = np.bincount(study_ids[selected & estimates['adj_prevalence'].notna().to_numpy()],
+                                       minlength=num_studies)
+    return n_estimates_with_adj / np.maximum(n_estimates, 1)
+
+
+def get_selected_estimates(estimates: pd.DataFrame,
+                           study_ids: np.ndarray,
+                           mode: str = 'dashboard',
+                           level_masks: Optional[dict] = None) -> np.ndarray:
+    '''Selects the estimates of each study that are kept by the prioritization criteria of the mode
+    :param study_ids: study of each estimate, from get_study_ids, or -1 for estimates that aren't prioritized
+    :param level_masks: masks of the levels of the criteria, shared between calls on the same estimates
+    :returns boolean mask of the selected estimates
+    '''
+    if not (study_ids >= 0).any():
+        # e.g. none of the estimates are subgroup estimates, there are no studies to prioritize
+        return np.zeros(study_ids.size, dtype=bool)
+    if mode == 'analysis_static':
+        return apply_prioritization_criteria(estimates, prioritization_criteria_testunadj, study_ids, level_masks)
+    elif mode == 'dashboard':
+        return apply_prioritization_criteria(estimates, prioritization_criteria_testadj, study_ids, level_masks)
+    elif mode == 'analysis_dynamic':
+        serotracker_adjusted = apply_prioritization_criteria(estimates, prioritization_criteria_testunadj, study_ids,
+                                                             level_masks)
+        author_adjusted = apply_prioritization_criteria(estimates, prioritization_criteria_testadj, study_ids,
+                                                        level_masks)
+
+        # if we were able to successfully adjust the seroprevalence estimates ourselves, use our own
+        # else, use the author's
+        use_serotracker_adjusted = percent_adjustable(estimates, serotracker_adjusted, study_ids) >= \
+            percent_adjustable(estimates, author_adjusted, study_ids)
+        return np.where(use_serotracker_adjusted[np.maximum(study_ids, 0)], serotracker_adjusted, author_adjusted)
+    return study_ids >= 0
+
+
+def pool_selected_estimates(estimates: pd.DataFrame, selected: np.ndarray, study_ids: np.ndarray) -> pd.DataFrame:
+    # studies with several selected estimates are pooled into one estimate, the others keep their only one
+    num_studies = study_ids.max() + 1 if study_ids.size else 0
+    selected = selected & (study_ids >= 0)
+    num_selected = np.bincount(study_ids[selected], minlength=num_studies)
+    pooled_rows = selected & (num_selected[np.maximum(study_ids, 0)] > 1)
+    single_rows = selected & ~pooled_rows
+    pooled_study_ids = np.unique(study_ids[pooled_rows])
+
+    selected_estimates, selected_study_ids = [], []
+    if single_rows.any():
+        selected_estimates.append(estimates.iloc[np.flatnonzero(single_rows)])
+        selected_study_ids.append(study_ids[single_rows])
+    if pooled_study_ids.size:
+        groups = np.searchsorted(pooled_study_ids, study_ids[pooled_rows])
+        selected_estimates.append(get_pooled_estimates(estimates.iloc[np.flatnonzero(pooled_rows)], groups))
+        selected_study_ids.append(pooled_study_ids)
+    if not selected_estimates:
+        return estimates.iloc[:0]
+    # put the estimates back in the same order as groupby('study_name')
+    study_order = np.argsort(np.concatenate(selected_study_ids), kind='stable')
+    return pd.concat(selected_estimates).iloc[study_order]
+
+
+def get_unpooled_selected_estimates(estimates: pd.DataFrame,
+                                    selected: np.ndarray,
+                                    study_ids: np.ndarray) -> pd.DataFrame:
+    # the selected estimates of every study, in the same order as groupby('study_name')
+    positions = np.flatnonzero(selected & (study_ids >= 0))
+    return estimates.iloc[positions[np.argsort(study_ids[positions], kind='stable')]]
 
 
 # pass in a filtered set of estimates - or estimates and filters
@@ -96,43 +196,38 @@ def get_prioritized_estimates(estimates: pd.DataFrame,
         for filter in filters:
             estimates = estimates[estimates.apply(filter, axis=1)]
 
-    selected_estimates = []
-    for _, study_estimates in estimates.groupby('study_name'):
-
-        # if there is only one estimate, use that
-        if study_estimates.shape[0] == 1:
-            selected_estimates.append(study_estimates.iloc[0])
-            continue
-
-        if mode == 'analysis_static':
-            study_estimates = apply_prioritization_criteria(study_estimates, prioritization_criteria_testunadj)
-        elif mode == 'dashboard':
-            study_estimates = apply_prioritization_criteria(study_estimates, prioritization_criteria_testadj)
-        elif mode == 'analysis_dynamic':
-            serotracker_adjusted = apply_prioritization_criteria(study_estimates, prioritization_criteria_testunadj)
-            author_adjusted = apply_prioritization_criteria(study_estimates, prioritization_criteria_testadj)
-
-            # if we were able to successfully adjust the seroprevalence estimates ourselves, use our own
-            # else, use the author's 
-            if percent_adjustable(serotracker_adjusted) >= percent_adjustable(author_adjusted):
-                study_estimates = serotracker_adjusted
-            else:
-                study_estimates = author_adjusted
-
-        # append the remaining estimate
-        if pool:
-            selected_estimates.append(get_pooled_estimate(study_estimates))
-        else:
-            selected_estimates.append(study_estimates)
-
-    # If the estimates are pooled, there may be multiple estimates so pivot and concat into a DF
+    study_ids = get_study_ids(estimates)
+    selected = get_selected_estimates(estimates, study_ids, mode)
     if pool:
-        selected_estimate_df = pd.concat(selected_estimates, axis=1).T.astype(estimates.dtypes.to_dict())
-    # If the estimates are not pooled, no need to pivot because estimate will just be a series
-    else:
-        selected_estimate_df = pd.concat(selected_estimates)
-
-    return selected_estimate_df
+        return pool_selected_estimates(estimates, selected, study_ids)
+    # The estimates are not pooled, so every selected estimate of a study is kept
+    return get_unpooled_selected_estimates(estimates, selected, study_ids)
+
+
+def get_prioritized_and_subgroup_estimates(estimates: pd.DataFrame,
+                                           subgroup_var: str,
+                                           mode: str = 'dashboard') -> Tuple[pd.DataFrame, pd.DataFrame]:
+    '''Prioritizes estimates normally, and prioritizes the estimates of subgroup_var without pooling them
+    :returns the prioritized estimates and the prioritized estimates of subgroup_var
+    '''
+    # The masks of the criteria levels are kept, so the remaining unpooled estimates are prioritized without
+    # evaluating the criteria again
+    study_ids = get_study_ids(estimates)
+    level_masks = {}
+    normal_estimates = pool_selected_estimates(estimates, get_selected_estimates(estimates, study_ids, mode,
+                                                                                 level_masks), study_ids)
+
+    # Prioritize the estimates of subgroup_var without pooling, as if the other estimates of each study didn't exist
+    subgroup_study_ids = np.where((estimates['subgroup_var'] == subgroup_var).to_numpy(), study_ids, -1)
+    subgroup_selected = get_selected_estimates(estimates, subgroup_study_ids, mode, level_masks)
+    unpooled_estimates = get_unpooled_selected_estimates(estimates, subgroup_selected, subgroup_study_ids)
+    return normal_estimates, unpooled_estimates
+
+
+def combine_subgroup_estimates(normal_estimates: pd.DataFrame, unpooled_estimates: pd.DataFrame) -> pd.DataFrame:
+    # return union of unpooled_estimates and normal_estimates
+    return pd.concat([normal_estimates, unpooled_estimates], ignore_index=True). \
+        drop_duplicates(subset=['source_id']).reset_index(drop=True)
 
 
 # Gets prioritized estimates without pooling by a specified subgrouping variable
@@ -140,21 +235,14 @@ def get_prioritized_estimates(estimates: pd.DataFrame,
 def get_prioritized_estimates_without_pooling(estimates: pd.DataFrame,
                                               subgroup_var: str,
                                               filters: Union[tuple, None] = None,
-                                              **kwargs):
-    # Prioritize estimates normally to get main prioritized esimates
-    normal_estimates = get_prioritized_estimates(estimates, filters=filters, **kwargs)
-
-    # Determine filters that should be applied to prioritize remaining unpooled estimates
-    unpooled_filters = set(filters) if filters else set()
-
-    # Add filter for subgroup_var based on what was passed in
-    unpooled_filters = tuple(set.union(unpooled_filters,
-                                       set([lambda estimate: estimate['subgroup_var'] == subgroup_var])))
-
-    # Re-apply prioritized estimates function without pooling to get remaining estimates
-    unpooled_estimates = get_prioritized_estimates(estimates, filters=unpooled_filters, pool=False, **kwargs)
+                                              mode: str = 'dashboard') -> pd.DataFrame:
+    if estimates.empty:
+        return pd.DataFrame()
+    if filters is not None:
+        # Apply filter lambda functions if they're supplied
+        for filter in filters:
+            estimates = estimates[estimates.apply(filter, axis=1)]
 
-    # return union of unpooled_estimates and normal_estimates
-    all_estimates = pd.concat([normal_estimates, unpooled_estimates], ignore_index=True). \
-        drop_duplicates(subset=['source_id']).reset_index(drop=True)
-    return all_estimates
+    # Prioritize estimates normally to get main prioritized esimates, and the remaining unpooled estimates
+    normal_estimates, unpooled_estimates = get_prioritized_and_subgroup_estimates(estimates, subgroup_var, mode)
+    return combine_subgroup_estimates(normal_estimates, unpooled_estimates)
@@ -0,0 +1,108 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from app.utils.estimate_prioritization.estimate_prioritization import get_study_ids, get_prioritized_estimates, \
+    get_prioritized_estimates_without_pooling, get_prioritized_and_subgroup_estimates, combine_subgroup_estimates
+
+logger = logging.getLogger(__name__)
+
+# Estimates being prioritized in parallel, which workers forked from this process read their chunks from
+# instead of receiving a copy of them
+_forked_estimates: Optional[pd.DataFrame] = None
+_parallel_lock = threading.Lock()
+
+
+def get_study_chunks(study_ids: np.ndarray, chunk_size: int) -> List[np.ndarray]:
+    '''Splits estimates into chunks of whole studies, with about chunk_size estimates each.
+    A chunk holds every study whose first estimate falls in the same chunk_size estimates, so a large study can make
+    its chunk larger
+    :param study_ids: study of each estimate, from get_study_ids
+    :returns positions of the estimates of each chunk, in the order of the estimates, with chunks in study order
+    '''
+    positions = np.argsort(study_ids, kind='stable')
+    positions = positions[study_ids[positions] >= 0]
+    if not positions.size:
+        return []
+    study_starts = np.flatnonzero(np.diff(study_ids[positions], prepend=-1))
+    chunks_of_studies = study_starts // max(chunk_size, 1)
+    chunk_starts = study_starts[np.flatnonzero(np.diff(chunks_of_studies, prepend=-1))]
+    return [np.sort(chunk) for chunk in np.split(positions, chunk_starts[1:])]
+
+
+def _prioritize_chunk(chunk: Union[np.ndarray, pd.DataFrame], mode: str, subgroup_var: Optional[str]):
+    # Runs in a worker process, chunk is either the positions of the estimates of the chunk in _forked_estimates
+    # or the estimates themselves
+    estimates = _forked_estimates.iloc[chunk] if isinstance(chunk, np.ndarray) else chunk
+    if subgroup_var is None:
+        return get_prioritized_estimates(estimates, mode=mode)
+    return get_prioritized_and_subgroup_estimates(estimates, subgroup_var, mode)
+
+
+def _prioritize_chunks(estimates: pd.DataFrame, chunks: List[np.ndarray], mode: str, subgroup_var: Optional[str],
+                       max_workers: int) -> list:
+    global _forked_estimates
+    max_workers = min(max_workers, len(chunks))
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        # e.g. on Windows, the estimates of each chunk are copied to the workers
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(_prioritize_chunk, [estimates.iloc[chunk] for chunk in chunks],
+                                     repeat(mode), repeat(subgroup_var)))
+    # Workers are forked once the estimates are set, so they share the estimates' memory with this process,
+    # and only the prioritized estimates are copied back
+    with _parallel_lock:
+        _forked_estimates = estimates
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork')) \
+                    as executor:
+                return list(executor.map(_prioritize_chunk, chunks, repeat(mode), repeat(subgroup_var)))
+        finally:
+            _forked_estimates = None
+
+
+def get_prioritized_estimates_in_parallel(estimates: pd.DataFrame,
+                                          mode: str = 'dashboard',
+                                          subgroup_var: Optional[str] = None,
+                                          max_workers: Optional[int] = None,
+                                          chunk_size: int = 10000,
+                                          min_estimates: int = 40000) -> pd.DataFrame:
+    '''Prioritizes chunks of studies in worker processes, and merges them in the same order as prioritizing
+    all the estimates at once
+    :param subgroup_var: if given, subgrouping variable to refrain from pooling by, as in
+    get_prioritized_estimates_without_pooling
+    :param max_workers: number of worker processes, the number of CPUs by default
+    :param chunk_size: number of estimates sent to a worker at a time
+    :param min_estimates: estimates are prioritized in this process if there are fewer of them, since sending them to
+    the workers would take longer than prioritizing them
+    :returns the same estimates as get_prioritized_estimates, or get_prioritized_estimates_without_pooling
+    '''
+    max_workers = max_workers or os.cpu_count() or 1
+    chunks = get_study_chunks(get_study_ids(estimates), chunk_size) \
+        if not estimates.empty and estimates.shape[0] >= min_estimates and max_workers > 1 else []
+
+    if len(chunks) > 1:
+        try:
+            results = _prioritize_chunks(estimates, chunks, mode, subgroup_var, max_workers)
+            if subgroup_var is None:
+                return pd.concat(results)
+            return combine_subgroup_estimates(pd.concat([normal_estimates for normal_estimates, _ in results]),
+                                              pd.concat([unpooled_estimates for _, unpooled_estimates in results]))
+        except BrokenProcessPool:
+            # e.g. a worker was killed for running out of memory
+            logger.warning('Prioritization worker process died, prioritizing estimates serially')
+        except Exception:
+            # e.g. the estimates of a chunk could not be sent to a worker, an error of the prioritization itself is
+            # raised again by the serial prioritization
+            logger.exception('Prioritizing estimates in parallel failed, prioritizing estimates serially')
+
+    if subgroup_var is None:
+        return get_prioritized_estimates(estimates, mode=mode)
+    return get_prioritized_estimates_without_pooling(estimates, subgroup_var=subgroup_var, mode=mode)
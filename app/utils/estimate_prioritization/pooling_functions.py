@@ -4,29 +4,49 @@ import numpy as np
 from typing import Any
 
 # we will need to 'pool' estimates, collapsing values from multiple estimates to one
-# here are functions that do that for each variable
+# here are functions that do that for each variable, for the estimates of every pooled study at once:
+# each one takes the estimates, the column to pool and the number of the pooled study of each estimate (from 0),
+# and returns a series with the pooled value of the column for each study, indexed by study number
 PoolingFnMap = namedtuple(typename = 'PoolingFnMap',
                           field_names = ['summary_type',
                                          'column_names',
                                          'summary_function'])
 
 # helper function to use to generate lambdas
-def get_unique_value(series: pd.Series, default: Any = pd.NA) -> Any:
-    unique_vals = series.dropna().unique()
-    if len(unique_vals) == 1:
-        return unique_vals[0]
-    else:
-        return default
+def get_unique_value(estimates: pd.DataFrame, col: str, groups: np.ndarray, default: Any = pd.NA) -> pd.Series:
+    # the value of each study if all of its estimates that have one agree, else default
+    grouped = estimates[col].groupby(groups)
+    unique_vals = grouped.first()
+    return unique_vals.where(grouped.nunique() == 1, default)
 
-def weighted_average(input_df: pd.DataFrame, value_col: str, weight_col: str) -> float:
-    df = input_df.dropna(axis = 'index', 
-                         how = 'any', 
-                         subset = [value_col, weight_col])
-    if not df.empty:
-        return ((df[weight_col] * df[value_col]).sum() / 
-                 df[weight_col].sum())
-    else:
-        return np.nan
+def get_unique_values(estimates: pd.DataFrame, col: str, groups: np.ndarray) -> pd.Series:
+    # the distinct values of each study, in order of appearance, with list values flattened
+    num_groups = groups.max() + 1
+    values = pd.DataFrame({'group': groups, 'value': estimates[col].to_numpy()}).explode('value')
+    values = values.dropna(subset = ['value']).drop_duplicates()
+    unique_vals = values.groupby('group')['value'].agg(list).reindex(range(num_groups))
+    # Note need to return standard python lists instead of ndarrays, and an empty list when a study has no values
+    return unique_vals.map(lambda vals: vals if isinstance(vals, list) else [])
+
+def weighted_average(input_df: pd.DataFrame, value_col: str, weight_col: str, groups: np.ndarray) -> pd.Series:
+    num_groups = groups.max() + 1
+    values = pd.to_numeric(input_df[value_col], errors = 'coerce').to_numpy(dtype = float)
+    weights = pd.to_numeric(input_df[weight_col], errors = 'coerce').to_numpy(dtype = float)
+    valid = ~np.isnan(values) & ~np.isnan(weights)
+    weighted_sums = np.bincount(groups, weights = np.where(valid, weights * values, 0), minlength = num_groups)
+    weight_sums = np.bincount(groups, weights = np.where(valid, weights, 0), minlength = num_groups)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        averages = np.where(np.bincount(groups[valid], minlength = num_groups) > 0,
+                            weighted_sums / weight_sums, np.nan)
+    return pd.Series(averages)
+
+def mean(estimates: pd.DataFrame, col: str, groups: np.ndarray) -> pd.Series:
+    num_groups = groups.max() + 1
+    values = pd.to_numeric(estimates[col], errors = 'coerce').to_numpy(dtype = float)
+    valid = ~np.isnan(values)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return pd.Series(np.bincount(groups[valid], weights = values[valid], minlength = num_groups) /
+                         np.bincount(groups[valid], minlength = num_groups))
 
 pooling_function_maps = [
     PoolingFnMap(summary_type = 'sum',
@@ -38,29 +58,28 @@ pooling_function_maps = [
                                  'death_count_plus11',
                                  'death_count_plus4',
                                  'deaths_population'],
-                 summary_function = lambda estimates, col: estimates[col].sum(skipna = True)),
+                 summary_function = lambda estimates, col, groups: estimates[col].groupby(groups).sum()),
     PoolingFnMap(summary_type = 'union',
                  column_names = ['state',
                                  'city',
                                  'antibody_target',
                                  'test_manufacturer'],
-                 # Note need to return standard python list instead of ndarray
-                 summary_function = lambda estimates, col: estimates[col].explode().dropna().unique().tolist()),
+                 summary_function = get_unique_values),
     PoolingFnMap(summary_type = 'min',
                  column_names = ['sampling_start_date',
                                 'age_min'],
-                 summary_function = lambda estimates, col: estimates[col].min()),
+                 summary_function = lambda estimates, col, groups: estimates[col].groupby(groups).min()),
     PoolingFnMap(summary_type = 'max',
                  column_names = ['sampling_end_date',
                                  'date_created',
                                  'last_modified_time',
                                  'publication_date',
                                  'age_max'],
-                 summary_function = lambda estimates, col: estimates[col].max()),
+                 summary_function = lambda estimates, col, groups: estimates[col].groupby(groups).max()),
     PoolingFnMap(summary_type = 'mean',
                  column_names = ['pin_latitude',
                                  'pin_longitude'],
-                 summary_function = lambda estimates, col: estimates[col].mean()),
+                 summary_function = mean),
     PoolingFnMap(summary_type = 'logical_AND',
                  column_names = ['academic_primary_estimate',
                                  'dashboard_primary_estimate',
@@ -69,7 +88,7 @@ pooling_function_maps = [
                                  'geo_exact_match',
                                  'included',
                                  'include_in_srma'],
-                 summary_function = lambda estimates, col: estimates[col].fillna(True).max()),
+                 summary_function = lambda estimates, col, groups: estimates[col].fillna(True).groupby(groups).max()),
     PoolingFnMap(summary_type = 'unique_value_or_na',
                  column_names = ['country',
                                  'country_iso3',
@@ -79,33 +98,33 @@ pooling_function_maps = [
                                  'subgroup_var',
                                  'subgroup_cat',
                                  'ind_eval_type'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], pd.NA)),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, pd.NA)),
     PoolingFnMap(summary_type = 'unique_value_population_group',
                  column_names = ['population_group'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], 'Multiple populations')),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, 'Multiple populations')),
     PoolingFnMap(summary_type = 'unique_value_age',
                  column_names = ['age'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], 'Multiple groups')),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, 'Multiple groups')),
     PoolingFnMap(summary_type = 'unique_value_population_group',
                  column_names = ['sex'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], 'All')),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, 'All')),
     PoolingFnMap(summary_type = 'unique_value_genpop',
                  column_names = ['genpop'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], 'Study examining special population seroprevalence')),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, 'Study examining special population seroprevalence')),
     PoolingFnMap(summary_type = 'unique_value_isotype_comb',
                  column_names = ['isotype_comb'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], 'AND')),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, 'AND')),
     PoolingFnMap(summary_type = 'unique_value_specimen_test_type',
                  column_names = ['specimen_type', 'test_type'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], 'Multiple Types')),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, 'Multiple Types')),
     PoolingFnMap(summary_type = 'unique_value_test_validation',
                  column_names = ['genpop'],
-                 summary_function = lambda estimates, col: get_unique_value(estimates[col], 'Multiple test_utils with diff validations or values derived from each type')),
+                 summary_function = lambda estimates, col, groups: get_unique_value(estimates, col, groups, 'Multiple test_utils with diff validations or values derived from each type')),
     PoolingFnMap(summary_type = 'concatenate_with_semicolons',
                  column_names = ['sample_frame_info',
                                  'test_name',
                                  'subgroup_specific_category'],
-                 summary_function = lambda estimates, col: '; '.join(estimates[col].dropna().unique())),
+                 summary_function = lambda estimates, col, groups: get_unique_values(estimates, col, groups).map('; '.join)),
     PoolingFnMap(summary_type = 'identity_from_max_denominator',
                  column_names = ['test_manufacturer',
                                  'sensitivity',
@@ -151,7 +170,9 @@ pooling_function_maps = [
                                  'full_vaccinations_per_hundred',
                                  'vaccinations_per_hundred',
                                  'tests_per_hundred'],
-                 summary_function = lambda estimates, col: weighted_average(estimates, value_col = col, weight_col = 'denominator_value')),
+                 summary_function = lambda estimates, col, groups: weighted_average(estimates, value_col = col,
+                                                                                    weight_col = 'denominator_value',
+                                                                                    groups = groups)),
 ]
 
 # Helper function to help with validating that all columns
@@ -1,63 +1,88 @@
+from typing import Callable
+
+import numpy as np
 import pandas as pd
 
+
+# Each level of a criterion takes a frame of estimates and returns a boolean mask of the estimates that meet it,
+# so a level is evaluated for every estimate in one pass instead of row by row
+def is_true(values: pd.Series) -> np.ndarray:
+    # Same as `value is True` for each value, so e.g. None or 'True' don't count as true
+    return np.fromiter((value is True for value in values.to_numpy(dtype=object)), dtype=bool, count=len(values))
+
+
+def is_na(values: pd.Series) -> np.ndarray:
+    return values.isna().to_numpy()
+
+
+def equals(values: pd.Series, value) -> np.ndarray:
+    return (values == value).to_numpy()
+
+
+def isotypes_match(estimates: pd.DataFrame, predicate: Callable[[list, str], bool]) -> np.ndarray:
+    # Isotypes are lists, so they are checked one estimate at a time
+    return np.fromiter((bool(predicate(isotypes, comb)) for isotypes, comb
+                        in zip(estimates['isotypes_reported'], estimates['isotype_comb'])),
+                       dtype=bool, count=estimates.shape[0])
+
+
 # define a full set of prioritization criteria
 prioritization_criteria_full = {
     'primary_estimate_testadj': [
-        lambda estimate: estimate['dashboard_primary_estimate'] is True
+        lambda estimates: is_true(estimates['dashboard_primary_estimate'])
     ],
     'adjustment_testadj': [
-        lambda estimate: (estimate['pop_adj'] is True) and (estimate['test_adj'] is True),
-        lambda estimate: (pd.isna(estimate['pop_adj'])) and (estimate['test_adj'] is True),
-        lambda estimate: (estimate['pop_adj'] is True) and (pd.isna(estimate['test_adj'])),
-        lambda estimate: (pd.isna(estimate['pop_adj'])) and (pd.isna(estimate['test_adj'])),
+        lambda estimates: is_true(estimates['pop_adj']) & is_true(estimates['test_adj']),
+        lambda estimates: is_na(estimates['pop_adj']) & is_true(estimates['test_adj']),
+        lambda estimates: is_true(estimates['pop_adj']) & is_na(estimates['test_adj']),
+        lambda estimates: is_na(estimates['pop_adj']) & is_na(estimates['test_adj']),
     ],
     'primary_estimate_testunadj': [
-        lambda estimate: estimate['academic_primary_estimate'] is True
+        lambda estimates: is_true(estimates['academic_primary_estimate'])
     ],
     'adjustment_testunadj': [
-        lambda estimate: (estimate['pop_adj'] is True) and (pd.isna(estimate['test_adj'])),
-        lambda estimate: (pd.isna(estimate['pop_adj'])) and (pd.isna(estimate['test_adj'])),
-        lambda estimate: (estimate['pop_adj'] is True) and (estimate['test_adj'] is True),
-        lambda estimate: (pd.isna(estimate['pop_adj'])) and (estimate['test_adj'] is True),
+        lambda estimates: is_true(estimates['pop_adj']) & is_na(estimates['test_adj']),
+        lambda estimates: is_na(estimates['pop_adj']) & is_na(estimates['test_adj']),
+        lambda estimates: is_true(estimates['pop_adj']) & is_true(estimates['test_adj']),
+        lambda estimates: is_na(estimates['pop_adj']) & is_true(estimates['test_adj']),
     ],
     'estimate_grade': [
-        lambda estimate: estimate['estimate_grade'] == 'National',
-        lambda estimate: estimate['estimate_grade'] == 'Regional',
-        lambda estimate: estimate['estimate_grade'] == 'Local',
-        lambda estimate: estimate['estimate_grade'] == 'Sublocal',
+        lambda estimates: equals(estimates['estimate_grade'], 'National'),
+        lambda estimates: equals(estimates['estimate_grade'], 'Regional'),
+        lambda estimates: equals(estimates['estimate_grade'], 'Local'),
+        lambda estimates: equals(estimates['estimate_grade'], 'Sublocal'),
     ],
     'age': [
-        lambda estimate: estimate['age'] == 'Multiple groups'
+        lambda estimates: equals(estimates['age'], 'Multiple groups')
     ],
     'sex': [
-        lambda estimate: estimate['sex'] == 'All'
+        lambda estimates: equals(estimates['sex'], 'All')
     ],
     'isotype': [
-        lambda estimate: 'Total Antibody' in estimate['isotypes_reported'], # total Ab
-        lambda estimate: ((len(estimate['isotypes_reported']) > 1) and \
-                         ('IgG' in estimate['isotypes_reported']) and \
-                         ((estimate['isotype_comb'] == 'OR') or \
-                         estimate['isotype_comb'] == 'AND/OR')),   # IgG OR other Ab
-        lambda estimate: ((len(estimate['isotypes_reported']) == 1) and \
-                         ('IgG' in estimate['isotypes_reported'])),         # IgG alone
-        lambda estimate: ((len(estimate['isotypes_reported']) > 1) and \
-                         ('IgM' in estimate['isotypes_reported']) and \
-                         ((estimate['isotype_comb'] == 'OR') or \
-                         estimate['isotype_comb'] == 'AND/OR')),   # IgM OR other Ab
-        lambda estimate: ((len(estimate['isotypes_reported']) > 1) and \
-                         ('IgG' in estimate['isotypes_reported'])),         # IgG AND other Ab
-        lambda estimate: ((len(estimate['isotypes_reported']) == 1) and \
-                         ('IgM' in estimate['isotypes_reported'])),         # IgM alone
-        lambda estimate: ((len(estimate['isotypes_reported']) > 1) and \
-                         ('IgG' in estimate['isotypes_reported']))          # IgM AND other Ab
+        lambda estimates: isotypes_match(estimates, lambda isotypes, comb:
+                                         'Total Antibody' in isotypes),  # total Ab
+        lambda estimates: isotypes_match(estimates, lambda isotypes, comb:
+                                         (len(isotypes) > 1) and ('IgG' in isotypes) and
+                                         ((comb == 'OR') or comb == 'AND/OR')),  # IgG OR other Ab
+        lambda estimates: isotypes_match(estimates, lambda isotypes, comb:
+                                         (len(isotypes) == 1) and ('IgG' in isotypes)),  # IgG alone
+        lambda estimates: isotypes_match(estimates, lambda isotypes, comb:
+                                         (len(isotypes) > 1) and ('IgM' in isotypes) and
+                                         ((comb == 'OR') or comb == 'AND/OR')),  # IgM OR other Ab
+        lambda estimates: isotypes_match(estimates, lambda isotypes, comb:
+                                         (len(isotypes) > 1) and ('IgG' in isotypes)),  # IgG AND other Ab
+        lambda estimates: isotypes_match(estimates, lambda isotypes, comb:
+                                         (len(isotypes) == 1) and ('IgM' in isotypes)),  # IgM alone
+        lambda estimates: isotypes_match(estimates, lambda isotypes, comb:
+                                         (len(isotypes) > 1) and ('IgG' in isotypes))  # IgM AND other Ab
     ],
     'test_type': [
-        lambda estimate: estimate['test_type'] == 'Neutralization',
-        lambda estimate: estimate['test_type'] == 'CLIA',
-        lambda estimate: estimate['test_type'] == 'ELISA'
+        lambda estimates: equals(estimates['test_type'], 'Neutralization'),
+        lambda estimates: equals(estimates['test_type'], 'CLIA'),
+        lambda estimates: equals(estimates['test_type'], 'ELISA')
     ],
     'specimen': [
-        lambda estimate: estimate['specimen_type'] != 'Dried Blood'
+        lambda estimates: (estimates['specimen_type'] != 'Dried Blood').to_numpy()
     ]
 }
 
@@ -67,4 +92,4 @@ prioritization_criteria_testadj = {name: criterion for name, criterion
 
 prioritization_criteria_testunadj = {name: criterion for name, criterion
                                     in prioritization_criteria_full.items()
-                                    if name.find('testadj') == -1}
\ No newline at end of file
+                                    if name.find('testadj') == -1}
@@ -0,0 +1,169 @@
+import threading
+from datetime import date, datetime
+from uuid import UUID
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Columns whose record values can be compared against a sampling/publication date range
+DATE_RANGE_KEYS = {'sampling': 'sampling_end_date', 'publication': 'publication_date'}
+
+
+def get_sort_key(record: Dict[str, Any], key: str) -> tuple:
+    # Records are sorted by the value of key, with records missing a value last, and source_id breaks ties
+    # so that every record has a unique position. Missing values are left out of the tuple so that None is never
+    # compared with a value. Dates and UUIDs are compared as strings so that sort keys can be written to JSON
+    value = record.get(key)
+    source_id = str(record.get('source_id'))
+    if value is None:
+        return 1, source_id
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    elif isinstance(value, UUID):
+        value = str(value)
+    return 0, value, source_id
+
+
+class FacetIndex:
+    '''Inverted index over a list of records, mapping each value of a column to a bitset of record positions.
+    Bitsets are stored as python ints, so OR-ing the values of one filter key and AND-ing across keys
+    are single big-integer operations. The index for a key is built the first time that key is filtered on.'''
+
+    def __init__(self, records: Sequence[Dict[str, Any]]):
+        self.records = records
+        self.num_records = len(records)
+        self.all_records_mask = (1 << self.num_records) - 1
+        self._facets: Dict[str, Dict[Any, int]] = {}
+        self._truthy_masks: Dict[str, int] = {}
+        self._sorted_dates: Dict[str, tuple] = {}
+        self._sort_orders: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _positions_to_mask(self, positions: Sequence[int]) -> int:
+        if len(positions) == 0:
+            return 0
+        bits = np.zeros(self.num_records, dtype=bool)
+        bits[np.asarray(positions, dtype=np.int64)] = True
+        return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+
+    def mask_to_positions(self, mask: int) -> np.ndarray:
+        # Returns the positions of the set bits in ascending order
+        if mask == 0:
+            return np.array([], dtype=np.int64)
+        return np.flatnonzero(self.mask_to_bools(mask))
+
+    def _get_facet(self, key: str) -> Dict[Any, int]:
+        facet = self._facets.get(key)
+        if facet is not None:
+            return facet
+        with self._lock:
+            if key not in self._facets:
+                # Match filtering in python: strings match on equality and lists match if any element matches,
+                # any other value (e.g. None) never matches
+                value_positions = {}
+                for position, record in enumerate(self.records):
+                    value = record[key]
+                    if isinstance(value, str):
+                        value_positions.setdefault(value, []).append(position)
+                    elif isinstance(value, list):
+                        for element in set(value):
+                            value_positions.setdefault(element, []).append(position)
+                self._facets[key] = {value: self._positions_to_mask(positions)
+                                     for value, positions in value_positions.items()}
+            return self._facets[key]
+
+    def _get_truthy_mask(self, key: str) -> int:
+        mask = self._truthy_masks.get(key)
+        if mask is not None:
+            return mask
+        with self._lock:
+            if key not in self._truthy_masks:
+                self._truthy_masks[key] = self._positions_to_mask(
+                    [position for position, record in enumerate(self.records) if record[key] is True])
+            return self._truthy_masks[key]
+
+    def _get_sorted_dates(self, key: str) -> tuple:
+        sorted_dates = self._sorted_dates.get(key)
+        if sorted_dates is not None:
+            return sorted_dates
+        with self._lock:
+            if key not in self._sorted_dates:
+                dated = sorted(((record[key], position) for position, record in enumerate(self.records)
+                                if record[key]), key=lambda date_position: date_position[0])
+                self._sorted_dates[key] = ([date for date, _ in dated], [position for _, position in dated])
+            return self._sorted_dates[key]
+
+    def _get_date_range_mask(self, key: str, start_date=None, end_date=None) -> int:
+        dates, positions = self._get_sorted_dates(key)
+        lower = bisect_left(dates, start_date) if start_date is not None else 0
+        upper = bisect_right(dates, end_date) if end_date is not None else len(dates)
+        return self._positions_to_mask(positions[lower:upper])
+
+    def get_mask(self, filters: Optional[Dict[str, List[str]]] = None, sampling_start_date=None,
+                 sampling_end_date=None, publication_start_date=None, publication_end_date=None,
+                 include_in_srma: bool = False, primary_estimates_only: bool = False) -> int:
+        '''Evaluates filters against the index
+        :param filters: dict mapping a record key to a list of accepted values (OR within a key, AND across keys)
+        :param include_in_srma: only keep records where include_in_srma is True
+        :param primary_estimates_only: only keep records where dashboard_primary_estimate is True
+        :returns a bitset of the positions of the matching records
+        '''
+        mask = self.all_records_mask
+        for key, values in (filters or {}).items():
+            if not values:
+                continue
+            facet = self._get_facet(key)
+            key_mask = 0
+            for value in values:
+                key_mask |= facet.get(value, 0)
+            mask &= key_mask
+
+        date_bounds = {'sampling': (sampling_start_date, sampling_end_date),
+                       'publication': (publication_start_date, publication_end_date)}
+        for date_type, (start_date, end_date) in date_bounds.items():
+            if start_date is not None or end_date is not None:
+                mask &= self._get_date_range_mask(DATE_RANGE_KEYS[date_type], start_date, end_date)
+
+        if include_in_srma:
+            mask &= self._get_truthy_mask('include_in_srma')
+        if primary_estimates_only:
+            mask &= self._get_truthy_mask('dashboard_primary_estimate')
+        return mask
+
+    def get_sort_order(self, key: str) -> tuple:
+        '''Sorts the records by key, see get_sort_key
+        :returns a tuple of (array of record positions in sorted order, list of the sort keys in the same order)
+        '''
+        sort_order = self._sort_orders.get(key)
+        if sort_order is not None:
+            return sort_order
+        with self._lock:
+            if key not in self._sort_orders:
+                sort_keys = [get_sort_key(record, key) for record in self.records]
+                positions = sorted(range(self.num_records), key=sort_keys.__getitem__)
+                self._sort_orders[key] = (np.array(positions, dtype=np.int64),
+                                          [sort_keys[position] for position in positions])
+            return self._sort_orders[key]
+
+    def mask_to_bools(self, mask: int) -> np.ndarray:
+        # Returns an array with one bool per record, True if the record is in the mask
+        num_bytes = (self.num_records + 7) // 8
+        bits = np.unpackbits(np.frombuffer(mask.to_bytes(num_bytes, 'little'), dtype=np.uint8), bitorder='little')
+        return bits[:self.num_records].astype(bool)
+
+    def get_records(self, positions: Sequence[int]) -> List[Dict[str, Any]]:
+        # Records that are mapped from a snapshot file are converted all at once instead of one by one
+        if hasattr(self.records, 'take'):
+            return self.records.take(positions)
+        return [self.records[position] for position in positions]
+
+    def gather(self, mask: int) -> List[Dict[str, Any]]:
+        # Gathers the records in the mask, in their original order
+        if mask == self.all_records_mask:
+            return list(self.records)
+        return self.get_records(self.mask_to_positions(mask))
+
+    def select(self, **kwargs) -> List[Dict[str, Any]]:
+        # Gathers the records matching the filters, in their original order
+        return self.gather(self.get_mask(**kwargs))
@@ -1,13 +1,26 @@
 import json
+import logging
+from datetime import datetime
 
 from Pathogens.Arbo.app.sqlalchemy.sql_alchemy_base import Estimate
 from app.serotracker_sqlalchemy import db_session, DashboardSource, ResearchSource, \
-    db_model_config, Country, dashboard_source_cols, research_source_cols, ArboRecords
-from sqlalchemy.dialects.postgresql import array
-from sqlalchemy import func, cast, case, and_, String, ARRAY
+    db_model_config, Country, dashboard_source_cols, research_source_cols, ArboRecords, PrioritizedEstimate, \
+    RecordsFlat
+from sqlalchemy.dialects.postgresql import array, aggregate_order_by
+from sqlalchemy import func, cast, case, and_, select, null, literal_column, true, String, Text, DateTime, \
+    ARRAY
 import pandas as pd
-import numpy as np
-from app.utils.estimate_prioritization import get_prioritized_estimates, get_prioritized_estimates_without_pooling
+from app.utils.estimate_prioritization import get_prioritized_estimates, get_prioritized_estimates_without_pooling, \
+    get_prioritized_estimates_in_parallel
+from app.utils.record_snapshot import RecordSnapshot, RecordSnapshotCache, get_records_version
+from app.utils.prioritized_study_cache import PrioritizedStudyCache, get_study_keys
+from app.utils.facet_index import FacetIndex
+from app.utils.cursor_pagination import get_cursor_page
+from app.utils.pin_jitter import get_jittered_pins_sql
+from app.utils.json_streaming import get_http_date_sql
+from app.utils.snapshot_file import get_snapshot_file_path, read_snapshot_file
+from app.utils.request_timing import timed_stage
+from flask import current_app as app, has_app_context
 
 from sqlalchemy.sql.visitors import VisitableType as SQLalchemyType
 from sqlalchemy.orm.attributes import InstrumentedAttribute as SQLalchemyExpression
@@ -55,187 +68,670 @@ def _apply_agg_query(agg_field_exp: SQLalchemyExpression, label: str,
 
 
 
-def get_all_records(research_fields=False, include_disputed_regions=False,
-                    unity_aligned_only=False, include_records_without_latlngs=False):
-    with db_session() as session:
-        # Get all records for now, join on all tables
-        table_infos = db_model_config['supplementary_table_info']
+# Filter keys whose values are aggregated into arrays from the multi select bridge tables
+def _get_multi_select_filter_entities():
+    return {table_info['entity']: table_info for table_info in db_model_config['supplementary_table_info']}
+
+
+def _get_filter_clauses(filters):
+    '''Translates a filters dict into SQL clauses that match the behaviour of filtering records in python
+    :param filters: dict mapping a record key to a list of accepted values
+    :returns a tuple of (where clauses, having clauses, whether the research source table is needed)
+    '''
+    where_clauses = []
+    having_clauses = []
+    needs_research_source = False
+    multi_select_entities = _get_multi_select_filter_entities()
+
+    for key, values in (filters or {}).items():
+        # An empty list of values means that no filter should be applied for this key
+        if not values:
+            continue
+        values = list(values)
+
+        if key in multi_select_entities:
+            # Aggregated multi select columns match if they overlap with the requested values
+            agg_field_exp = getattr(multi_select_entities[key]['main_table'], f"{key}_name")
+            agg_array = cast(func.array_agg(func.distinct(agg_field_exp)).filter(agg_field_exp.isnot(None)),
+                             ARRAY(String))
+            having_clauses.append(agg_array.op('&&')(cast(array(values), ARRAY(String))))
+        elif key == 'isotypes_reported':
+            isotype_array = _get_isotype_col_expression().element
+            where_clauses.append(isotype_array.op('&&')(cast(array(values), ARRAY(String))))
+        elif key == 'country':
+            where_clauses.append(Country.country_name.in_(values))
+        elif key in dashboard_source_cols:
+            where_clauses.append(getattr(DashboardSource, key).in_(values))
+        elif key in research_source_cols:
+            where_clauses.append(getattr(ResearchSource, key).in_(values))
+            needs_research_source = True
+        else:
+            logging.warning(f"'{key}' is not a filterable column and will be ignored.")
+
+    return where_clauses, having_clauses, needs_research_source
+
+
+# Date columns of the records, which are returned in ISO format
+DATE_FIELDS = ['sampling_end_date', 'sampling_start_date', 'publication_date', 'date_created', 'last_modified_time']
+
+# Variant of get_all_records (research_fields, include_disputed_regions, unity_aligned_only,
+# include_records_without_latlngs) whose prioritized estimates are stored by the ETL
+MATERIALIZED_VARIANT = (False, False, False, False)
 
-        # Add columns from dashboard source to select statement
-        fields_list = [DashboardSource.source_id]
-        for field_string in dashboard_source_cols:
+# Columns from the country table and the labels they are selected with
+COUNTRY_COLS = {'country': Country.country_name, 'country_iso3': Country.country_iso3,
+                'income_class': Country.income_class, 'hrp_class': Country.hrp_class}
+
+
+def _get_joined_records_query(session, research_fields=False, filters=None, columns=None):
+    # Builds the records query from the dashboard source table and the tables it references
+    # If columns are supplied, only select those columns (source_id is always selected)
+    # and only join the bridge tables of the multi select columns that are selected or filtered on
+    def is_selected(col):
+        return columns is None or col in columns
+
+    filter_keys = {key for key, values in (filters or {}).items() if values}
+    table_infos = [table_info for table_info in db_model_config['supplementary_table_info']
+                   if is_selected(table_info['entity']) or table_info['entity'] in filter_keys]
+
+    # Add columns from dashboard source to select statement
+    fields_list = [DashboardSource.source_id]
+    for field_string in dashboard_source_cols:
+        if is_selected(field_string):
             fields_list.append(getattr(DashboardSource, field_string))
 
-        # If research fields is True, add columns from research source to select statement
-        if research_fields:
-            for col in research_source_cols:
+    # If research fields is True, add columns from research source to select statement
+    if research_fields:
+        for col in research_source_cols:
+            if is_selected(col):
                 fields_list.append(getattr(ResearchSource, col))
 
-        # Alias for country name and iso3 code
-        fields_list.append(Country.country_name.label("country"))
-        fields_list.append(Country.country_iso3.label("country_iso3"))
-        fields_list.append(Country.income_class.label("income_class"))
-        fields_list.append(Country.hrp_class.label("hrp_class"))
-
-        # Will need to group by every field that isn't array aggregated
-        # using copy here since python assigns list variables by ref instead of by value
-        groupby_fields = fields_list.copy()
-
-        for table_info in table_infos:
-            # The label method returns an alias for the column being queried
-            # Use case: We want to get fields from the bridge table without the _name suffix
-            fields_list.append(_apply_agg_query(getattr(table_info["main_table"], f"{table_info['entity']}_name"),
-                                                table_info['entity']))
-
-        query = session.query(*fields_list, _get_isotype_col_expression(label="isotypes_reported"))
-
-        # There are entries that have multiple field values for a certain entity
-        # e.g., an entry may be associated with two different age groups, "Youth (13-17)" and "Children (0-12)"
-        # Gather up all of these rows
-        for table_info in table_infos:
-            bridge_table = table_info["bridge_table"]
-            main_table = table_info["main_table"]
-            entity = f"{table_info['entity']}_id"
-            try:
-                query = query.join(bridge_table, getattr(bridge_table, "source_id") ==
-                                   DashboardSource.source_id, isouter=True) \
-                    .join(main_table, getattr(main_table, entity) == getattr(bridge_table, entity), isouter=True)
-            except Exception as e:
-                print(e)
-
-        # Join on country table
+    # Alias for country name and iso3 code
+    country_cols = [col for col in COUNTRY_COLS if is_selected(col)]
+    for col in country_cols:
+        fields_list.append(COUNTRY_COLS[col].label(col))
+
+    # Will need to group by every field that isn't array aggregated
+    # using copy here since python assigns list variables by ref instead of by value
+    groupby_fields = fields_list.copy()
+
+    for table_info in table_infos:
+        # The label method returns an alias for the column being queried
+        # Use case: We want to get fields from the bridge table without the _name suffix
+        if is_selected(table_info['entity']):
+            fields_list.append(_apply_agg_query(getattr(table_info["main_table"],
+                                                        f"{table_info['entity']}_name"), table_info['entity']))
+
+    if is_selected('isotypes_reported'):
+        fields_list.append(_get_isotype_col_expression(label="isotypes_reported"))
+
+    query = session.query(*fields_list)
+
+    # There are entries that have multiple field values for a certain entity
+    # e.g., an entry may be associated with two different age groups, "Youth (13-17)" and "Children (0-12)"
+    # Gather up all of these rows
+    for table_info in table_infos:
+        bridge_table = table_info["bridge_table"]
+        main_table = table_info["main_table"]
+        entity = f"{table_info['entity']}_id"
+        try:
+            query = query.join(bridge_table, getattr(bridge_table, "source_id") ==
+                               DashboardSource.source_id, isouter=True) \
+                .join(main_table, getattr(main_table, entity) == getattr(bridge_table, entity), isouter=True)
+        except Exception as e:
+            print(e)
+
+    # Join on country table
+    if country_cols or 'country' in filter_keys:
         query = query.join(Country, Country.country_id == DashboardSource.country_id, isouter=True)
 
-        # If research fields is true, join to research source table
-        if research_fields:
-            query = query.join(ResearchSource, ResearchSource.source_id == DashboardSource.source_id)
+    # Translate filters into where/having clauses so that postgres only returns matching records
+    where_clauses, having_clauses, filters_need_research_source = _get_filter_clauses(filters)
+
+    # If research fields is true, join to research source table
+    if research_fields or filters_need_research_source:
+        query = query.join(ResearchSource, ResearchSource.source_id == DashboardSource.source_id)
+
+    for where_clause in where_clauses:
+        query = query.filter(where_clause)
+
+    # Need to apply group by so that array_agg works as expected
+    query = query.group_by(*groupby_fields)
+
+    for having_clause in having_clauses:
+        query = query.having(having_clause)
+
+    return query
+
 
-        # Filter out estimates in disputed areas if necessary
-        if not include_disputed_regions:
-            query = query.filter(DashboardSource.in_disputed_area == False)
+def _get_records_flat_query(session, research_fields=False, filters=None, columns=None):
+    # Builds the records query from the records_flat table written by the ETL,
+    # where the multi select columns are already arrays so nothing needs to be joined or grouped
+    def is_selected(col):
+        return columns is None or col in columns
 
-        # Filter out non unity aligned studies if necessary
-        if unity_aligned_only:
-            query = query.filter(DashboardSource.is_unity_aligned == True)
+    selectable_cols = dashboard_source_cols + list(COUNTRY_COLS) + db_model_config['multi_select_columns'] + \
+        ['isotypes_reported'] + (research_source_cols if research_fields else [])
+    fields_list = [RecordsFlat.source_id] + [getattr(RecordsFlat, col) for col in selectable_cols if is_selected(col)]
+    query = session.query(*fields_list)
 
-        # Filter out records without latlngs
-        if not include_records_without_latlngs:
-            query = query.filter(DashboardSource.pin_latitude.isnot(None)). \
-                filter(DashboardSource.pin_longitude.isnot(None))
+    # Matches the inner join on the research source table
+    filters_need_research_source = any(key in research_source_cols for key, values in (filters or {}).items()
+                                       if values)
+    if research_fields or filters_need_research_source:
+        query = query.filter(RecordsFlat.has_research_source.is_(True))
 
-        # Need to apply group by so that array_agg works as expected
-        query = query.group_by(*groupby_fields)
+    for key, values in (filters or {}).items():
+        # An empty list of values means that no filter should be applied for this key
+        if not values:
+            continue
+        values = list(values)
 
-        query = query.all()
+        # Array columns match if they overlap with the requested values
+        if key in db_model_config['multi_select_columns'] or key == 'isotypes_reported':
+            query = query.filter(getattr(RecordsFlat, key).op('&&')(cast(array(values), ARRAY(String))))
+        elif key in COUNTRY_COLS or key in dashboard_source_cols or key in research_source_cols:
+            query = query.filter(getattr(RecordsFlat, key).in_(values))
+        else:
+            logging.warning(f"'{key}' is not a filterable column and will be ignored.")
+    return query
+
+
+_records_flat_versions = set()
+
+
+def _use_records_flat() -> bool:
+    # records_flat is written as the last step of an ETL run, so it is only read once it holds the current records
+    if not app.config.get('RECORDS_FLAT_ENABLED', False):
+        return False
+    version = get_records_version()
+    if version is None:
+        return False
+    if version in _records_flat_versions:
+        return True
+    with db_session() as session:
+        is_loaded = session.query(RecordsFlat.source_id).filter(RecordsFlat.created_at == version).first() is not None
+    # Only remember loaded versions, since the table is loaded after the version of the records changes
+    if is_loaded:
+        _records_flat_versions.add(version)
+    return is_loaded
+
+
+def _get_all_records_query(session, research_fields=False, include_disputed_regions=False,
+                           unity_aligned_only=False, include_records_without_latlngs=False, filters=None,
+                           sampling_start_date=None, sampling_end_date=None, publication_start_date=None,
+                           publication_end_date=None, include_in_srma=False, columns=None,
+                           primary_estimates_only=False):
+    # Read from the denormalized records when the ETL has written them, otherwise join the tables they come from
+    if _use_records_flat():
+        query = _get_records_flat_query(session, research_fields, filters, columns)
+        records_table, research_table = RecordsFlat, RecordsFlat
+    else:
+        query = _get_joined_records_query(session, research_fields, filters, columns)
+        records_table, research_table = DashboardSource, ResearchSource
+
+    # Filter the sampling end date and publication date by start and/or end date bounds
+    # Note: comparisons with null dates are never true, so records without dates are excluded as well
+    if sampling_start_date is not None:
+        query = query.filter(records_table.sampling_end_date >= sampling_start_date)
+    if sampling_end_date is not None:
+        query = query.filter(records_table.sampling_end_date <= sampling_end_date)
+    if publication_start_date is not None:
+        query = query.filter(records_table.publication_date >= publication_start_date)
+    if publication_end_date is not None:
+        query = query.filter(records_table.publication_date <= publication_end_date)
+
+    # Need to check if 'research_fields' is applied
+    # because the include_in_srma field is in the ResearchSource table
+    if include_in_srma and research_fields:
+        query = query.filter(research_table.include_in_srma.is_(True))
+
+    if primary_estimates_only:
+        query = query.filter(records_table.dashboard_primary_estimate.is_(True))
+
+    # Filter out estimates in disputed areas if necessary
+    if not include_disputed_regions:
+        query = query.filter(records_table.in_disputed_area == False)
+
+    # Filter out non unity aligned studies if necessary
+    if unity_aligned_only:
+        query = query.filter(records_table.is_unity_aligned == True)
+
+    # Filter out records without latlngs
+    if not include_records_without_latlngs:
+        query = query.filter(records_table.pin_latitude.isnot(None)). \
+            filter(records_table.pin_longitude.isnot(None))
+
+    return query
+
+
+def get_all_records(research_fields=False, include_disputed_regions=False,
+                    unity_aligned_only=False, include_records_without_latlngs=False, **kwargs):
+    with timed_stage('sql') as stage, db_session() as session:
+        query = _get_all_records_query(session, research_fields, include_disputed_regions,
+                                       unity_aligned_only, include_records_without_latlngs, **kwargs).all()
         # Convert from sqlalchemy object to dict
         query_dict = [q._asdict() for q in query]
+        stage.rows = len(query_dict)
 
         return query_dict
 
 
-def get_filtered_records(research_fields=False, filters=None, columns=None, include_disputed_regions=False,
-                         sampling_start_date=None, sampling_end_date=None, include_subgeography_estimates=False,
-                         publication_start_date=None, publication_end_date=None, estimates_subgroup='all',
-                         prioritize_estimates_mode='dashboard', include_in_srma=False, unity_aligned_only=False,
-                         include_records_without_latlngs=False):
-    # Get all records from the database as a list of records represented by dicts
-    query_dicts = get_all_records(research_fields, include_disputed_regions, unity_aligned_only,
-                                  include_records_without_latlngs)
+def iter_all_records(research_fields=False, include_disputed_regions=False,
+                     unity_aligned_only=False, include_records_without_latlngs=False, **kwargs):
+    '''Same as get_all_records, but reads the rows with a server side cursor
+    so that only one batch of rows is held in memory at a time
+    :returns a generator of record dicts
+    '''
+    batch_size = app.config.get('RECORDS_STREAM_BATCH_SIZE', 1000)
+    with db_session() as session:
+        query = _get_all_records_query(session, research_fields, include_disputed_regions,
+                                       unity_aligned_only, include_records_without_latlngs, **kwargs)
+        for row in query.execution_options(stream_results=True).yield_per(batch_size):
+            yield row._asdict()
 
-    if query_dicts is None or len(query_dicts) == 0:
-        return []
 
-    # If estimates_subgroup is 'estimate_prioritization', perform estimate prioritization
-    if estimates_subgroup == 'prioritize_estimates':
-        result_df = pd.DataFrame(query_dicts)
-        if include_subgeography_estimates:
-            prioritized_records = get_prioritized_estimates_without_pooling(result_df,
-                                                                            subgroup_var="Geographical area",
-                                                                            mode=prioritize_estimates_mode)
-        else:
-            prioritized_records = get_prioritized_estimates(result_df, mode=prioritize_estimates_mode)
-        # If records exist, clean dataframe
-        if not prioritized_records.empty:
-            # Convert from True/None to True/False
-            for col in prioritized_records.columns:
-                # Note purpose of this line is to check if the col in question is a boolean col
-                # Can't simply check the dtype because cols with True/None instead of
-                # True/False have dtype="object" instead of "bool"
-                if True in prioritized_records[col].values:
-                    prioritized_records[col] = prioritized_records[col].fillna(False)
-            prioritized_records = prioritized_records.fillna(np.nan).replace({np.nan: None})
-        query_dicts = prioritized_records.to_dict('records')
-
-    # If estimates_subgroup is 'primary_estimates', just return the primary estimate for each study
-    # Otherwise, estimates_subgroup = 'all' so just return all estimates
-    elif estimates_subgroup == 'primary_estimates':
-        result_df = pd.DataFrame(query_dicts)
-        primary_estimates_df = result_df.loc[result_df['dashboard_primary_estimate'] == True]
-        primary_estimates_df = primary_estimates_df.fillna(np.nan).replace({np.nan: None})
-        query_dicts = primary_estimates_df.to_dict('records')
-
-    result = []
-
-    # Return all records if no filters are passed in
-    if filters:
-        def should_include(d, k, v):
-            if len(v) == 0:
-                return True
-            elif isinstance(d[k], str) and d[k] in v:
-                return True
-            elif isinstance(d[k], list) and set(d[k]).intersection(set(v)):
-                return True
-            return False
-
-        applied_filter = False
-        for k, v in filters.items():
-            # Add records passing the first filter
-            if not applied_filter:
-                for d in query_dicts:
-                    if should_include(d, k, v):
-                        result.append(d)
-                applied_filter = True
-                continue
-
-            result = list(filter(lambda x: should_include(x, k, v), result))
+def _map_published_records(variant, version):
+    # Records published by the ETL are mapped from a file shared by every worker instead of being queried
+    snapshot_dir = app.config.get('RECORD_SNAPSHOT_DIR')
+    if not snapshot_dir or version is None:
+        return None
+    return read_snapshot_file(get_snapshot_file_path(snapshot_dir, variant, version))
 
+
+_records_snapshots = RecordSnapshotCache(get_all_records, _map_published_records)
+
+
+def get_records_snapshot(research_fields=False, include_disputed_regions=False,
+                         unity_aligned_only=False, include_records_without_latlngs=False) -> RecordSnapshot:
+    '''Gets the joined records for the current ETL run, reusing this process's cached snapshot when possible
+    :returns a RecordSnapshot whose records must not be mutated
+    '''
+    variant = (bool(research_fields), bool(include_disputed_regions),
+               bool(unity_aligned_only), bool(include_records_without_latlngs))
+    if not app.config.get('RECORD_SNAPSHOT_ENABLED', False):
+        return RecordSnapshot(None, get_all_records(*variant))
+    return _records_snapshots.get(variant, get_records_version())
+
+
+class BatchRecordSnapshots:
+    '''Snapshots of the records shared by the requests of a batch. Each variant is only read once per batch,
+    even when record snapshots are disabled'''
+
+    def __init__(self):
+        self._snapshots = {}
+
+    def get(self, research_fields=False, include_disputed_regions=False, unity_aligned_only=False,
+            include_records_without_latlngs=False) -> RecordSnapshot:
+        variant = (bool(research_fields), bool(include_disputed_regions),
+                   bool(unity_aligned_only), bool(include_records_without_latlngs))
+        if variant not in self._snapshots:
+            self._snapshots[variant] = get_records_snapshot(*variant)
+        return self._snapshots[variant]
+
+
+def _format_record(record, columns=None):
+    # Return a copy so that records shared through a snapshot are never modified
+    # If columns are supplied, the copy only has those columns
+    formatted_record = {col: record.get(col) for col in columns} if columns else dict(record)
+    for field in DATE_FIELDS:
+        if formatted_record.get(field, None) is not None:
+            formatted_record[field] = formatted_record[field].isoformat()
+    return formatted_record
+
+
+def _is_missing(value) -> bool:
+    return value is None or value is pd.NaT or value is pd.NA or (type(value) is float and value != value)
+
+
+def _clean_prioritized_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # Clean the records the same way as a data frame of them, where records that aren't pooled have missing values
+    # for the columns that only pooled estimates get
+    columns = dict.fromkeys(records[0]) if records else {}
+    for record in records:
+        if record.keys() != columns.keys():
+            columns.update(dict.fromkeys(record))
+    cleaned_columns = []
+    for col in columns:
+        values = [record.get(col) for record in records]
+        missing = [value is None or value is pd.NaT or value is pd.NA or (type(value) is float and value != value)
+                   for value in values]
+        has_missing = True in missing
+        present = [value for value, is_missing in zip(values, missing) if not is_missing] if has_missing else values
+        # Convert from True/None to True/False
+        # Note purpose of this line is to check if the col in question is a boolean col
+        # Can't simply check the types because cols with True/None instead of True/False aren't all booleans
+        if True in present:
+            if has_missing:
+                values = [False if is_missing else value for value, is_missing in zip(values, missing)]
+        elif has_missing:
+            # Filling the missing values of a column of numbers converts its integers to floats
+            if all(type(value) in (int, float) for value in present):
+                values = [None if is_missing else float(value) for value, is_missing in zip(values, missing)]
+            else:
+                values = [None if is_missing else value for value, is_missing in zip(values, missing)]
+        cleaned_columns.append(values)
+    return [dict(zip(columns, row)) for row in zip(*cleaned_columns)]
+
+
+def _get_prioritized_records(records, include_subgeography_estimates, prioritize_estimates_mode, float_columns=()):
+    # Prioritizes records, without cleaning them
+    # float_columns are converted to floats, as they would be if records held all the records with missing values
+    result_df = pd.DataFrame(records)
+    for col in float_columns:
+        result_df[col] = result_df[col].astype(float)
+    if has_app_context() and app.config.get('PARALLEL_PRIORITIZATION_ENABLED', False):
+        prioritized_records = get_prioritized_estimates_in_parallel(
+            result_df, mode=prioritize_estimates_mode,
+            subgroup_var="Geographical area" if include_subgeography_estimates else None,
+            max_workers=app.config.get('PARALLEL_PRIORITIZATION_WORKERS'),
+            chunk_size=app.config.get('PARALLEL_PRIORITIZATION_CHUNK_SIZE', 10000),
+            min_estimates=app.config.get('PARALLEL_PRIORITIZATION_MIN_ESTIMATES', 40000))
+    elif include_subgeography_estimates:
+        prioritized_records = get_prioritized_estimates_without_pooling(result_df,
+                                                                        subgroup_var="Geographical area",
+                                                                        mode=prioritize_estimates_mode)
     else:
-        result = query_dicts
+        prioritized_records = get_prioritized_estimates(result_df, mode=prioritize_estimates_mode)
+    return prioritized_records.to_dict('records')
+
+
+_prioritized_study_cache = PrioritizedStudyCache()
+
+
+def init_prioritized_study_cache(flask_app):
+    '''Sizes the cache of prioritized studies from PRIORITIZED_STUDY_CACHE_MAX_STUDIES'''
+    _prioritized_study_cache.max_studies = flask_app.config.get('PRIORITIZED_STUDY_CACHE_MAX_STUDIES',
+                                                                _prioritized_study_cache.max_studies)
+
+
+def get_prioritized_study_cache_stats():
+    return _prioritized_study_cache.get_stats()
+
+
+def _prioritize_records_by_study(records, prioritize_estimates_mode):
+    # Gets the prioritized estimates of each study from the cache, and prioritizes the studies that aren't cached
+    # together. Studies are in the same order as groupby('study_name'), which drops records without a study
+    studies = {}
+    for record in records:
+        if not _is_missing(record.get('study_name')):
+            studies.setdefault(record['study_name'], []).append(record)
+    columns = tuple(records[0].keys())
+    # Integer columns of a study are floats if any records have missing values, as they would be if every record was
+    # prioritized together. Those columns depend on the other records, so they are part of the study's key
+    study_int_columns = {study_name: tuple(col for col, value in study_records[0].items()
+                                           if isinstance(value, int) and not isinstance(value, bool))
+                         for study_name, study_records in studies.items()}
+    missing_columns = {col for col in set().union(*study_int_columns.values())
+                       if any(_is_missing(record[col]) for record in records)}
+    study_float_columns = {study_name: tuple(col for col in int_columns if col in missing_columns)
+                           for study_name, int_columns in study_int_columns.items()}
+    study_keys = {study_name: (prioritize_estimates_mode, columns, study_float_columns[study_name], key)
+                  for study_name, key in get_study_keys(studies).items()}
+    prioritized_studies = _prioritized_study_cache.get_many(study_keys.values())
+
+    missing_studies = [study_name for study_name, key in study_keys.items() if key not in prioritized_studies]
+    if missing_studies:
+        missing_records = [record for study_name in missing_studies for record in studies[study_name]]
+        float_columns = list(dict.fromkeys(col for study_name in missing_studies
+                                           for col in study_float_columns[study_name]))
+        prioritized_records = {}
+        for record in _get_prioritized_records(missing_records, False, prioritize_estimates_mode, float_columns):
+            prioritized_records.setdefault(record['study_name'], []).append(record)
+        new_studies = {study_keys[study_name]: prioritized_records.get(study_name, [])
+                       for study_name in missing_studies}
+        _prioritized_study_cache.put_many(new_studies)
+        prioritized_studies.update(new_studies)
+
+    return [record for study_name in sorted(studies) for record in prioritized_studies[study_keys[study_name]]]
+
+
+def prioritize_records(records, include_subgeography_estimates=False, prioritize_estimates_mode='dashboard'):
+    '''Runs estimate prioritization on the records of get_all_records
+    :returns the prioritized records as a list of dicts
+    '''
+    if records is None or len(records) == 0:
+        return []
+
+    use_study_cache = has_app_context() and app.config.get('PRIORITIZED_STUDY_CACHE_ENABLED', False)
+    if use_study_cache and not include_subgeography_estimates:
+        prioritized_records = _prioritize_records_by_study(records, prioritize_estimates_mode)
+    else:
+        prioritized_records = _get_prioritized_records(records, include_subgeography_estimates,
+                                                       prioritize_estimates_mode)
+    return _clean_prioritized_records(prioritized_records)
+
 
-    def date_filter(record, start_date=None, end_date=None, use_sampling_date=True):
-        status = True
-        record_end_date = record["sampling_end_date"] if use_sampling_date else record["publication_date"]
+def get_materialized_prioritized_estimates(prioritize_estimates_mode, include_subgeography_estimates, version):
+    '''Gets the prioritized estimates stored by the ETL run that produced the current records
+    :param version: created_at of the records the prioritized estimates must have been computed from
+    :returns the prioritized records as a list of dicts, or None if they have not been stored for that version
+    '''
+    if version is None:
+        return None
+    with db_session() as session:
+        rows = session.query(PrioritizedEstimate.record) \
+            .filter(PrioritizedEstimate.prioritize_estimates_mode == prioritize_estimates_mode,
+                    PrioritizedEstimate.include_subgeography_estimates.is_(include_subgeography_estimates),
+                    PrioritizedEstimate.created_at == version) \
+            .order_by(PrioritizedEstimate.position).all()
+    if not rows:
+        return None
+
+    # Dates are stored as ISO strings, convert them back so date ranges can be filtered
+    records = []
+    for (record,) in rows:
+        for field in DATE_FIELDS:
+            if record.get(field) is not None:
+                record[field] = datetime.fromisoformat(record[field])
+        records.append(record)
+    return records
+
+
+def _get_prioritized_facet_index(variant, include_subgeography_estimates, prioritize_estimates_mode,
+                                 snapshot=None) -> FacetIndex:
+    # Prioritized estimates only depend on the records of the current ETL run, so use the ones stored by the ETL
+    # when possible and otherwise compute them once per snapshot
+    def build(version, get_records):
+        records = None
+        if variant == MATERIALIZED_VARIANT:
+            records = get_materialized_prioritized_estimates(prioritize_estimates_mode,
+                                                             include_subgeography_estimates, version)
+        if records is None:
+            records = get_records()
+            with timed_stage('prioritize_estimates') as stage:
+                records = prioritize_records(list(records), include_subgeography_estimates,
+                                             prioritize_estimates_mode)
+                stage.rows = len(records)
+        return FacetIndex(records)
+
+    if snapshot is None:
+        if not app.config.get('RECORD_SNAPSHOT_ENABLED', False):
+            return build(get_records_version(), lambda: get_all_records(*variant))
+        snapshot = get_records_snapshot(*variant)
+    # Snapshots that are not cached don't have a version
+    return snapshot.get_derived(('prioritized_facet_index', include_subgeography_estimates, prioritize_estimates_mode),
+                                lambda s: build(s.version if s.version is not None else get_records_version(),
+                                                lambda: s.records))
 
-        # Filter the sampling end date or publication date by start and/or end date bounds
-        if start_date is not None:
-            status = status and record_end_date and record_end_date >= start_date
-        if end_date is not None:
-            status = status and record_end_date and record_end_date <= end_date
-        return status
 
-    result = list(filter(lambda x: date_filter(x, start_date=sampling_start_date,
-                                               end_date=sampling_end_date, use_sampling_date=True), result))
-    result = list(filter(lambda x: date_filter(x, start_date=publication_start_date,
-                                               end_date=publication_end_date, use_sampling_date=False), result))
+def get_filtered_records(research_fields=False, filters=None, columns=None, include_disputed_regions=False,
+                         sampling_start_date=None, sampling_end_date=None, include_subgeography_estimates=False,
+                         publication_start_date=None, publication_end_date=None, estimates_subgroup='all',
+                         prioritize_estimates_mode='dashboard', include_in_srma=False, unity_aligned_only=False,
+                         include_records_without_latlngs=False, snapshots=None):
+    with timed_stage('filter_records') as stage:
+        records = list(iter_filtered_records(research_fields, filters, columns, include_disputed_regions,
+                                             sampling_start_date, sampling_end_date, include_subgeography_estimates,
+                                             publication_start_date, publication_end_date, estimates_subgroup,
+                                             prioritize_estimates_mode, include_in_srma, unity_aligned_only,
+                                             include_records_without_latlngs, snapshots))
+        stage.rows = len(records)
+    return records
+
+
+def iter_filtered_records(research_fields=False, filters=None, columns=None, include_disputed_regions=False,
+                          sampling_start_date=None, sampling_end_date=None, include_subgeography_estimates=False,
+                          publication_start_date=None, publication_end_date=None, estimates_subgroup='all',
+                          prioritize_estimates_mode='dashboard', include_in_srma=False, unity_aligned_only=False,
+                          include_records_without_latlngs=False, snapshots=None):
+    '''Generator version of get_filtered_records that formats each record as it is consumed,
+    so the records can be serialized as they are produced
+    :param snapshots: BatchRecordSnapshots to read the records from, e.g. to share them between the requests of a batch
+    :returns a generator of record dicts
+    '''
+    # Need to check if 'research_fields' is applied
+    # because the include_in_srma field is in the ResearchSource table
+    include_in_srma = bool(include_in_srma and research_fields)
+    record_filters = {
+        'filters': filters,
+        'sampling_start_date': sampling_start_date,
+        'sampling_end_date': sampling_end_date,
+        'publication_start_date': publication_start_date,
+        'publication_end_date': publication_end_date,
+        'include_in_srma': include_in_srma
+    }
+    variant = (research_fields, include_disputed_regions, unity_aligned_only, include_records_without_latlngs)
+
+    # Prioritized estimates and cached records are filtered with their facet index
+    if estimates_subgroup == 'prioritize_estimates' or snapshots is not None or \
+            app.config.get('RECORD_SNAPSHOT_ENABLED', False):
+        facet_index, mask = _get_filtered_facet_index(variant, record_filters, estimates_subgroup,
+                                                      include_subgeography_estimates, prioritize_estimates_mode,
+                                                      snapshots=snapshots)
+        result = facet_index.gather(mask)
+
+    # Without a snapshot, postgres applies the filters and only returns the requested columns of matching records
+    else:
+        result = iter_all_records(*variant, **record_filters, columns=set(columns) if columns else None,
+                                  primary_estimates_only=estimates_subgroup == 'primary_estimates')
 
     # Format dates after date filter has been applied
+    # and, if columns have been supplied, only return those columns
     for record in result:
-        isoformat_fields = \
-            ['sampling_end_date', 'sampling_start_date', 'publication_date', 'date_created', 'last_modified_time']
-        for field in isoformat_fields:
-            if record.get(field, None) is not None:
-                record[field] = record[field].isoformat()
+        yield _format_record(record, columns)
 
-    # Need to check if 'research_fields' is applied
-    # because the include_in_srma field is in the ResearchSource table
-    if include_in_srma and research_fields:
-        result = [estimate for estimate in result if estimate['include_in_srma']]
 
-    # Finally, if columns have been supplied, only return those columns
-    if columns is not None and len(columns) > 0:
-        filter_columns(result, columns)
+def _get_filtered_facet_index(variant, record_filters, estimates_subgroup, include_subgeography_estimates,
+                              prioritize_estimates_mode, columns=None, snapshots=None):
+    # Returns the facet index of the records of the estimates subgroup and the mask of the records matching the filters
+    # If snapshots are supplied, the records are read from the snapshot of the variant they hold
+    snapshot = snapshots.get(*variant) if snapshots is not None else None
 
-    return result
+    # If estimates_subgroup is 'estimate_prioritization', perform estimate prioritization
+    # Prioritization needs every estimate of a study, so filters are applied to the prioritized records afterwards
+    if estimates_subgroup == 'prioritize_estimates':
+        facet_index = _get_prioritized_facet_index(tuple(bool(flag) for flag in variant),
+                                                   bool(include_subgeography_estimates), prioritize_estimates_mode,
+                                                   snapshot)
+        return facet_index, facet_index.get_mask(**record_filters)
+
+    # Otherwise, evaluate filters against the facet index of the cached records,
+    # which is built once per snapshot and shared between requests
+    if snapshot is not None or app.config.get('RECORD_SNAPSHOT_ENABLED', False):
+        snapshot = snapshot or get_records_snapshot(*variant)
+        facet_index = snapshot.get_derived('facet_index', lambda s: FacetIndex(s.records))
+        # If estimates_subgroup is 'primary_estimates', just return the primary estimate for each study
+        # Otherwise, estimates_subgroup = 'all' so just return all estimates
+        return facet_index, facet_index.get_mask(primary_estimates_only=estimates_subgroup == 'primary_estimates',
+                                                 **record_filters)
+
+    # Without a snapshot, postgres applies the filters so every record of the index matches
+    facet_index = FacetIndex(get_all_records(*variant, **record_filters, columns=columns,
+                                             primary_estimates_only=estimates_subgroup == 'primary_estimates'))
+    return facet_index, facet_index.all_records_mask
+
+
+def get_filtered_records_page(research_fields=False, filters=None, columns=None, include_disputed_regions=False,
+                              sampling_start_date=None, sampling_end_date=None, include_subgeography_estimates=False,
+                              publication_start_date=None, publication_end_date=None, estimates_subgroup='all',
+                              prioritize_estimates_mode='dashboard', include_in_srma=False, unity_aligned_only=False,
+                              include_records_without_latlngs=False, sorting_key='sampling_end_date', reverse=False,
+                              per_page=5, cursor=None):
+    '''Same as get_filtered_records, but only returns the page of records after the cursor
+    :param sorting_key: key by which records are sorted, one of cursor_pagination.SORTING_KEYS
+    :param reverse: whether to sort in reverse order or not
+    :param per_page: number of records per page
+    :param cursor: next_cursor returned with the previous page, or None for the first page
+    :returns a tuple of (records of the page, cursor for the next page or None if this is the last page)
+    :raises ValueError if the cursor is invalid
+    '''
+    include_in_srma = bool(include_in_srma and research_fields)
+    record_filters = {
+        'filters': filters,
+        'sampling_start_date': sampling_start_date,
+        'sampling_end_date': sampling_end_date,
+        'publication_start_date': publication_start_date,
+        'publication_end_date': publication_end_date,
+        'include_in_srma': include_in_srma
+    }
+    variant = (research_fields, include_disputed_regions, unity_aligned_only, include_records_without_latlngs)
+    # Records are sorted before being paginated, so we will need the sorting column
+    facet_index, mask = _get_filtered_facet_index(variant, record_filters, estimates_subgroup,
+                                                  include_subgeography_estimates, prioritize_estimates_mode,
+                                                  columns=set(columns).union({sorting_key}) if columns else None)
+    records, next_cursor = get_cursor_page(facet_index, mask, sorting_key, reverse, per_page, cursor)
+    return [_format_record(record, columns) for record in records], next_cursor
+
+
+def get_filtered_records_json(research_fields=False, filters=None, columns=None, include_disputed_regions=False,
+                              sampling_start_date=None, sampling_end_date=None, publication_start_date=None,
+                              publication_end_date=None, estimates_subgroup='all', include_in_srma=False,
+                              unity_aligned_only=False, include_records_without_latlngs=False, output_columns=None,
+                              jitter_pins=False, get_extra_json=None) -> str:
+    '''Same records as get_filtered_records (except for prioritized estimates, which are computed in python),
+    but postgres writes the JSON body itself so no python objects are created for the records
+    :param columns: columns to query, e.g. the output columns and the columns needed by get_extra_json
+    :param output_columns: columns written for each record, defaults to the queried columns
+    :param jitter_pins: whether to spread out pins that share a location, like pin_jitter.jitter_records
+    :param get_extra_json: called with the (jittered) records CTE, returns a dict of extra keys of the body
+    mapped to scalar subqueries that build their JSON value
+    :returns the JSON text {"records": [...], <extra keys>}, with the records ordered by source_id
+    '''
+    with db_session() as session:
+        records = _get_all_records_query(session, research_fields, include_disputed_regions, unity_aligned_only,
+                                         include_records_without_latlngs, filters=filters,
+                                         sampling_start_date=sampling_start_date,
+                                         sampling_end_date=sampling_end_date,
+                                         publication_start_date=publication_start_date,
+                                         publication_end_date=publication_end_date,
+                                         include_in_srma=bool(include_in_srma and research_fields),
+                                         columns=set(columns) if columns else None,
+                                         primary_estimates_only=estimates_subgroup == 'primary_estimates') \
+            .subquery('filtered_records')
+
+        # Records are ordered by source_id so that the first pin at each location is the same as in python
+        record_columns = {column.name: column for column in records.c}
+        if jitter_pins and 'pin_latitude' in record_columns and 'pin_longitude' in record_columns:
+            latitude, longitude = get_jittered_pins_sql(records.c.pin_latitude, records.c.pin_longitude,
+                                                        records.c.source_id, order_by=records.c.source_id)
+            record_columns['pin_latitude'] = latitude.label('pin_latitude')
+            record_columns['pin_longitude'] = longitude.label('pin_longitude')
+        records_cte = select(*record_columns.values()).cte('records')
+
+        # Project each record onto the output columns in a lateral subquery, and aggregate the projected rows
+        # Postgres writes timestamps in isoformat like _format_record, other timestamps are written like jsonify would
+        def get_output_column(col):
+            if col not in records_cte.c:
+                return null().label(col)
+            column = records_cte.c[col]
+            if col not in DATE_FIELDS and isinstance(column.type, DateTime):
+                return get_http_date_sql(column).label(col)
+            return column
+
+        # Columns are written in sorted order, like the app's JSON provider writes them
+        output_columns = sorted(output_columns or record_columns)
+        record = select(*[get_output_column(col) for col in output_columns]).correlate(records_cte) \
+            .lateral('record_row')
+        records_json = select(func.coalesce(func.json_agg(aggregate_order_by(literal_column('record_row'),
+                                                                             records_cte.c.source_id)),
+                                            literal_column("'[]'::json"))) \
+            .select_from(records_cte.join(record, true())).scalar_subquery()
+
+        body = {'records': records_json, **(get_extra_json(records_cte) if get_extra_json else {})}
+        body_json = func.json_build_object(*[element for key, value in body.items() for element in (key, value)])
+        # Read the body as text, otherwise the driver would parse it
+        return session.execute(select(cast(body_json, Text))).scalar()
 
 
 def filter_columns(records, cols_to_include):
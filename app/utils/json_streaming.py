@@ -0,0 +1,48 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from flask import current_app as app
+from sqlalchemy import func, Date, DateTime
+
+
+def stream_records_json(records: Iterable[Dict[str, Any]],
+                        get_trailer: Optional[Callable[[], Dict[str, Any]]] = None,
+                        records_per_chunk: int = 100) -> Iterator[str]:
+    '''Writes {"records": [...], <trailer keys>} one chunk of records at a time
+    :param records: iterable of record dicts, consumed lazily
+    :param get_trailer: called once all records have been written, returns extra keys to add after the records
+    :param records_per_chunk: number of records serialized into each chunk that is yielded
+    :returns a generator of JSON text chunks, meant to be wrapped in stream_with_context
+    '''
+    # Use the app's JSON provider so that values are serialized exactly like jsonify would
+    dumps = app.json.dumps
+    yield '{"records": ['
+    chunk = []
+    separator = ''
+    for record in records:
+        chunk.append(dumps(record))
+        if len(chunk) >= records_per_chunk:
+            yield separator + ', '.join(chunk)
+            separator = ', '
+            chunk = []
+    if chunk:
+        yield separator + ', '.join(chunk)
+    yield ']'
+
+    if get_trailer is not None:
+        for key, value in get_trailer().items():
+            yield f', {dumps(key)}: {dumps(value)}'
+    yield '}\n'
+
+
+def get_http_date_sql(column):
+    '''Formats a date or timestamp column in SQL the way the app's JSON provider writes dates, e.g.
+    "Fri, 01 May 2020 00:00:00 GMT", for JSON built by postgres
+    :param column: Date, DateTime or timezone aware DateTime column
+    :returns a text expression, null where the column is null
+    '''
+    # Naive timestamps are treated as UTC like they are in python, timezone aware ones are converted to UTC
+    if isinstance(column.type, DateTime) and column.type.timezone:
+        column = func.timezone('UTC', column)
+    elif isinstance(column.type, Date):
+        return func.to_char(column, 'Dy, DD Mon YYYY "00:00:00 GMT"')
+    return func.to_char(column, 'Dy, DD Mon YYYY HH24:MI:SS "GMT"')
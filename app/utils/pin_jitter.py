@@ -0,0 +1,89 @@
+import hashlib
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, cast, func, literal, BigInteger, Float, String
+from sqlalchemy.dialects.postgresql import BIT
+
+# Pins are moved by up to this many degrees in each direction
+# For reference: 0.1 degrees is approx 11km at the equator
+MAX_PIN_JITTER = 0.5
+
+
+@lru_cache(maxsize=2 ** 17)
+def get_pin_offset(source_id: str) -> Tuple[float, float]:
+    '''Derives the offset of a pin from its source_id, so a record is always jittered the same way
+    :returns a tuple of (latitude offset, longitude offset), each in [-MAX_PIN_JITTER, MAX_PIN_JITTER]
+    '''
+    # The first 8 hex digits of the md5 give the latitude offset and the next 8 the longitude offset
+    digest = hashlib.md5(source_id.encode('utf-8')).hexdigest()
+    lat_fraction = int(digest[0:8], 16) / 0xFFFFFFFF
+    lng_fraction = int(digest[8:16], 16) / 0xFFFFFFFF
+    return (2 * lat_fraction - 1) * MAX_PIN_JITTER, (2 * lng_fraction - 1) * MAX_PIN_JITTER
+
+
+def get_jittered_pins(latitudes: Sequence[Any], longitudes: Sequence[Any],
+                      source_ids: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    '''Spreads out pins that share a location. The first pin at a location is left where it is,
+    and every other pin at that location is moved by the offset of its source_id
+    :param latitudes: pin latitude of each record, None if the record has no pin
+    :param longitudes: pin longitude of each record, None if the record has no pin
+    :param source_ids: source_id of each record
+    :returns a tuple of (latitudes, longitudes) float arrays, with NaN for records without a pin
+    '''
+    pins = pd.DataFrame({'lat': pd.to_numeric(pd.Series(latitudes, dtype=object)),
+                         'lng': pd.to_numeric(pd.Series(longitudes, dtype=object))})
+    # Records with a missing (or 0) latitude or longitude are never jittered
+    has_pin = pins['lat'].notna() & pins['lng'].notna() & (pins['lat'] != 0) & (pins['lng'] != 0)
+    is_duplicate = (pins[has_pin].duplicated(['lat', 'lng'])).reindex(pins.index, fill_value=False).to_numpy()
+
+    lat_offsets = np.zeros(len(pins))
+    lng_offsets = np.zeros(len(pins))
+    duplicate_positions = np.flatnonzero(is_duplicate)
+    if len(duplicate_positions) > 0:
+        offsets = np.array([get_pin_offset(str(source_ids[position])) for position in duplicate_positions])
+        lat_offsets[duplicate_positions] = offsets[:, 0]
+        lng_offsets[duplicate_positions] = offsets[:, 1]
+    return pins['lat'].to_numpy(dtype=float) + lat_offsets, pins['lng'].to_numpy(dtype=float) + lng_offsets
+
+
+def jitter_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    '''Applies get_jittered_pins to the pin_latitude and pin_longitude of the records, in place
+    :returns the records
+    '''
+    if not records:
+        return records
+    latitudes, longitudes = get_jittered_pins([record['pin_latitude'] for record in records],
+                                              [record['pin_longitude'] for record in records],
+                                              [record.get('source_id') for record in records])
+    for record, latitude, longitude in zip(records, latitudes.tolist(), longitudes.tolist()):
+        if record['pin_latitude'] and record['pin_longitude']:
+            record['pin_latitude'] = latitude
+            record['pin_longitude'] = longitude
+    return records
+
+
+def _get_pin_offset_sql(source_id_text, first_hex_digit: int):
+    # Same as get_pin_offset: the 8 hex digits of the md5 starting at first_hex_digit (1-indexed),
+    # read as an unsigned 32 bit integer and mapped into [-MAX_PIN_JITTER, MAX_PIN_JITTER] with float8 arithmetic
+    hex_digits = literal('x', String) + func.substr(func.md5(source_id_text), first_hex_digit, 8)
+    fraction = cast(cast(cast(hex_digits, BIT(32)), BigInteger), Float) / cast(literal(float(0xFFFFFFFF)), Float)
+    return (2 * fraction - 1) * MAX_PIN_JITTER
+
+
+def get_jittered_pins_sql(latitude, longitude, source_id, order_by):
+    '''Same as get_jittered_pins, as SQL expressions to select from the records
+    :param latitude: pin latitude column
+    :param longitude: pin longitude column
+    :param source_id: source id column
+    :param order_by: order of the records, the first pin at a location in this order is left where it is
+    :returns a tuple of (latitude, longitude) expressions
+    '''
+    source_id_text = cast(source_id, String)
+    has_pin = and_(latitude.isnot(None), longitude.isnot(None), latitude != 0, longitude != 0)
+    position_at_location = func.row_number().over(partition_by=[latitude, longitude], order_by=order_by)
+    is_duplicate = and_(has_pin, position_at_location > 1)
+    return case((is_duplicate, latitude + _get_pin_offset_sql(source_id_text, 1)), else_=latitude), \
+        case((is_duplicate, longitude + _get_pin_offset_sql(source_id_text, 9)), else_=longitude)
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Any, Dict, Hashable, Iterable, List
+
+
+def get_study_keys(studies: Dict[Hashable, List[Dict[str, Any]]]) -> Dict[Hashable, bytes]:
+    '''Digest of the estimates of each study, which identifies its prioritized estimates.
+    Every field is included rather than just source_id and last_modified_time, since the ETL also derives fields
+    (e.g. cases_per_hundred or pin coordinates) without modifying the estimates they belong to
+    :param studies: estimates of each study, which all have the same columns in the same order
+    '''
+    # The reprs of the values tell apart values that compare equal but are serialized differently, e.g. 1 and 1.0
+    return {study: blake2b(repr([tuple(record.values()) for record in records]).encode(), digest_size=16).digest()
+            for study, records in studies.items()}
+
+
+class PrioritizedStudyCache:
+    '''Least recently used cache of the prioritized estimates of each study, keyed by the contents of the study's
+    estimates and how they were prioritized. Studies whose estimates haven't changed, e.g. since the previous ETL run,
+    aren't prioritized again'''
+
+    def __init__(self, max_studies: int = 20000):
+        self.max_studies = max_studies
+        self._studies: 'OrderedDict[Hashable, List[Dict[str, Any]]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, List[Dict[str, Any]]]:
+        # Returns the prioritized estimates of the studies that are cached
+        found = {}
+        with self._lock:
+            for key in keys:
+                estimates = self._studies.get(key)
+                if estimates is None:
+                    self.misses += 1
+                    continue
+                self._studies.move_to_end(key)
+                found[key] = estimates
+                self.hits += 1
+        return found
+
+    def put_many(self, studies: Dict[Hashable, List[Dict[str, Any]]]) -> None:
+        with self._lock:
+            for key, estimates in studies.items():
+                self._studies[key] = estimates
+                self._studies.move_to_end(key)
+            while len(self._studies) > self.max_studies:
+                self._studies.popitem(last=False)
+                self.evictions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'studies': len(self._studies),
+                'max_studies': self.max_studies,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._studies.clear()
+            self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,24 @@
+from flask import Flask, g, request
+
+from Pathogens.Utility.database_utils import profile_statements
+
+
+def init_query_profiling(flask_app: Flask) -> None:
+    '''Registers the hooks that profile the statements of each request when QUERY_PROFILING_ENABLED is set.
+    A summary of the statements of the request, and any statement shape that ran often enough to be a likely
+    N+1 query, is logged when the request ends'''
+
+    @flask_app.before_request
+    def start_query_profile():
+        if flask_app.config.get('QUERY_PROFILING_ENABLED', False):
+            endpoint = f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+            g.query_profile_context = profile_statements(endpoint)
+            g.query_profile = g.query_profile_context.__enter__()
+
+    @flask_app.teardown_request
+    def end_query_profile(exception=None):
+        # Runs after streamed responses have been sent, so their statements are included
+        query_profile_context = g.pop('query_profile_context', None)
+        if query_profile_context is not None:
+            g.pop('query_profile')
+            query_profile_context.__exit__(None, None, None)
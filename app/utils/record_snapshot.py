@@ -0,0 +1,125 @@
+import logging
+import threading
+from datetime import datetime
+from time import monotonic
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from flask import current_app as app
+from sqlalchemy import func
+
+from app.serotracker_sqlalchemy import db_session, DashboardSource
+
+logger = logging.getLogger(__name__)
+
+# (research_fields, include_disputed_regions, unity_aligned_only, include_records_without_latlngs)
+SnapshotVariant = Tuple[bool, bool, bool, bool]
+
+
+class RecordSnapshot:
+    '''Joined records for one ETL run and one variant of get_all_records.
+    Snapshots are shared between requests, so the records must never be mutated by callers.'''
+
+    def __init__(self, version: Optional[datetime], records: Sequence[Dict[str, Any]]):
+        self.version = version
+        self.records = records
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def get_derived(self, key: Any, builder: Callable[['RecordSnapshot'], Any]) -> Any:
+        # Memoize structures computed from the records (indexes, sort orders, etc.) so they are built once per snapshot
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        with self._derived_lock:
+            if key not in self._derived:
+                self._derived[key] = builder(self)
+            return self._derived[key]
+
+
+_version_lock = threading.Lock()
+_last_version_check = {'checked_at': None, 'version': None}
+
+
+def get_records_version() -> Optional[datetime]:
+    # Each ETL run stamps every dashboard_source row with the same created_at and only drops the previous run's rows
+    # after loading its own, so the min created_at identifies the complete data currently in the database
+    check_interval = app.config.get('RECORD_SNAPSHOT_VERSION_CHECK_INTERVAL', 0)
+    checked_at = _last_version_check['checked_at']
+    if checked_at is not None and monotonic() - checked_at < check_interval:
+        return _last_version_check['version']
+
+    with db_session() as session:
+        version = session.query(func.min(DashboardSource.created_at)).scalar()
+    with _version_lock:
+        _last_version_check['checked_at'] = monotonic()
+        _last_version_check['version'] = version
+    return version
+
+
+class RecordSnapshotCache:
+    '''Holds one RecordSnapshot per variant. A snapshot is built synchronously the first time a variant is requested.
+    After that, a new ETL version is rebuilt in a background thread while readers keep getting the previous snapshot,
+    and the new snapshot is swapped in with a single assignment once it is ready.
+    If mapped_loader is given, it is tried first with the variant and version, e.g. to map the records published by
+    the ETL, and loader is only called with the variant if it returns None.'''
+
+    def __init__(self, loader: Callable[..., Sequence[Dict[str, Any]]],
+                 mapped_loader: Optional[Callable[[SnapshotVariant, Optional[datetime]],
+                                                  Optional[Sequence[Dict[str, Any]]]]] = None):
+        self._loader = loader
+        self._mapped_loader = mapped_loader
+        self._snapshots: Dict[SnapshotVariant, RecordSnapshot] = {}
+        self._rebuilding = set()
+        self._lock = threading.Lock()
+        self._variant_locks: Dict[SnapshotVariant, threading.Lock] = {}
+
+    def _build(self, variant: SnapshotVariant, version: Optional[datetime]) -> RecordSnapshot:
+        records = self._mapped_loader(variant, version) if self._mapped_loader is not None else None
+        if records is None:
+            records = self._loader(*variant)
+        snapshot = RecordSnapshot(version, records)
+        self._snapshots[variant] = snapshot
+        logger.info(f'Built record snapshot {variant} for version {version} with {len(snapshot)} records')
+        return snapshot
+
+    def _rebuild_in_background(self, variant: SnapshotVariant, version: Optional[datetime]) -> None:
+        with self._lock:
+            if variant in self._rebuilding:
+                return
+            self._rebuilding.add(variant)
+        flask_app = app._get_current_object()
+
+        def rebuild():
+            try:
+                with flask_app.app_context():
+                    self._build(variant, version)
+            except Exception as e:
+                logger.error(f'Failed to rebuild record snapshot {variant}: {e}')
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(variant)
+
+        threading.Thread(target=rebuild, daemon=True).start()
+
+    def get(self, variant: SnapshotVariant, version: Optional[datetime]) -> RecordSnapshot:
+        snapshot = self._snapshots.get(variant)
+        if snapshot is not None:
+            if snapshot.version != version:
+                self._rebuild_in_background(variant, version)
+            return snapshot
+
+        # Nothing to serve yet, so build it now (only once if several requests arrive together)
+        with self._lock:
+            variant_lock = self._variant_locks.setdefault(variant, threading.Lock())
+        with variant_lock:
+            snapshot = self._snapshots.get(variant)
+            if snapshot is None:
+                snapshot = self._build(variant, version)
+        return snapshot
+
+    def clear(self) -> None:
+        self._snapshots = {}
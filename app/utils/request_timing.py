@@ -0,0 +1,161 @@
+import json
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Dict, Iterator, List, Optional
+
+from flask import Flask, g, has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in ms) of the buckets of the timing histograms, longer durations go in a last, unbounded bucket
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class StageTiming:
+    '''Duration of a stage of a request, e.g. the SQL query or estimate prioritization,
+    and the number of rows it produced if the stage sets it'''
+    __slots__ = ('name', 'duration_ms', 'rows', 'nested_ms')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.duration_ms = 0.0
+        self.rows: Optional[int] = None
+        # Time spent in stages nested in this one, which is not counted in its duration
+        self.nested_ms = 0.0
+
+
+class TimingHistogram:
+    '''Counts of the durations of a stage in each bucket of HISTOGRAM_BUCKETS_MS'''
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms: float) -> None:
+        self.bucket_counts[bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        bucket_names = [f'le_{bound}ms' for bound in HISTOGRAM_BUCKETS_MS] + ['inf']
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'buckets': dict(zip(bucket_names, self.bucket_counts))
+        }
+
+
+# Histograms of the durations of each stage (and of the whole request, as 'total') per endpoint, for this process
+_histograms: Dict[str, Dict[str, TimingHistogram]] = {}
+_histograms_lock = threading.Lock()
+
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[StageTiming]:
+    '''Times the code in the with block as a stage of the current request, if request timing is enabled.
+    The duration of a stage excludes the stages nested in it, so the stages of a request never add up to more
+    than its total. Set rows on the yielded StageTiming to report the number of rows the stage produced
+    :param name: name of the stage in the Server-Timing header, stages with the same name are added up
+    '''
+    stage = StageTiming(name)
+    timings = g.get('stage_timings') if has_request_context() else None
+    if timings is None:
+        yield stage
+        return
+    open_stages = g.open_stages
+    open_stages.append(stage)
+    start = perf_counter()
+    try:
+        yield stage
+    finally:
+        elapsed_ms = (perf_counter() - start) * 1000
+        open_stages.pop()
+        if open_stages:
+            open_stages[-1].nested_ms += elapsed_ms
+        stage.duration_ms = elapsed_ms - stage.nested_ms
+        timings.append(stage)
+
+
+def _merge_stage_timings(timings: List[StageTiming]) -> Dict[str, StageTiming]:
+    # Stages that ran several times in a request (e.g. once per sub-request of a batch) are reported once
+    merged = {}
+    for timing in timings:
+        stage = merged.setdefault(timing.name, StageTiming(timing.name))
+        stage.duration_ms += timing.duration_ms
+        if timing.rows is not None:
+            stage.rows = (stage.rows or 0) + timing.rows
+    return merged
+
+
+def _get_server_timing_header(stages: Dict[str, StageTiming], total_ms: float) -> str:
+    metrics = []
+    for stage in stages.values():
+        metric = f'{stage.name};dur={stage.duration_ms:.1f}'
+        if stage.rows is not None:
+            metric += f';desc="rows={stage.rows}"'
+        metrics.append(metric)
+    metrics.append(f'total;dur={total_ms:.1f}')
+    return ', '.join(metrics)
+
+
+def _add_to_histograms(endpoint: str, stages: Dict[str, StageTiming], total_ms: float) -> None:
+    with _histograms_lock:
+        endpoint_histograms = _histograms.setdefault(endpoint, {})
+        for stage in stages.values():
+            endpoint_histograms.setdefault(stage.name, TimingHistogram()).add(stage.duration_ms)
+        endpoint_histograms.setdefault('total', TimingHistogram()).add(total_ms)
+
+
+def get_timing_histograms() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    # Summarize the timing histograms of every endpoint that was requested since this process started
+    with _histograms_lock:
+        return {endpoint: {stage: histogram.to_dict() for stage, histogram in endpoint_histograms.items()}
+                for endpoint, endpoint_histograms in _histograms.items()}
+
+
+def clear_timing_histograms() -> None:
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def init_request_timing(flask_app: Flask) -> None:
+    '''Registers the hooks that time the stages of each request when REQUEST_TIMING_ENABLED is set.
+    The durations are returned in a Server-Timing header, logged and added to the histograms of the endpoint.
+    Streamed responses only include the stages that ran before their body started to be sent'''
+
+    @flask_app.before_request
+    def start_request_timing():
+        if flask_app.config.get('REQUEST_TIMING_ENABLED', False):
+            g.stage_timings = []
+            g.open_stages = []
+            g.request_start_time = perf_counter()
+
+    @flask_app.after_request
+    def add_server_timing_header(response):
+        timings = g.pop('stage_timings', None)
+        if timings is None:
+            return response
+        g.pop('open_stages')
+        total_ms = (perf_counter() - g.pop('request_start_time')) * 1000
+        stages = _merge_stage_timings(timings)
+        response.headers['Server-Timing'] = _get_server_timing_header(stages, total_ms)
+
+        # Group requests by route rather than path, so e.g. every /record_details/<source_id> shares a histogram
+        endpoint = f'{request.method} {request.url_rule.rule if request.url_rule else request.path}'
+        _add_to_histograms(endpoint, stages, total_ms)
+        timing_fields = {
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 3),
+            'stages': {name: {'duration_ms': round(stage.duration_ms, 3), 'rows': stage.rows}
+                       for name, stage in stages.items()}
+        }
+        logger.info(f'Request timing: {json.dumps(timing_fields)}', extra={'request_timing': timing_fields})
+        return response
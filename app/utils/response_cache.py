@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from flask import current_app as app, request, Response
+
+from app.utils.request_timing import timed_stage
+
+# brotli is optional, responses are only precompressed with gzip if it isn't installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPayload:
+    '''JSON body of a response for one data version, along with its precompressed variants and their ETags'''
+
+    def __init__(self, version: Hashable, body: bytes, mimetype: str):
+        self.version = version
+        self.mimetype = mimetype
+        self.bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body)
+
+        # Strong ETags identify the exact bytes sent, so each encoding gets its own
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {encoding: digest if encoding == 'identity' else f'{digest}-{encoding}'
+                      for encoding in self.bodies}
+
+
+class ResponseCache:
+    '''Least recently used cache of CachedPayloads. An entry is rebuilt when the version of the data it was built from
+    changes, e.g. after an ETL run'''
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._payloads: 'OrderedDict[Hashable, CachedPayload]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+
+    def get(self, key: Hashable, version: Hashable,
+            build_payload: Callable[[], Any]) -> CachedPayload:
+        with self._lock:
+            cached_payload = self._payloads.get(key)
+            if cached_payload is not None and cached_payload.version == version:
+                self._payloads.move_to_end(key)
+                return cached_payload
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Only build the payload once if several requests for the same key arrive together
+        with key_lock:
+            cached_payload = self._payloads.get(key)
+            if cached_payload is None or cached_payload.version != version:
+                payload = build_payload()
+                with timed_stage('jsonify'):
+                    response = app.json.response(payload)
+                cached_payload = CachedPayload(version, response.get_data(), response.mimetype)
+                logger.info(f'Cached response {key} for version {version} ({len(cached_payload.bodies["identity"])} bytes)')
+            with self._lock:
+                self._payloads[key] = cached_payload
+                self._payloads.move_to_end(key)
+                while len(self._payloads) > self.max_entries:
+                    evicted_key, _ = self._payloads.popitem(last=False)
+                    self._key_locks.pop(evicted_key, None)
+        return cached_payload
+
+    def clear(self) -> None:
+        with self._lock:
+            self._payloads.clear()
+            self._key_locks.clear()
+
+
+_response_cache = ResponseCache()
+
+
+def init_response_cache(flask_app) -> None:
+    '''Sizes the response cache from RESPONSE_CACHE_MAX_ENTRIES'''
+    _response_cache.max_entries = flask_app.config.get('RESPONSE_CACHE_MAX_ENTRIES', _response_cache.max_entries)
+
+
+def _choose_encoding(cached_payload: CachedPayload) -> str:
+    # Prefer brotli, then gzip, based on the encodings the client accepts
+    accept_encodings = request.accept_encodings
+    for encoding in ['br', 'gzip']:
+        if encoding in cached_payload.bodies and accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+
+def make_cached_response(key: Hashable, version: Optional[Hashable], build_payload: Callable[[], Any]) -> Response:
+    '''Serves a JSON payload that only changes when the data it is built from changes
+    :param key: identifies the payload, e.g. the endpoint and its arguments
+    :param version: version of the data the payload is built from (the payload is rebuilt when it changes)
+    :param build_payload: builds the jsonify-able payload
+    :returns a 304 response if the client already has the payload, otherwise the payload
+    compressed with the best encoding the client accepts
+    '''
+    if not app.config.get('RESPONSE_CACHE_ENABLED', False) or version is None:
+        return app.json.response(build_payload())
+
+    cached_payload = _response_cache.get(key, version, build_payload)
+    encoding = _choose_encoding(cached_payload)
+    etag = cached_payload.etags[encoding]
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(cached_payload.bodies[encoding], mimetype=cached_payload.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    # Clients may keep the response but must check that it is still current before using it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def clear_response_cache() -> None:
+    _response_cache.clear()
@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from uuid import UUID
+
+import numpy as np
+
+from app.utils.columnar_export import records_to_arrow_table
+
+# pyarrow is optional, records are always read from the database if it isn't installed
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# Key of the schema metadata listing the columns whose values are UUIDs
+UUID_COLUMNS_METADATA_KEY = b'uuid_columns'
+
+
+def get_snapshot_file_path(directory: str, variant: tuple, version: datetime) -> str:
+    '''Path of the snapshot file of a variant of get_all_records, for the ETL run identified by version
+    :returns e.g. <directory>/records-0000-20230101T000000000000.arrow
+    '''
+    variant_name = ''.join('1' if flag else '0' for flag in variant)
+    return os.path.join(directory, f'records-{variant_name}-{version.strftime("%Y%m%dT%H%M%S%f")}.arrow')
+
+
+def write_snapshot_file(records: List[Dict[str, Any]], path: str) -> bool:
+    '''Writes records to an uncompressed Arrow IPC file, which readers can map without copying it.
+    The file is written next to path and renamed, so readers never see a partially written file
+    :returns whether the file was written
+    '''
+    if pa is None:
+        return False
+    table = records_to_arrow_table(records)
+    # UUIDs are stored as strings, so remember which columns to convert back
+    uuid_columns = [col for col in table.column_names
+                    if isinstance(next((record[col] for record in records if record.get(col) is not None), None),
+                                  UUID)]
+    table = table.replace_schema_metadata({UUID_COLUMNS_METADATA_KEY: json.dumps(uuid_columns).encode('utf-8')})
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with pa.OSFile(temp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temp_path, path)
+    return True
+
+
+def remove_old_snapshot_files(directory: str, variant: tuple, keep_path: str) -> None:
+    # Processes that still map a removed file keep reading it until they remap, since its pages are only freed then
+    variant_name = ''.join('1' if flag else '0' for flag in variant)
+    for file_name in os.listdir(directory):
+        path = os.path.join(directory, file_name)
+        if file_name.startswith(f'records-{variant_name}-') and path != keep_path:
+            os.remove(path)
+
+
+class MappedRecords(Sequence):
+    '''Read-only records backed by an Arrow table mapped from a snapshot file. The table's buffers are the pages of the
+    file, which the OS shares between every process that maps it, and records are only converted to dicts when they
+    are read, so they can't be mutated by callers'''
+
+    def __init__(self, table: 'pa.Table'):
+        self._table = table
+        metadata = table.schema.metadata or {}
+        self._uuid_columns = json.loads(metadata.get(UUID_COLUMNS_METADATA_KEY, b'[]'))
+
+    def _to_records(self, table: 'pa.Table') -> List[Dict[str, Any]]:
+        records = table.to_pylist()
+        for record in records:
+            for col in self._uuid_columns:
+                if record[col] is not None:
+                    record[col] = UUID(record[col])
+        return records
+
+    def __len__(self) -> int:
+        return self._table.num_rows
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self.take(range(*position.indices(len(self))))
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return self._to_records(self._table.slice(position, 1))[0]
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Convert the records a batch at a time, so only one batch of dicts is held at once
+        for batch in self._table.to_batches(max_chunksize=4096):
+            yield from self._to_records(pa.Table.from_batches([batch]))
+
+    def take(self, positions) -> List[Dict[str, Any]]:
+        # Converts the records at several positions at once, which is much faster than reading them one by one
+        positions = np.asarray(positions, dtype=np.int64)
+        if len(positions) == 0:
+            return []
+        return self._to_records(self._table.take(pa.array(positions)))
+
+
+def read_snapshot_file(path: str) -> Optional[MappedRecords]:
+    '''Maps a snapshot file written by write_snapshot_file
+    :returns the records of the file, or None if there is no such file
+    '''
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+    except (OSError, pa.ArrowInvalid) as e:
+        logger.error(f'Failed to map record snapshot file {path}: {e}')
+        return None
+    logger.info(f'Mapped record snapshot file {path} with {table.num_rows} records')
+    return MappedRecords(table)
@@ -0,0 +1,16 @@
+import pytest
+
+
+# Factory of synthetic estimates with every column estimate prioritization reads,
+# fields that aren't passed in default to an unadjusted local estimate
+@pytest.fixture
+def make_estimate():
+    def _make_estimate(study_name, **fields):
+        estimate = {'source_id': None, 'study_name': study_name, 'subgroup_var': 'Primary Estimate',
+                    'denominator_value': 100, 'serum_pos_prevalence': 0.1, 'adj_prevalence': None,
+                    'dashboard_primary_estimate': None, 'academic_primary_estimate': None, 'pop_adj': None,
+                    'test_adj': None, 'estimate_grade': 'Local', 'age': None, 'sex': None, 'isotypes_reported': ['IgG'],
+                    'isotype_comb': None, 'test_type': None, 'specimen_type': 'Serum'}
+        estimate.update(fields)
+        return estimate
+    return _make_estimate
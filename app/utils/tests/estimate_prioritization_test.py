@@ -1,5 +1,7 @@
 from app.utils.estimate_prioritization import get_prioritized_estimates
 import datetime
+import os
+import numpy as np
 import pandas as pd
 import json
 
@@ -358,37 +360,44 @@ def test_mock_estimates():
                                 IDENTIFIER = 0,
                                 test_name = 'DYNAMIC ADJUSTMENT')
 
-# Test with real estimates queried via our endpoint
+# Test with real estimates queried via our endpoint, pinning the estimates prioritized before estimate prioritization
+# was vectorized
 def test_real_estimates():
-    assert True
-    # # Load test estimates (from 6 studies conducted in Colombia)
-    # with open('test_estimates.json', 'r') as f:
-    #     sample_estimates = json.loads(f.read())
-    #
-    # sample_df = pd.DataFrame(sample_estimates)
-    #
-    # # Check that 6 estimates are produced
-    # assert get_prioritized_estimates(sample_df).shape[0] == 6
-    #
-    # # This study has one dashboard primary estimate
-    # # so estimate prioritization should return it
-    # est = sample_df[(sample_df['study_name'] == '201030_Colombia_UniversidadIndustrialdeSantander')
-    #                 & (sample_df['dashboard_primary_estimate'] == True)].to_dict('records')[0]
-    # estimate_prioritization_test(sample_df,
-    #                              (sample_df['study_name'] == '201030_Colombia_UniversidadIndustrialdeSantander'),
-    #                              mode='dashboard',
-    #                              **est)
-    #
-    # t = sample_df[(sample_df['study_name'] == '200918_Bogota_PontificiaUniversidadJaveriana')].to_dict('records')
-    # # Create set of estimates such that the whole set will be pooled
-    # bogota_study_df = sample_df[(sample_df['study_name'] == '200918_Bogota_PontificiaUniversidadJaveriana')
-    #                             & (sample_df['dashboard_primary_estimate'] != True)
-    #                             & (sample_df['academic_primary_estimate'] != True)
-    #                             & (sample_df['sex'] != 'All')]
-    # # Test pooling
-    # # Note, the study df has estimate with sex = 'Male' and sex = 'Female'
-    # # want to ensure that the combined df has "All"
-    # estimate_prioritization_test(bogota_study_df,
-    #                              mode='dashboard',
-    #                              denominator_value=bogota_study_df['denominator_value'].sum(),
-    #                              sex='All')
\ No newline at end of file
+    # Load test estimates (from 6 studies conducted in Colombia)
+    with open(os.path.join(os.path.dirname(__file__), 'test_estimates.json'), 'r') as f:
+        sample_df = pd.DataFrame(json.loads(f.read()))
+    # Estimates queried from the endpoint now come with their adjusted prevalence, which analysis_dynamic reads
+    sample_df['adj_prevalence'] = np.nan
+
+    expected_source_ids = {
+        'dashboard': ['a31a80ba-d99d-49a2-a4eb-4ea6cd9baf9e', '17d0a83a-c61b-4255-86b2-48ce1e9d15ab',
+                      '2429c60b-6f68-4819-96f4-bd329fb70b14', '0f13712d-10d8-4119-959d-9c12ff634bc2',
+                      '394a5f55-ddfb-4b7e-9adb-939e0dbbb9de', '8da52b68-4a79-4da9-89b2-ca05675a3bbf'],
+        'analysis_static': ['a31a80ba-d99d-49a2-a4eb-4ea6cd9baf9e', '17d0a83a-c61b-4255-86b2-48ce1e9d15ab',
+                            '23b7e19d-fc88-4d79-9169-a886dd8ae8f8', '228e9c80-e4fb-4dfa-9d06-4daf4af08bad',
+                            '394a5f55-ddfb-4b7e-9adb-939e0dbbb9de', 'b79a5284-d5c7-4aaf-a0c5-9b44b655a949'],
+        'analysis_dynamic': ['a31a80ba-d99d-49a2-a4eb-4ea6cd9baf9e', '17d0a83a-c61b-4255-86b2-48ce1e9d15ab',
+                             '23b7e19d-fc88-4d79-9169-a886dd8ae8f8', '228e9c80-e4fb-4dfa-9d06-4daf4af08bad',
+                             '394a5f55-ddfb-4b7e-9adb-939e0dbbb9de', 'b79a5284-d5c7-4aaf-a0c5-9b44b655a949'],
+    }
+    for mode, source_ids in expected_source_ids.items():
+        # One estimate is produced per study
+        assert get_prioritized_estimates(sample_df, mode=mode)['source_id'].tolist() == source_ids
+
+    # Create set of estimates such that the whole set will be pooled
+    # Note, the study df has estimate with sex = 'Male' and sex = 'Female'
+    # want to ensure that the combined df has "All"
+    bogota_study_df = sample_df[(sample_df['study_name'] == '200918_Bogota_PontificiaUniversidadJaveriana')
+                                & (sample_df['dashboard_primary_estimate'] != True)
+                                & (sample_df['academic_primary_estimate'] != True)
+                                & (sample_df['sex'] != 'All')]
+    for mode in expected_source_ids:
+        pooled = get_prioritized_estimates(bogota_study_df, mode=mode).to_dict('records')
+        assert len(pooled) == 1
+        assert pooled[0]['source_id'] == '698681f5-ee6b-44c6-a0df-2d5f59933316'
+        assert pooled[0]['sex'] == 'All'
+        assert pooled[0]['denominator_value'] == bogota_study_df['denominator_value'].sum() == 351
+        assert pooled[0]['numerator_value'] == 28
+        assert np.isclose(pooled[0]['serum_pos_prevalence'], 0.0826202849002849)
+        assert np.isclose(pooled[0]['seroprev_95_ci_lower'], 0.05484396931977763)
+        assert np.isclose(pooled[0]['seroprev_95_ci_upper'], 0.11158981171721874)
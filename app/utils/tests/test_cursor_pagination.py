@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.cursor_pagination import get_cursor_page, encode_cursor
+from app.utils.facet_index import FacetIndex
+
+RECORDS = [
+    {'source_id': 'd', 'country': 'Canada', 'sampling_end_date': datetime(2020, 5, 1), 'denominator_value': 100},
+    {'source_id': 'a', 'country': 'Brazil', 'sampling_end_date': None, 'denominator_value': 50},
+    {'source_id': 'c', 'country': 'Canada', 'sampling_end_date': datetime(2021, 3, 1), 'denominator_value': None},
+    {'source_id': 'b', 'country': 'Canada', 'sampling_end_date': datetime(2020, 5, 1), 'denominator_value': 50},
+    {'source_id': 'e', 'country': 'Brazil', 'sampling_end_date': datetime(2020, 1, 1), 'denominator_value': 75},
+]
+
+
+def _get_all_pages(index, mask, sorting_key, reverse, per_page):
+    source_ids, cursor = [], None
+    while True:
+        records, cursor = get_cursor_page(index, mask, sorting_key, reverse, per_page, cursor)
+        source_ids.append([record['source_id'] for record in records])
+        if cursor is None:
+            return source_ids
+
+
+def test_pages_follow_sort_order_with_source_id_tie_breaks():
+    index = FacetIndex(RECORDS)
+    mask = index.all_records_mask
+    assert _get_all_pages(index, mask, 'sampling_end_date', False, 2) == [['e', 'b'], ['d', 'c'], ['a']]
+    assert _get_all_pages(index, mask, 'sampling_end_date', True, 2) == [['a', 'c'], ['d', 'b'], ['e']]
+    assert _get_all_pages(index, mask, 'denominator_value', False, 5) == [['a', 'b', 'e', 'd', 'c']]
+
+
+def test_pages_only_contain_filtered_records():
+    index = FacetIndex(RECORDS)
+    mask = index.get_mask(filters={'country': ['Canada']})
+    assert _get_all_pages(index, mask, 'denominator_value', False, 1) == [['b'], ['d'], ['c']]
+    assert _get_all_pages(index, 0, 'denominator_value', False, 1) == [[]]
+
+
+def test_invalid_cursors_are_rejected():
+    index = FacetIndex(RECORDS)
+    with pytest.raises(ValueError):
+        get_cursor_page(index, index.all_records_mask, 'sampling_end_date', cursor='not a cursor')
+    # Cursors only apply to the sort order they were created for
+    cursor = encode_cursor('denominator_value', False, (0, 50, 'a'))
+    with pytest.raises(ValueError):
+        get_cursor_page(index, index.all_records_mask, 'denominator_value', True, cursor=cursor)
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from statsmodels.stats.proportion import proportion_confint
+
+from app.utils.estimate_prioritization.estimate_prioritization import get_pooled_estimates, \
+    get_prioritized_estimates_without_pooling
+
+
+def test_studies_pooled_at_once():
+    estimates = pd.DataFrame([
+        {'source_id': 'a1', 'denominator_value': 100, 'serum_pos_prevalence': 0.1, 'adj_prevalence': None,
+         'city': ['Toronto'], 'country': 'Canada', 'age': 'Adults'},
+        {'source_id': 'b1', 'denominator_value': 50, 'serum_pos_prevalence': 0.5, 'adj_prevalence': 0.4,
+         'city': [], 'country': 'Kenya', 'age': None},
+        {'source_id': 'a2', 'denominator_value': 300, 'serum_pos_prevalence': 0.2, 'adj_prevalence': None,
+         'city': ['Montreal', 'Toronto'], 'country': 'Canada', 'age': 'Children'},
+        {'source_id': 'b2', 'denominator_value': 150, 'serum_pos_prevalence': 0.1, 'adj_prevalence': None,
+         'city': [], 'country': 'Uganda', 'age': None},
+    ])
+    pooled = get_pooled_estimates(estimates, np.array([0, 1, 0, 1]))
+
+    # each study is pooled into the estimate with the largest denominator
+    assert pooled['source_id'].tolist() == ['a2', 'b2']
+    assert pooled['denominator_value'].tolist() == [400, 200]
+    assert np.allclose(pooled['serum_pos_prevalence'], [0.175, 0.2])
+    assert pooled['numerator_value'].tolist() == [70, 40]
+    assert pooled['city'].tolist() == [['Toronto', 'Montreal'], []]
+    assert pooled['country'].tolist() == ['Canada', pd.NA]
+    assert pooled['age'].tolist() == ['Multiple groups', 'Multiple groups']
+
+    lower, upper = proportion_confint(count=70, nobs=400, alpha=0.05, method='jeffreys')
+    assert np.isclose(pooled['seroprev_95_ci_lower'].iloc[0], lower)
+    assert np.isclose(pooled['seroprev_95_ci_upper'].iloc[0], upper)
+    # only study b has an adjusted prevalence
+    assert np.isnan(pooled['adj_prev_ci_lower'].iloc[0]) and not np.isnan(pooled['adj_prev_ci_lower'].iloc[1])
+
+
+def test_subgeography_estimates_kept(make_estimate):
+    estimates = pd.DataFrame([
+        make_estimate(study_name, source_id=source_id, subgroup_var=subgroup_var, dashboard_primary_estimate=primary,
+                      estimate_grade=grade)
+        for source_id, study_name, subgroup_var, primary, grade in [
+            ('a1', 'a', 'Primary Estimate', True, 'National'),
+            ('a2', 'a', 'Geographical area', None, 'Regional'),
+            ('a3', 'a', 'Geographical area', None, 'Local'),
+            ('a4', 'a', 'Age', None, 'Regional'),
+            ('b1', 'b', 'Geographical area', None, 'Local'),
+        ]
+    ])
+    prioritized = get_prioritized_estimates_without_pooling(estimates, subgroup_var='Geographical area')
+
+    # the prioritized estimate of each study comes first, then the prioritized geographical estimates
+    # of each study that aren't already included
+    assert prioritized['source_id'].tolist() == ['a1', 'b1', 'a2']
+
+
+def test_no_subgeography_estimates(make_estimate):
+    estimates = pd.DataFrame([
+        make_estimate('a', source_id='a1', dashboard_primary_estimate=True, academic_primary_estimate=True),
+        make_estimate('a', source_id='a2', subgroup_var='Age'),
+        make_estimate('b', source_id='b1', adj_prevalence=0.2),
+    ])
+    for mode in ['dashboard', 'analysis_static', 'analysis_dynamic']:
+        # no study has geographical estimates to keep, so only the prioritized estimate of each study is returned
+        prioritized = get_prioritized_estimates_without_pooling(estimates, subgroup_var='Geographical area', mode=mode)
+        assert prioritized['source_id'].tolist() == ['a1', 'b1']
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from app.utils.facet_index import FacetIndex
+
+RECORDS = [
+    {'country': 'Canada', 'city': ['Toronto', 'Ottawa'], 'sampling_end_date': datetime(2020, 5, 1),
+     'publication_date': datetime(2020, 8, 1), 'include_in_srma': True, 'dashboard_primary_estimate': True},
+    {'country': 'Canada', 'city': [], 'sampling_end_date': None,
+     'publication_date': datetime(2021, 1, 1), 'include_in_srma': False, 'dashboard_primary_estimate': None},
+    {'country': 'Brazil', 'city': ['Sao Paulo'], 'sampling_end_date': datetime(2021, 3, 1),
+     'publication_date': None, 'include_in_srma': None, 'dashboard_primary_estimate': True},
+    {'country': None, 'city': ['Toronto'], 'sampling_end_date': datetime(2020, 12, 31),
+     'publication_date': datetime(2021, 2, 1), 'include_in_srma': True, 'dashboard_primary_estimate': False},
+]
+
+
+def _countries(records):
+    return [record['country'] for record in records]
+
+
+def test_no_filters_returns_all_records():
+    assert FacetIndex(RECORDS).select() == RECORDS
+    assert FacetIndex(RECORDS).select(filters={'country': []}) == RECORDS
+
+
+def test_or_within_key_and_across_keys():
+    index = FacetIndex(RECORDS)
+    assert index.select(filters={'country': ['Canada', 'Brazil']}) == RECORDS[:3]
+    assert index.select(filters={'city': ['Toronto', 'Sao Paulo']}) == [RECORDS[0], RECORDS[2], RECORDS[3]]
+    assert index.select(filters={'country': ['Canada'], 'city': ['Toronto']}) == [RECORDS[0]]
+    assert index.select(filters={'country': ['Peru']}) == []
+
+
+def test_date_ranges_exclude_missing_dates():
+    index = FacetIndex(RECORDS)
+    selected = index.select(sampling_start_date=datetime(2020, 6, 1))
+    assert selected == [RECORDS[2], RECORDS[3]]
+    selected = index.select(sampling_end_date=datetime(2020, 12, 31), publication_start_date=datetime(2020, 1, 1))
+    assert selected == [RECORDS[0], RECORDS[3]]
+
+
+def test_boolean_flags():
+    index = FacetIndex(RECORDS)
+    assert index.select(include_in_srma=True) == [RECORDS[0], RECORDS[3]]
+    assert index.select(primary_estimates_only=True) == [RECORDS[0], RECORDS[2]]
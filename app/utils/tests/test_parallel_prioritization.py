@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.estimate_prioritization import get_prioritized_estimates, get_prioritized_estimates_without_pooling, \
+    get_prioritized_estimates_in_parallel
+from app.utils.estimate_prioritization.parallel_prioritization import get_study_chunks
+
+
+def _make_estimates(make_estimate, num_studies):
+    # the first studies have no geographical estimates, so the first chunks have no subgroup estimates
+    return pd.DataFrame([
+        make_estimate(f'study {study:03d}', source_id=f'{study}-{i}',
+                      subgroup_var=('Geographical area' if study >= 10 else 'Age') if i else 'Primary Estimate',
+                      denominator_value=100 + 10 * i, serum_pos_prevalence=0.05 * (i + 1),
+                      adj_prevalence=0.04 * (i + 1) if i % 3 else None,
+                      estimate_grade='Regional' if i % 2 else 'Local')
+        for study in range(num_studies) for i in range(study % 4 + 1)
+    ])
+
+
+def test_study_chunks():
+    study_ids = np.array([2, 0, 0, 1, -1, 3, 3, 3, 1])
+    chunks = get_study_chunks(study_ids, chunk_size=3)
+    # studies are never split, and estimates without a study are left out
+    assert [chunk.tolist() for chunk in chunks] == [[1, 2, 3, 8], [0, 5, 6, 7]]
+
+
+def test_parallel_prioritization_matches_serial(make_estimate, caplog):
+    estimates = _make_estimates(make_estimate, 40)
+    parallel_options = {'max_workers': 2, 'chunk_size': 20, 'min_estimates': 0}
+    for mode in ['dashboard', 'analysis_static', 'analysis_dynamic']:
+        pd.testing.assert_frame_equal(get_prioritized_estimates_in_parallel(estimates, mode=mode, **parallel_options),
+                                      get_prioritized_estimates(estimates, mode=mode))
+        pd.testing.assert_frame_equal(
+            get_prioritized_estimates_in_parallel(estimates, mode=mode, subgroup_var='Geographical area',
+                                                  **parallel_options),
+            get_prioritized_estimates_without_pooling(estimates, subgroup_var='Geographical area', mode=mode))
+    # every chunk was prioritized by the workers, rather than falling back to a serial prioritization
+    assert not caplog.records
@@ -0,0 +1,26 @@
+from app.utils.pin_jitter import jitter_records, get_pin_offset, MAX_PIN_JITTER
+
+
+def _get_records():
+    return [
+        {'source_id': 'a', 'pin_latitude': 43.7, 'pin_longitude': -79.4},
+        {'source_id': 'b', 'pin_latitude': 43.7, 'pin_longitude': -79.4},
+        {'source_id': 'c', 'pin_latitude': 45.4, 'pin_longitude': -75.7},
+        {'source_id': 'd', 'pin_latitude': None, 'pin_longitude': None},
+        {'source_id': 'e', 'pin_latitude': 43.7, 'pin_longitude': -79.4},
+    ]
+
+
+def test_only_duplicate_pins_are_moved():
+    records = jitter_records(_get_records())
+    assert records[0] == {'source_id': 'a', 'pin_latitude': 43.7, 'pin_longitude': -79.4}
+    assert records[2:4] == _get_records()[2:4]
+    for record in [records[1], records[4]]:
+        lat_offset, lng_offset = get_pin_offset(record['source_id'])
+        assert abs(lat_offset) <= MAX_PIN_JITTER and abs(lng_offset) <= MAX_PIN_JITTER
+        assert record['pin_latitude'] == 43.7 + lat_offset
+        assert record['pin_longitude'] == -79.4 + lng_offset
+
+
+def test_jitter_is_deterministic():
+    assert jitter_records(_get_records()) == jitter_records(_get_records())
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from app.utils.estimate_prioritization import prioritization_criteria_testadj
+from app.utils.estimate_prioritization.estimate_prioritization import apply_prioritization_criteria, get_study_ids
+
+
+def test_criteria_applied_per_study(make_estimate):
+    estimates = pd.DataFrame([
+        # no estimate of study a is a primary estimate, so that criterion is skipped
+        # and the national estimate is kept among the two that are test adjusted
+        make_estimate('a', test_adj=True, estimate_grade='Regional'),
+        make_estimate('a', test_adj=True, estimate_grade='National'),
+        make_estimate('a', pop_adj=False),
+        # the primary estimate of study b is kept, even though the other one is national
+        make_estimate('b', dashboard_primary_estimate=True),
+        make_estimate('b', estimate_grade='National'),
+        # estimates without a study are never selected
+        make_estimate(None),
+        make_estimate('c', dashboard_primary_estimate=False),
+    ])
+    study_ids = get_study_ids(estimates)
+    assert study_ids.tolist() == [0, 0, 0, 1, 1, -1, 2]
+
+    selected = apply_prioritization_criteria(estimates, prioritization_criteria_testadj, study_ids)
+    assert np.flatnonzero(selected).tolist() == [1, 3, 6]
@@ -0,0 +1,46 @@
+from app.utils.prioritized_study_cache import PrioritizedStudyCache, get_study_keys
+from app.utils.get_filtered_records import prioritize_records, _prioritized_study_cache
+
+
+def test_study_keys():
+    studies = {
+        'a': [{'source_id': 'a1', 'denominator_value': 100, 'city': ['Toronto']},
+              {'source_id': 'a2', 'denominator_value': 50, 'city': []}],
+        'b': [{'source_id': 'b1', 'denominator_value': 100, 'city': ['Toronto']}],
+        # a list in a column that doesn't hold lists in the first estimate
+        'c': [{'source_id': ['c1'], 'denominator_value': 10, 'city': None}],
+    }
+    keys = get_study_keys(studies)
+    assert len(set(keys.values())) == 3
+    assert keys == get_study_keys({**studies})
+
+    # any change to an estimate changes the key of its study
+    changed = dict(studies, a=[dict(studies['a'][0], city=['Toronto', 'Montreal']), studies['a'][1]])
+    assert get_study_keys(changed)['a'] != keys['a']
+    assert get_study_keys(changed)['b'] == keys['b']
+
+
+def test_least_recently_used_studies_evicted():
+    cache = PrioritizedStudyCache(max_studies=2)
+    cache.put_many({'a': [{'source_id': 'a1'}], 'b': [{'source_id': 'b1'}]})
+    assert cache.get_many(['a', 'c']) == {'a': [{'source_id': 'a1'}]}
+
+    # b is the least recently used study
+    cache.put_many({'c': []})
+    assert set(cache.get_many(['a', 'b', 'c'])) == {'a', 'c'}
+    assert cache.get_stats() == {'studies': 2, 'max_studies': 2, 'hits': 3, 'misses': 2, 'evictions': 1,
+                                 'hit_rate': 0.6}
+
+
+def test_cached_studies_independent_of_other_studies(app, monkeypatch, make_estimate):
+    monkeypatch.setitem(app.config, 'PRIORITIZED_STUDY_CACHE_ENABLED', True)
+    _prioritized_study_cache.clear()
+    study_a = [make_estimate('a', source_id='a1', numerator_value=10)]
+    study_b = [make_estimate('b', source_id='b1', numerator_value=None)]
+
+    # numerator_value is an integer column unless other records are missing it, whichever of those
+    # was prioritized first
+    assert type(prioritize_records(study_a + study_b)[0]['numerator_value']) is float
+    assert type(prioritize_records(study_a)[0]['numerator_value']) is int
+    assert type(prioritize_records(study_a + study_b)[0]['numerator_value']) is float
+    _prioritized_study_cache.clear()
@@ -0,0 +1,60 @@
+from datetime import datetime
+from time import monotonic, sleep
+
+from app.utils.record_snapshot import RecordSnapshotCache
+
+VARIANT = (False, False, False, False)
+
+
+def _make_loader(calls):
+    def loader(*variant):
+        calls.append(variant)
+        return [{'source_id': len(calls)}]
+    return loader
+
+
+def test_snapshot_reused_for_same_version():
+    calls = []
+    cache = RecordSnapshotCache(_make_loader(calls))
+    version = datetime(2023, 1, 1)
+    first = cache.get(VARIANT, version)
+    second = cache.get(VARIANT, version)
+    assert first is second
+    assert calls == [VARIANT]
+
+
+def test_stale_snapshot_served_while_rebuilding(app):
+    calls = []
+    cache = RecordSnapshotCache(_make_loader(calls))
+    old_snapshot = cache.get(VARIANT, datetime(2023, 1, 1))
+
+    # A new ETL version returns the old snapshot immediately and rebuilds in the background
+    new_version = datetime(2023, 2, 1)
+    assert cache.get(VARIANT, new_version) is old_snapshot
+
+    deadline = monotonic() + 5
+    new_snapshot = cache.get(VARIANT, new_version)
+    while new_snapshot is old_snapshot and monotonic() < deadline:
+        sleep(0.01)
+        new_snapshot = cache.get(VARIANT, new_version)
+    assert new_snapshot.version == new_version
+    assert new_snapshot.records == [{'source_id': 2}]
+
+
+def test_derived_structures_built_once():
+    cache = RecordSnapshotCache(_make_loader([]))
+    snapshot = cache.get(VARIANT, None)
+    builds = []
+    snapshot.get_derived('index', lambda s: builds.append(1) or len(s))
+    assert snapshot.get_derived('index', lambda s: builds.append(1) or len(s)) == 1
+    assert builds == [1]
+
+
+def test_mapped_records_preferred_over_loader():
+    calls = []
+    cache = RecordSnapshotCache(_make_loader(calls), lambda variant, version: [{'source_id': 'mapped'}]
+                                if version == datetime(2023, 1, 1) else None)
+    assert cache.get(VARIANT, datetime(2023, 1, 1)).records == [{'source_id': 'mapped'}]
+    # Versions without a published file are still loaded
+    assert cache.get((True, False, False, False), datetime(2023, 2, 1)).records == [{'source_id': 1}]
+    assert calls == [(True, False, False, False)]
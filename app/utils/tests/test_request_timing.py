@@ -0,0 +1,44 @@
+from time import sleep
+
+from flask import jsonify
+
+from app.utils.request_timing import timed_stage, get_timing_histograms, clear_timing_histograms
+
+
+def _time_request(app, path):
+    with app.test_request_context(path):
+        app.preprocess_request()
+        with timed_stage('sql') as stage:
+            sleep(0.01)
+            stage.rows = 3
+            # Nested stages are not counted in the duration of the stage they run in
+            with timed_stage('prioritize_estimates'):
+                sleep(0.05)
+        with timed_stage('sql') as stage:
+            stage.rows = 2
+        return app.process_response(jsonify({}))
+
+
+def test_server_timing_header(app):
+    app.config['REQUEST_TIMING_ENABLED'] = True
+    clear_timing_histograms()
+    try:
+        response = _time_request(app, '/healthcheck/')
+        metrics = {metric.split(';')[0]: metric.split(';')[1:] for metric in
+                   response.headers['Server-Timing'].split(', ')}
+        assert set(metrics) == {'sql', 'prioritize_estimates', 'total'}
+        # Stages with the same name are added up
+        assert metrics['sql'][1] == 'desc="rows=5"'
+        assert 10 <= float(metrics['sql'][0][len('dur='):]) < 50
+        assert float(metrics['prioritize_estimates'][0][len('dur='):]) >= 50
+
+        histograms = get_timing_histograms()['GET /healthcheck/']
+        assert histograms['sql']['count'] == 1
+        assert sum(histograms['total']['buckets'].values()) == 1
+    finally:
+        app.config['REQUEST_TIMING_ENABLED'] = False
+
+
+def test_no_header_when_disabled(app):
+    app.config['REQUEST_TIMING_ENABLED'] = False
+    assert 'Server-Timing' not in _time_request(app, '/healthcheck/').headers
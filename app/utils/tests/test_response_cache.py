@@ -0,0 +1,41 @@
+import gzip
+import json
+
+from app.utils.response_cache import make_cached_response, clear_response_cache
+
+
+def _make_builder(builds):
+    def build_payload():
+        builds.append(1)
+        return {'records': [{'source_id': i} for i in range(100)]}
+    return build_payload
+
+
+def test_payload_built_once_and_revalidated(app):
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    clear_response_cache()
+    builds = []
+    try:
+        with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            response = make_cached_response('test', 1, _make_builder(builds))
+            assert response.status_code == 200
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert json.loads(gzip.decompress(response.get_data()))['records'][99] == {'source_id': 99}
+            etag = response.headers['ETag']
+
+        # A client that already has the payload gets an empty 304
+        with app.test_request_context(headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}):
+            response = make_cached_response('test', 1, _make_builder(builds))
+            assert response.status_code == 304
+            assert response.get_data() == b''
+        assert builds == [1]
+
+        # A new version rebuilds the payload
+        with app.test_request_context(headers={'If-None-Match': etag}):
+            response = make_cached_response('test', 2, _make_builder(builds))
+            assert response.status_code == 200
+            assert 'Content-Encoding' not in response.headers
+        assert builds == [1, 1]
+    finally:
+        app.config['RESPONSE_CACHE_ENABLED'] = False
+        clear_response_cache()
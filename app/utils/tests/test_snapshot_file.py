@@ -0,0 +1,41 @@
+from datetime import datetime
+from uuid import UUID
+
+from app.utils.facet_index import FacetIndex
+from app.utils.snapshot_file import get_snapshot_file_path, read_snapshot_file, remove_old_snapshot_files, \
+    write_snapshot_file
+
+VARIANT = (False, False, False, False)
+
+RECORDS = [
+    {'source_id': UUID('00000000-0000-0000-0000-000000000001'), 'country': 'Canada', 'city': ['Toronto', 'Ottawa'],
+     'sampling_end_date': datetime(2020, 5, 1), 'denominator_value': 100, 'serum_pos_prevalence': 0.1,
+     'include_in_srma': True},
+    {'source_id': UUID('00000000-0000-0000-0000-000000000002'), 'country': 'Canada', 'city': [],
+     'sampling_end_date': None, 'denominator_value': None, 'serum_pos_prevalence': 0.2, 'include_in_srma': None},
+    {'source_id': UUID('00000000-0000-0000-0000-000000000003'), 'country': None, 'city': ['Sao Paulo'],
+     'sampling_end_date': datetime(2021, 3, 1), 'denominator_value': 300, 'serum_pos_prevalence': None,
+     'include_in_srma': False},
+]
+
+
+def test_mapped_records_match_written_records(tmp_path):
+    path = get_snapshot_file_path(str(tmp_path), VARIANT, datetime(2023, 1, 1))
+    assert write_snapshot_file(RECORDS, path)
+    records = read_snapshot_file(path)
+    assert len(records) == 3
+    assert list(records) == RECORDS
+    assert records[-1] == RECORDS[2]
+    assert records[1:] == RECORDS[1:]
+    assert FacetIndex(records).select(filters={'country': ['Canada']}) == RECORDS[:2]
+
+
+def test_old_snapshot_files_removed(tmp_path):
+    old_path = get_snapshot_file_path(str(tmp_path), VARIANT, datetime(2023, 1, 1))
+    new_path = get_snapshot_file_path(str(tmp_path), VARIANT, datetime(2023, 2, 1))
+    other_variant_path = get_snapshot_file_path(str(tmp_path), (True, False, False, False), datetime(2023, 1, 1))
+    for path in [old_path, new_path, other_variant_path]:
+        write_snapshot_file(RECORDS, path)
+    remove_old_snapshot_files(str(tmp_path), VARIANT, keep_path=new_path)
+    assert sorted(str(path) for path in tmp_path.iterdir()) == sorted([new_path, other_variant_path])
+    assert read_snapshot_file(old_path) is None
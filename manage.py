@@ -26,6 +26,21 @@ def make_shell_context():
     return dict(app=app, db=db, gq=get_debug_queries(), DashboardSource=DashboardSource)
 
 
+@manager.command
+def publish_record_snapshots():
+    # Publishes the record snapshot files of the records currently in the database, e.g. after RECORD_SNAPSHOT_DIR
+    # is first configured, without waiting for the next ETL run
+    from app.database_etl.record_snapshot_handler import publish_record_snapshots as publish
+    from app.utils import get_records_version
+    version = get_records_version()
+    if version is None:
+        print('There are no records to publish.')
+    elif publish(current_time=version):
+        print(f'Published record snapshots for version {version}.')
+    else:
+        print('Set RECORD_SNAPSHOT_DIR and install pyarrow to publish record snapshots.')
+
+
 @manager.command
 def test():
     if os.getenv('FLASK_ENV') == 'test':
@@ -1 +1 @@
-from .helper_funcs import delete_records, delete_all_records, insert_full_recordset
\ No newline at end of file
+from .helper_funcs import delete_records, delete_all_records, insert_full_recordset, assert_max_queries
\ No newline at end of file
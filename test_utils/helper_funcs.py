@@ -1,5 +1,7 @@
 import test_utils.factories as factories
 import uuid
+from contextlib import contextmanager
+from Pathogens.Utility.database_utils import profile_statements
 from app.serotracker_sqlalchemy import DashboardSource, ResearchSource, Country, City, State, \
     TestManufacturer, AntibodyTarget, CityBridge, StateBridge, TestManufacturerBridge, AntibodyTargetBridge
 
@@ -47,3 +49,15 @@ def insert_full_recordset(num_records=1, study_name="study"):
         factories.TestManufacturerBridgeFactory(source_id=source_id, test_manufacturer_id=test_manufacturer_id)
 
     return
+
+
+# Fails if the code in the with block runs more than max_statements statements through the shared engines,
+# listing the statements that were run so that the extra queries are easy to find
+@contextmanager
+def assert_max_queries(max_statements):
+    with profile_statements('assert_max_queries', log=False) as profile:
+        yield profile
+    if profile.num_statements > max_statements:
+        statements = '\n'.join(f'{stats.count}x {fingerprint}' for fingerprint, stats in profile.statements.items())
+        raise AssertionError(f'Expected at most {max_statements} statements but {profile.num_statements} were run:\n'
+                             f'{statements}')